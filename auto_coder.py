@@ -0,0 +1,5491 @@
+"""AutoCoder核心引擎（无GUI依赖）：LLM调用、代码执行与验证、网络搜索
+
+requests、Selenium 等较重的依赖在首次使用时才导入，无头运行和工作进程不必为GUI与浏览器付出导入开销。
+"""
+import os
+import subprocess
+import re
+from pathlib import Path
+import venv
+import tempfile
+import shutil
+import signal
+import time
+import threading
+import queue
+import atexit
+import json
+import gzip
+import math
+import random
+import sqlite3
+import hashlib
+import uuid
+import socket
+import select
+import struct
+import base64
+import ast
+import builtins
+import difflib
+import sys
+import bisect
+from array import array
+from collections import deque
+from html.parser import HTMLParser
+from urllib.parse import urlparse, unquote
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from types import SimpleNamespace
+
+_selenium = None
+_selenium_lock = threading.Lock()
+
+
+def load_selenium():
+    """首次使用时导入无头浏览器相关库，不可用时返回None"""
+    global _selenium
+    with _selenium_lock:
+        if _selenium is None:
+            try:
+                from selenium import webdriver
+                from selenium.webdriver.chrome.options import Options
+                from selenium.webdriver.common.by import By
+                from selenium.webdriver.chrome.service import Service
+                from selenium.webdriver.support.ui import WebDriverWait
+                from selenium.webdriver.support import expected_conditions as EC
+                from webdriver_manager.chrome import ChromeDriverManager
+
+                _selenium = SimpleNamespace(
+                    webdriver=webdriver, Options=Options, By=By, Service=Service,
+                    WebDriverWait=WebDriverWait, EC=EC, ChromeDriverManager=ChromeDriverManager
+                )
+            except ImportError:
+                _selenium = False
+        return _selenium or None
+
+
+class ProcessAborted(Exception):
+    """子进程被提前终止（例如并发运行的其他测试用例已失败）"""
+
+
+class GenerationTimeout(Exception):
+    """LLM生成超过整体时限：请求本身太长，不换端点重试，也不计为端点故障"""
+
+
+class BudgetExhausted(BaseException):
+    """token预算已用完：运行停止，检查点标记为已结束，不再恢复
+
+    与 OperationCancelled 一样继承 BaseException，避免被各处的 except Exception 吞掉。
+    """
+
+
+class OperationCancelled(BaseException):
+    """操作被取消或超过运行时限
+
+    与 KeyboardInterrupt 一样继承 BaseException，避免被各处的 except Exception 吞掉。
+    """
+
+
+class CancellationToken:
+    """协作式取消令牌：贯穿开发周期、LLM请求、子进程和网络搜索，也用于运行时限"""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = {}
+        self._next_handle = 0
+        self._deadline = None
+        self._timer = None
+        self.reason = None
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="操作已取消"):
+        """取消操作，并执行已注册的回调（如中断网络请求、关闭浏览器）"""
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+            if self._timer:
+                self._timer.cancel()
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                pass
+
+    def set_deadline(self, seconds):
+        """设置运行时限，到期后自动取消"""
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+            self._deadline = time.monotonic() + seconds
+            self._timer = threading.Timer(seconds, self.cancel, args=(f"超过运行时限 ({seconds}秒)",))
+            self._timer.daemon = True
+            self._timer.start()
+
+    def clear_deadline(self):
+        """取消运行时限"""
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+            self._timer = None
+            self._deadline = None
+
+    def remaining(self):
+        """距运行时限的剩余秒数，没有时限时返回None"""
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - time.monotonic())
+
+    def timeout(self, default):
+        """取默认超时与剩余时间中较小者"""
+        remaining = self.remaining()
+        return default if remaining is None else min(default, remaining)
+
+    def check(self):
+        """已取消时抛出 OperationCancelled"""
+        if self._event.is_set():
+            raise OperationCancelled(self.reason)
+
+    def wait(self, seconds):
+        """可被取消打断的等待，已取消时返回True"""
+        return self._event.wait(seconds)
+
+    def register(self, callback):
+        """注册取消时执行的回调，返回句柄；已取消时立即执行"""
+        with self._lock:
+            if not self._event.is_set():
+                handle = self._next_handle
+                self._next_handle += 1
+                self._callbacks[handle] = callback
+                return handle
+        callback()
+        return None
+
+    def unregister(self, handle):
+        """注销回调"""
+        with self._lock:
+            self._callbacks.pop(handle, None)
+
+
+def kill_process_tree(process):
+    """结束子进程及其创建的整个进程组"""
+    try:
+        if os.name == 'nt':
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                           capture_output=True, check=False)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, OSError):
+        pass
+    try:
+        process.kill()
+    except OSError:
+        pass
+
+
+def cache_dir():
+    """本地缓存目录（可用环境变量 AUTOCODER_CACHE_DIR 指定）"""
+    path = Path(os.environ.get("AUTOCODER_CACHE_DIR") or Path.home() / ".cache" / "autocoder")
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class LogRecord:
+    """结构化日志记录"""
+
+    __slots__ = ("timestamp", "level", "session", "cycle", "phase", "message")
+
+    def __init__(self, message, level="info", phase="", session="", cycle=0, timestamp=None):
+        self.timestamp = timestamp or time.time()
+        self.level = level
+        self.session = session
+        self.cycle = cycle
+        self.phase = phase
+        self.message = message
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def infer_level(message):
+    """按日志内容中的标记推断级别"""
+    if "❌" in message:
+        return "error"
+    if "⚠️" in message:
+        return "warning"
+    return "info"
+
+
+class RotatingJsonlSink:
+    """按大小轮转的JSONL日志文件，轮转出的旧文件压缩为 .N.gz，最多保留backups个"""
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024, backups=5):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def __call__(self, record):
+        self._file.write(json.dumps(record.to_dict(), ensure_ascii=False) + "\n")
+        if self._file.tell() >= self.max_bytes:
+            self.rotate()
+
+    def flush(self):
+        self._file.flush()
+
+    def rotate(self):
+        """关闭当前文件，压缩为 .1.gz，已有的旧文件依次后移"""
+        self._file.close()
+        oldest = self.path.with_name(f"{self.path.name}.{self.backups}.gz")
+        if oldest.exists():
+            oldest.unlink()
+        for index in range(self.backups - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}.gz")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{index + 1}.gz"))
+        with open(self.path, 'rb') as source, \
+                gzip.open(self.path.with_name(f"{self.path.name}.1.gz"), 'wb') as target:
+            shutil.copyfileobj(source, target)
+        self._file = open(self.path, 'w', encoding='utf-8')
+
+    def close(self):
+        self._file.close()
+
+
+def console_subscriber(record):
+    """控制台输出"""
+    print(record.message)
+
+
+class LogHub:
+    """异步日志分发：调用方只把记录放入有界队列，由后台线程写入订阅者（控制台、界面、任务日志、日志文件）
+
+    队列满时 policy="drop" 丢弃新记录并计数（错误级别的记录仍会等待），policy="block" 让调用方等待
+    """
+
+    def __init__(self, max_queue=10000, policy="drop"):
+        if policy not in ("drop", "block"):
+            raise ValueError(f"未知的日志队列策略: {policy}")
+        self.policy = policy
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._subscribers = {}  # 句柄 -> (回调, 会话ID过滤)
+        self._next_handle = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._file_sink = None
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="autocoder-log", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush, 2.0)
+
+    def subscribe(self, callback, session=None):
+        """添加订阅者，session不为空时只接收该会话的记录，返回句柄"""
+        with self._lock:
+            self._next_handle += 1
+            handle = self._next_handle
+        self._control(("subscribe", handle, callback, session))
+        return handle
+
+    def unsubscribe(self, handle):
+        """移除订阅者；移除在后台线程中按顺序执行，之前提交的记录仍会送达"""
+        self._control(("unsubscribe", handle))
+
+    def enable_file(self, path, max_bytes=10 * 1024 * 1024, backups=5):
+        """把全部记录写入按大小轮转的JSONL文件"""
+        self._control(("file", RotatingJsonlSink(path, max_bytes=max_bytes, backups=backups)))
+
+    def _control(self, command):
+        """控制命令总是等待入队，保证与记录的顺序一致"""
+        self._ensure_started()
+        self._queue.put(command)
+
+    def emit(self, message, level=None, phase="", session="", cycle=0):
+        """提交一条日志记录，不在调用线程中做任何输出"""
+        self._ensure_started()
+        record = LogRecord(message, level or infer_level(message), phase, session, cycle)
+        if self.policy == "block" or record.level == "error":
+            self._queue.put(record)
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def flush(self, timeout=5.0):
+        """等待此前提交的记录全部写出，超时返回False"""
+        if self._thread is None:
+            return True
+        done = threading.Event()
+        try:
+            self._queue.put(("flush", done), timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def _run(self):
+        reported_drops = 0
+        while True:
+            item = self._queue.get()
+            is_flush = isinstance(item, tuple) and item[0] == "flush"
+            if self.dropped != reported_drops and (is_flush or self._queue.empty()):
+                # 队列空闲或有人等待写出时报告丢弃数量
+                dropped = self.dropped
+                self._dispatch(LogRecord(f"⚠️ 日志队列已满，共丢弃 {dropped - reported_drops} 条日志",
+                                         level="warning", phase="log"))
+                reported_drops = dropped
+            if isinstance(item, LogRecord):
+                self._dispatch(item)
+            elif item[0] == "subscribe":
+                self._subscribers[item[1]] = (item[2], item[3])
+            elif item[0] == "unsubscribe":
+                self._subscribers.pop(item[1], None)
+            elif item[0] == "file":
+                if self._file_sink:
+                    self._file_sink.close()
+                self._file_sink = item[1]
+            elif item[0] == "flush":
+                if self._file_sink:
+                    self._file_sink.flush()
+                item[1].set()
+
+    def _dispatch(self, record):
+        if self._file_sink:
+            try:
+                self._file_sink(record)
+            except OSError:
+                pass
+        for callback, session in list(self._subscribers.values()):
+            if session and record.session != session:
+                continue
+            try:
+                callback(record)
+            except Exception:
+                # 订阅者出错（例如界面已关闭）不影响其他订阅者
+                pass
+
+
+def _create_log_hub():
+    """创建进程内共享的日志分发器：默认输出到控制台并写入缓存目录下的日志文件
+
+    环境变量 AUTOCODER_LOG_FILE 可指定日志文件路径，设为 "-" 时不写文件；
+    AUTOCODER_LOG_POLICY 为 drop（默认）或 block，决定队列满时丢弃日志还是等待
+    """
+    hub = LogHub(policy=os.environ.get("AUTOCODER_LOG_POLICY", "drop"))
+    hub.subscribe(console_subscriber)
+    log_file = os.environ.get("AUTOCODER_LOG_FILE")
+    if log_file != "-":
+        try:
+            hub.enable_file(log_file or cache_dir() / "logs" / "autocoder.jsonl")
+        except OSError:
+            pass
+    return hub
+
+
+LOG_LEVELS = ("info", "warning", "error")
+
+
+class IndexedLog:
+    """磁盘上的日志存储：消息正文追加写入文件，内存中只保留每条记录的偏移、长度、行数、级别和阶段
+
+    用于在界面中浏览数十万行的日志：只按需读取可见的记录，搜索直接在文件字节上进行
+    """
+
+    def __init__(self, path=None, cache_size=2048):
+        if path is None:
+            fd, path = tempfile.mkstemp(prefix="autocoder-log-", suffix=".log")
+            os.close(fd)
+        self.path = Path(path)
+        self._file = open(self.path, 'w+b')
+        self._end = 0
+        self.offsets = array('q')
+        self.lengths = array('l')
+        self.line_counts = array('l')
+        self.levels = bytearray()  # LOG_LEVELS中的下标
+        self.phase_ids = array('H')
+        self.phases = []  # 阶段名，按首次出现顺序
+        self._phase_index = {}
+        self._cache = {}
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def append(self, record):
+        """追加一条LogRecord，返回记录编号"""
+        # 日志文本前后用于分隔的空行在查看器中没有意义
+        message = record.message.strip("\n")
+        data = message.encode("utf-8")
+        phase_id = self._phase_index.get(record.phase)
+        if phase_id is None:
+            phase_id = self._phase_index[record.phase] = len(self.phases)
+            self.phases.append(record.phase)
+        with self._lock:
+            self._file.seek(self._end)
+            # 记录之间用换行分隔，搜索时匹配不会跨越记录
+            self._file.write(data + b"\n")
+            self.offsets.append(self._end)
+            self.lengths.append(len(data))
+            self._end += len(data) + 1
+        self.line_counts.append(message.count("\n") + 1)
+        self.levels.append(LOG_LEVELS.index(record.level) if record.level in LOG_LEVELS else 0)
+        self.phase_ids.append(phase_id)
+        return len(self.offsets) - 1
+
+    def level(self, index):
+        return LOG_LEVELS[self.levels[index]]
+
+    def phase(self, index):
+        return self.phases[self.phase_ids[index]]
+
+    def message(self, index):
+        """读取一条记录的正文（带少量缓存，滚动时相邻的记录通常会重复读取）"""
+        message = self._cache.get(index)
+        if message is None:
+            with self._lock:
+                self._file.seek(self.offsets[index])
+                message = self._file.read(self.lengths[index]).decode("utf-8", errors="replace")
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[index] = message
+        return message
+
+    def search(self, text, start=0, backward=False, accept=None, chunk_size=4 * 1024 * 1024):
+        """从第start条记录开始查找包含text的记录（不区分ASCII大小写），accept可进一步过滤记录编号
+
+        返回记录编号，找不到返回None。文件按块读取，块之间重叠以免漏掉跨块的匹配
+        """
+        needle = text.encode("utf-8").lower()
+        if not needle or not len(self):
+            return None
+        count = len(self)
+        start = max(0, min(start, count - 1))
+        with self._lock:
+            self._file.flush()
+        # 按块把记录范围转换为字节范围，逐块在文件内容中查找
+        index = start
+        while 0 <= index < count:
+            if backward:
+                low = bisect.bisect_left(self.offsets, self.offsets[index] - chunk_size)
+                first, last = low, index
+            else:
+                high = bisect.bisect_right(self.offsets, self.offsets[index] + chunk_size)
+                first, last = index, max(index, high - 1)
+            with self._lock:
+                self._file.seek(self.offsets[first])
+                block = self._file.read(self.offsets[last] + self.lengths[last] - self.offsets[first]).lower()
+            base = self.offsets[first]
+            found = self._matches_in_block(block, needle, base, first, last, backward, accept)
+            if found is not None:
+                return found
+            index = (first - 1) if backward else (last + 1)
+        return None
+
+    def _matches_in_block(self, block, needle, base, first, last, backward, accept):
+        """在一块文件内容中按方向查找第一条匹配且被接受的记录"""
+        position = block.rfind(needle) if backward else block.find(needle)
+        while position != -1:
+            index = bisect.bisect_right(self.offsets, base + position, first, last + 1) - 1
+            if accept is None or accept(index):
+                return index
+            # 跳过这条记录的其余部分
+            if backward:
+                position = block.rfind(needle, 0, self.offsets[index] - base)
+            else:
+                position = block.find(needle, self.offsets[index] + self.lengths[index] + 1 - base)
+        return None
+
+    def close(self, delete=True):
+        with self._lock:
+            self._file.close()
+        if delete:
+            try:
+                self.path.unlink()
+            except OSError:
+                pass
+
+
+_log_hub = None
+_log_hub_lock = threading.Lock()
+
+
+def get_log_hub():
+    """获取进程内共享的日志分发器（首次使用时创建）"""
+    global _log_hub
+    with _log_hub_lock:
+        if _log_hub is None:
+            _log_hub = _create_log_hub()
+        return _log_hub
+
+
+class ChromeDriverResolver:
+    """ChromeDriver路径解析：每个进程只解析一次，结果连同版本缓存到磁盘
+
+    查找顺序：环境变量 AUTOCODER_CHROMEDRIVER、磁盘缓存、（离线模式下）PATH 中的 chromedriver、
+    最后才通过 webdriver_manager 联网下载。pinned_version 指定时，版本不一致的缓存视为失效。
+    """
+
+    def __init__(self, offline=None, pinned_version=None):
+        if offline is None:
+            offline = os.environ.get("AUTOCODER_OFFLINE", "").lower() in ("1", "true", "yes")
+        self.offline = offline
+        self.pinned_version = pinned_version or os.environ.get("AUTOCODER_CHROMEDRIVER_VERSION") or None
+        self._path = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache_file(self):
+        return cache_dir() / "chromedriver.json"
+
+    def _read_cache(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_cache(self, path, version):
+        data = {"path": path, "version": version, "resolved_at": time.time()}
+        with open(self.cache_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def driver_version(path):
+        """读取chromedriver的版本号，失败时返回None"""
+        try:
+            output = subprocess.run([path, "--version"], capture_output=True, text=True, timeout=10).stdout
+        except (OSError, subprocess.TimeoutExpired):
+            return None
+        match = re.search(r'(\d+(?:\.\d+)+)', output)
+        return match.group(1) if match else None
+
+    def _version_ok(self, version):
+        return not self.pinned_version or (version or "").startswith(self.pinned_version)
+
+    def resolve(self, log=None):
+        """返回chromedriver路径，无法获得时抛出RuntimeError"""
+        with self._lock:
+            if self._path and os.path.exists(self._path):
+                return self._path
+            self._path = self._resolve(log)
+            return self._path
+
+    def _resolve(self, log):
+        configured = os.environ.get("AUTOCODER_CHROMEDRIVER")
+        if configured and os.path.exists(configured):
+            return configured
+
+        cached = self._read_cache()
+        if cached and os.path.exists(cached.get("path", "")) and self._version_ok(cached.get("version")):
+            return cached["path"]
+
+        if self.offline:
+            local = shutil.which("chromedriver")
+            if local and self._version_ok(self.driver_version(local)):
+                return local
+            raise RuntimeError("离线模式下没有可用的ChromeDriver缓存，请联网运行一次或设置 AUTOCODER_CHROMEDRIVER")
+
+        if log:
+            log("下载/校验ChromeDriver...")
+        selenium = load_selenium()
+        if self.pinned_version:
+            path = selenium.ChromeDriverManager(driver_version=self.pinned_version).install()
+        else:
+            path = selenium.ChromeDriverManager().install()
+        self._write_cache(path, self.driver_version(path))
+        return path
+
+
+# 进程内共用的ChromeDriver解析器
+driver_resolver = ChromeDriverResolver()
+
+
+class SharedBrowser:
+    """长期运行的共享浏览器进程，每个会话使用独立的浏览器上下文（Cookie、存储互相隔离）"""
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.default_window = driver.current_window_handle
+        self.contexts = {}  # 会话ID -> (上下文ID, 窗口句柄)
+
+    def switch_to(self, session_id):
+        """切换到会话对应的上下文窗口，不存在时创建"""
+        context = self.contexts.get(session_id)
+        if context is None:
+            context = self._create_context()
+            self.contexts[session_id] = context
+        self.driver.switch_to.window(context[1])
+
+    def _create_context(self):
+        try:
+            # 通过CDP创建独立的BrowserContext，ChromeDriver的窗口句柄即target ID
+            context_id = self.driver.execute_cdp_cmd("Target.createBrowserContext", {})["browserContextId"]
+            target_id = self.driver.execute_cdp_cmd(
+                "Target.createTarget", {"url": "about:blank", "browserContextId": context_id}
+            )["targetId"]
+            return context_id, target_id
+        except Exception:
+            # 不支持CDP时退化为普通标签页
+            self.driver.switch_to.new_window('tab')
+            self.driver.delete_all_cookies()
+            return None, self.driver.current_window_handle
+
+    def close_context(self, session_id):
+        """关闭会话的上下文"""
+        context = self.contexts.pop(session_id, None)
+        if context is None:
+            return
+        context_id, window = context
+        try:
+            if context_id:
+                self.driver.execute_cdp_cmd("Target.disposeBrowserContext", {"browserContextId": context_id})
+            else:
+                self.driver.switch_to.window(window)
+                self.driver.close()
+            self.driver.switch_to.window(self.default_window)
+        except Exception:
+            pass
+
+    def quit(self):
+        try:
+            self.driver.quit()
+        except Exception:
+            pass
+
+
+class BrowserPool:
+    """进程内共享的长期浏览器池：浏览器启动一次后被各会话复用，每个会话在其中拥有独立上下文"""
+
+    def __init__(self, max_browsers=2, resolver=None):
+        self.max_browsers = max_browsers
+        self.resolver = resolver or driver_resolver
+        self._idle = []
+        self._in_use = {}  # driver -> SharedBrowser
+        self._pending_closes = {}  # driver -> 借出期间已结束、归还时要关闭上下文的会话
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _create_driver(self, log=None):
+        selenium = load_selenium()
+        options = selenium.Options()
+        options.add_argument("--headless")
+        options.add_argument("--disable-gpu")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+
+        service = selenium.Service(self.resolver.resolve(log=log))
+        return selenium.webdriver.Chrome(service=service, options=options)
+
+    def acquire(self, timeout=None, log=None, cancel_token=None, session_id=None):
+        """借用一个浏览器并切换到会话的上下文，没有空闲浏览器且未达上限时新建，超时返回None"""
+        with self._cond:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            while not self._idle and self._created >= self.max_browsers:
+                if cancel_token:
+                    cancel_token.check()
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                # 分段等待以便及时响应取消
+                self._cond.wait(0.2 if remaining is None else min(remaining, 0.2))
+            browser = self._idle.pop() if self._idle else None
+            if browser is None:
+                self._created += 1
+
+        if browser is None:
+            try:
+                if log:
+                    log("初始化Chrome无头浏览器...")
+                browser = SharedBrowser(self._create_driver(log=log))
+                if log:
+                    log("浏览器初始化成功")
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+        try:
+            if session_id is not None:
+                browser.switch_to(session_id)
+        except Exception:
+            self._discard(browser)
+            raise
+        with self._cond:
+            self._in_use[browser.driver] = browser
+        return browser.driver
+
+    def release(self, driver, broken=False):
+        """归还浏览器，已损坏的浏览器直接关闭；先关闭借出期间已结束的会话的上下文"""
+        with self._cond:
+            browser = self._in_use.pop(driver, None)
+            if browser is None:
+                return
+            pending = self._pending_closes.pop(driver, ())
+            discard = broken or self._closed
+        if discard:
+            self._discard(browser)
+            return
+        for session_id in pending:
+            browser.close_context(session_id)
+        with self._cond:
+            self._idle.append(browser)
+            self._cond.notify()
+
+    def _discard(self, browser):
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+        browser.quit()
+
+    def close_session(self, session_id):
+        """关闭会话在各个空闲浏览器中的上下文，借出中的浏览器在归还时关闭"""
+        with self._cond:
+            browsers = list(self._idle)
+            self._idle = []
+            for driver in self._in_use:
+                self._pending_closes.setdefault(driver, set()).add(session_id)
+        try:
+            for browser in browsers:
+                browser.close_context(session_id)
+        finally:
+            with self._cond:
+                self._idle.extend(browsers)
+                self._cond.notify_all()
+
+    def close_all(self):
+        """关闭池中所有浏览器（借出中的浏览器在归还时关闭）"""
+        with self._cond:
+            self._closed = True
+            browsers, self._idle = self._idle, []
+            self._created -= len(browsers)
+            self._cond.notify_all()
+        for browser in browsers:
+            browser.quit()
+
+
+# 进程内所有会话共用的浏览器池，进程退出时关闭（命令行和任务服务没有图形界面的关闭回调）
+browser_pool = BrowserPool()
+atexit.register(browser_pool.close_all)
+
+
+class WebSearch:
+    """网络搜索类，用于从百度获取信息"""
+
+    def __init__(self, ui_callback=None, max_results=5, timeout=10, pool=None, cancel_token=None,
+                 session_id=None):
+        self.ui_callback = ui_callback
+        self.initialized = False
+        self.max_results = max_results
+        self.timeout = timeout
+        self.pool = pool or browser_pool
+        self.cancel_token = cancel_token or CancellationToken()
+        # 会话ID，用于在共享浏览器中区分各会话的独立上下文，也用于日志记录
+        self.session_id = session_id or uuid.uuid4().hex
+        # 单独使用时自己订阅本会话的日志；由AutoCoder创建时日志随AutoCoder的订阅送达
+        self._log_handle = None
+        if ui_callback:
+            self._log_handle = get_log_hub().subscribe(lambda record: ui_callback(record.message + "\n"),
+                                                       session=self.session_id)
+
+    def log(self, message):
+        """输出日志（异步）"""
+        get_log_hub().emit(message, phase="search", session=self.session_id)
+
+    def initialize(self):
+        """检查WebDriver是否可用，浏览器本身在搜索时从共享池借用"""
+        if load_selenium() is None:
+            self.log("❌ Selenium不可用，请安装相关库: pip install selenium webdriver-manager")
+            return False
+
+        self.initialized = True
+        return True
+
+    def search(self, keywords):
+        """执行百度搜索并返回结果"""
+        if not self.initialized and not self.initialize():
+            return {"success": False, "error": "浏览器未初始化"}
+
+        self.cancel_token.check()
+        try:
+            # 每次搜索单独借用浏览器，同一会话的多个搜索可以并发进行
+            driver = self.pool.acquire(timeout=self.timeout, log=self.log, cancel_token=self.cancel_token,
+                                       session_id=self.session_id)
+        except Exception as e:
+            self.log(f"❌ 浏览器初始化失败: {str(e)}")
+            return {"success": False, "error": "浏览器未初始化"}
+        if driver is None:
+            self.log("❌ 等待空闲浏览器超时")
+            return {"success": False, "error": "等待空闲浏览器超时"}
+
+        # 取消时直接关闭借用的浏览器，打断正在进行的页面加载
+        handle = self.cancel_token.register(lambda: self._abort_driver(driver))
+        selenium = load_selenium()
+        By = selenium.By
+        broken = False
+        try:
+            search_url = f"https://www.baidu.com/s?wd={keywords}"
+            self.log(f"正在搜索: {keywords}")
+            driver.get(search_url)
+
+            # 等待搜索结果加载
+            selenium.WebDriverWait(driver, self.timeout).until(
+                selenium.EC.presence_of_element_located((By.CLASS_NAME, "result"))
+            )
+
+            # 获取搜索结果
+            results = []
+            elements = driver.find_elements(By.CLASS_NAME, "result")[:self.max_results]
+
+            for elem in elements:
+                try:
+                    title_elem = elem.find_element(By.CSS_SELECTOR, "h3")
+                    title = title_elem.text
+
+                    link_elem = title_elem.find_element(By.TAG_NAME, "a")
+                    link = link_elem.get_attribute("href")
+
+                    abstract_elem = elem.find_element(By.CLASS_NAME, "c-abstract")
+                    abstract = abstract_elem.text
+
+                    results.append({
+                        "title": title,
+                        "link": link,
+                        "abstract": abstract
+                    })
+                except Exception as e:
+                    self.log(f"解析结果出错: {str(e)}")
+
+            self.log(f"找到 {len(results)} 条搜索结果")
+            return {"success": True, "results": results}
+        except Exception as e:
+            broken = self.cancel_token.cancelled or not self._driver_alive(driver)
+            self.cancel_token.check()
+            self.log(f"❌ 搜索失败: {str(e)}")
+            return {"success": False, "error": str(e)}
+        finally:
+            self.cancel_token.unregister(handle)
+            self.pool.release(driver, broken=broken or self.cancel_token.cancelled)
+
+    @staticmethod
+    def _abort_driver(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _driver_alive(driver):
+        """检查借用的浏览器会话是否仍然可用"""
+        try:
+            driver.current_url
+            return True
+        except Exception:
+            return False
+
+    def close(self):
+        """结束本会话的搜索，关闭会话上下文，共享浏览器留在池中供其他会话使用"""
+        if self.initialized:
+            self.initialized = False
+            self.pool.close_session(self.session_id)
+            self.log("搜索组件已关闭")
+        if self._log_handle:
+            get_log_hub().unsubscribe(self._log_handle)
+            self._log_handle = None
+
+
+# 程序输出超过该长度时，结果中只保留预览，完整输出留在落盘文件中
+OUTPUT_PREVIEW_CHARS = 64 * 1024
+
+_NUMERIC_TOKEN_RE = re.compile(r'[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?|[^\s\d.+-]+|\S')
+
+
+def _iter_normalized_lines(lines):
+    """逐行去除行尾空白，并丢弃首尾空行（中间的空行保留）"""
+    pending_blank = 0
+    started = False
+    for line in lines:
+        line = line.rstrip()
+        if not line:
+            if started:
+                pending_blank += 1
+            continue
+        started = True
+        for _ in range(pending_blank):
+            yield ""
+        pending_blank = 0
+        yield line
+
+
+class OutputValidator:
+    """输出验证器基类：预期输出在构造时预处理一次，之后可反复用于匹配"""
+
+    name = "base"
+    description = ""
+    # 支持逐行流式比较的验证器在比较落盘输出时不会一次性读入整个文件
+    streaming = True
+
+    def __init__(self, expected, **options):
+        self.expected = expected
+        self.options = options
+
+    def match_lines(self, lines):
+        """逐行比较输出"""
+        raise NotImplementedError
+
+    def match_text(self, text):
+        """比较完整的输出文本"""
+        return self.match_lines(text.splitlines())
+
+    def match_file(self, path):
+        """比较落盘的输出文件"""
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            if self.streaming:
+                return self.match_lines(f)
+            return self.match_text(f.read())
+
+
+class ExactValidator(OutputValidator):
+    """精确匹配，忽略行尾空白和首尾空行"""
+
+    name = "exact"
+    description = "精确匹配"
+
+    def __init__(self, expected, **options):
+        super().__init__(expected, **options)
+        self._expected_lines = list(_iter_normalized_lines(expected.splitlines()))
+
+    def match_lines(self, lines):
+        actual = _iter_normalized_lines(lines)
+        for expected_line in self._expected_lines:
+            if next(actual, None) != expected_line:
+                return False
+        return next(actual, None) is None
+
+
+class WhitespaceInsensitiveValidator(OutputValidator):
+    """忽略所有空白字符后比较"""
+
+    name = "whitespace"
+    description = "忽略空白字符"
+
+    def __init__(self, expected, **options):
+        super().__init__(expected, **options)
+        self._expected = re.sub(r'\s+', '', expected)
+
+    def match_lines(self, lines):
+        position = 0
+        for line in lines:
+            chunk = re.sub(r'\s+', '', line)
+            if not self._expected.startswith(chunk, position):
+                return False
+            position += len(chunk)
+        return position == len(self._expected)
+
+
+class ContainsValidator(OutputValidator):
+    """输出中包含预期内容即通过"""
+
+    name = "contains"
+    description = "包含预期内容"
+
+    def match_text(self, text):
+        return self.expected in text
+
+    def match_lines(self, lines):
+        # 只保留可能跨行匹配所需的尾部窗口
+        window = ""
+        keep = max(len(self.expected) - 1, 0)
+        for line in lines:
+            window += line
+            if self.expected in window:
+                return True
+            window = window[-keep:] if keep else ""
+        return False
+
+
+class LineSetValidator(OutputValidator):
+    """非空行集合相同即通过，不关心顺序和重复"""
+
+    name = "lines"
+    description = "行集合匹配"
+
+    def __init__(self, expected, **options):
+        super().__init__(expected, **options)
+        self._expected_lines = {line.strip() for line in expected.splitlines() if line.strip()}
+
+    def match_lines(self, lines):
+        seen = set()
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if line not in self._expected_lines:
+                return False
+            seen.add(line)
+        return len(seen) == len(self._expected_lines)
+
+
+class MultisetValidator(OutputValidator):
+    """非空行多重集合相同即通过（不关心顺序，但计较重复次数）"""
+
+    name = "multiset"
+    description = "无序多重集合匹配"
+
+    def __init__(self, expected, **options):
+        super().__init__(expected, **options)
+        self._expected_counts = {}
+        for line in expected.splitlines():
+            line = line.strip()
+            if line:
+                self._expected_counts[line] = self._expected_counts.get(line, 0) + 1
+
+    def match_lines(self, lines):
+        remaining = dict(self._expected_counts)
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            count = remaining.get(line, 0)
+            if count == 0:
+                return False
+            remaining[line] = count - 1
+        return not any(remaining.values())
+
+
+class NumericValidator(OutputValidator):
+    """逐个记号比较，数字按容差比较，其余记号精确比较"""
+
+    name = "numeric"
+    description = "数值容差匹配"
+
+    def __init__(self, expected, rel_tol=1e-6, abs_tol=1e-9, **options):
+        super().__init__(expected, **options)
+        self.rel_tol = rel_tol
+        self.abs_tol = abs_tol
+        self._expected_tokens = list(self._iter_tokens(expected.splitlines()))
+
+    @staticmethod
+    def _iter_tokens(lines):
+        for line in lines:
+            for token in _NUMERIC_TOKEN_RE.findall(line):
+                try:
+                    yield float(token)
+                except ValueError:
+                    yield token
+
+    def match_lines(self, lines):
+        actual = self._iter_tokens(lines)
+        for expected_token in self._expected_tokens:
+            token = next(actual, None)
+            if isinstance(expected_token, float):
+                if not isinstance(token, float):
+                    return False
+                if not math.isclose(token, expected_token, rel_tol=self.rel_tol, abs_tol=self.abs_tol):
+                    return False
+            elif token != expected_token:
+                return False
+        return next(actual, None) is None
+
+
+class JsonValidator(OutputValidator):
+    """结构化比较：按JSON（或Python字面量）解析后比较，浮点数按容差比较"""
+
+    name = "json"
+    description = "JSON结构匹配"
+    streaming = False
+
+    def __init__(self, expected, rel_tol=1e-9, **options):
+        super().__init__(expected, **options)
+        self.rel_tol = rel_tol
+        try:
+            self._expected_value = self._parse(expected)
+        except ValueError as e:
+            raise ValueError(f"预期输出无法解析为JSON: {e}")
+
+    @staticmethod
+    def _parse(text):
+        text = text.strip()
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                return ast.literal_eval(text)
+            except (ValueError, SyntaxError) as e:
+                raise ValueError(str(e))
+
+    def _equal(self, actual, expected):
+        if isinstance(expected, bool) or isinstance(actual, bool):
+            return actual is expected
+        if isinstance(expected, (int, float)) and isinstance(actual, (int, float)):
+            return math.isclose(actual, expected, rel_tol=self.rel_tol)
+        if isinstance(expected, dict):
+            return (isinstance(actual, dict) and actual.keys() == expected.keys()
+                    and all(self._equal(actual[key], expected[key]) for key in expected))
+        if isinstance(expected, (list, tuple)):
+            return (isinstance(actual, (list, tuple)) and len(actual) == len(expected)
+                    and all(self._equal(a, e) for a, e in zip(actual, expected)))
+        return actual == expected
+
+    def match_text(self, text):
+        try:
+            actual = self._parse(text)
+        except ValueError:
+            return False
+        return self._equal(actual, self._expected_value)
+
+
+class RegexValidator(OutputValidator):
+    """预期输出作为正则表达式，对完整输出做全匹配"""
+
+    name = "regex"
+    description = "正则匹配"
+    streaming = False
+
+    def __init__(self, expected, **options):
+        super().__init__(expected, **options)
+        try:
+            self._pattern = re.compile(expected.strip(), re.DOTALL | re.MULTILINE)
+        except re.error as e:
+            raise ValueError(f"预期输出不是合法的正则表达式: {e}")
+
+    def match_text(self, text):
+        return self._pattern.fullmatch(text.strip()) is not None
+
+
+class AutoValidator(OutputValidator):
+    """默认验证链：精确匹配、包含匹配、忽略空白字符依次尝试"""
+
+    name = "auto"
+    description = "自动"
+    chain = (ExactValidator, ContainsValidator, WhitespaceInsensitiveValidator)
+
+    def __init__(self, expected, **options):
+        super().__init__(expected, **options)
+        self._validators = [cls(expected, **options) for cls in self.chain]
+        self.matched_by = None
+
+    def _first_match(self, check):
+        for validator in self._validators:
+            if check(validator):
+                self.matched_by = validator
+                return True
+        self.matched_by = None
+        return False
+
+    def match_lines(self, lines):
+        lines = list(lines)
+        return self._first_match(lambda validator: validator.match_lines(lines))
+
+    def match_text(self, text):
+        return self._first_match(lambda validator: validator.match_text(text))
+
+    def match_file(self, path):
+        return self._first_match(lambda validator: validator.match_file(path))
+
+
+VALIDATORS = {
+    cls.name: cls
+    for cls in (AutoValidator, ExactValidator, WhitespaceInsensitiveValidator, ContainsValidator,
+                LineSetValidator, MultisetValidator, NumericValidator, JsonValidator, RegexValidator)
+}
+
+
+def create_validator(name, expected, **options):
+    """按名称创建输出验证器"""
+    cls = VALIDATORS.get(name)
+    if cls is None:
+        raise ValueError(f"未知的验证方式: {name}")
+    return cls(expected, **options)
+
+
+class PatchError(ValueError):
+    """补丁无法解析或无法应用"""
+
+
+_HUNK_HEADER_RE = re.compile(r'^@@\s*(?:-(\d+)(?:,\d+)?\s+\+\d+(?:,\d+)?\s*)?@@')
+
+
+def parse_unified_diff(text):
+    """解析统一diff，返回 [(文件名或None, [(原文件起始行号或None, [(标记, 行), ...]), ...]), ...]"""
+    files = []
+    current = None
+    hunk = None
+    lines = text.splitlines()
+    for index, line in enumerate(lines):
+        # "--- 文件名" 后面紧跟 "+++ 文件名" 才是文件头，否则是删除行
+        if line.startswith('--- ') and index + 1 < len(lines) and lines[index + 1].startswith('+++ '):
+            hunk = None
+            continue
+        if line.startswith('+++ ') and (hunk is None or lines[index - 1].startswith('--- ')):
+            name = line[4:].split('\t')[0].strip()
+            if name.startswith('b/'):
+                name = name[2:]
+            current = (None if name == '/dev/null' else name, [])
+            files.append(current)
+            hunk = None
+            continue
+        header = _HUNK_HEADER_RE.match(line)
+        if header:
+            if current is None:
+                current = (None, [])
+                files.append(current)
+            hunk = (int(header.group(1)) if header.group(1) else None, [])
+            current[1].append(hunk)
+            continue
+        if hunk is None or line.startswith('\\'):
+            continue
+        if line[:1] in (' ', '-', '+'):
+            hunk[1].append((line[0], line[1:]))
+        elif not line.strip():
+            # 模型常把空白上下文行的前导空格丢掉
+            hunk[1].append((' ', ''))
+        else:
+            hunk = None
+
+    files = [(name, hunks) for name, hunks in files if any(lines for _, lines in hunks)]
+    if not files:
+        raise PatchError("没有找到有效的diff块")
+    return files
+
+
+def _find_block(lines, block, expected):
+    """在lines中查找block，先精确匹配再逐步放宽空白比较，优先选择离expected最近的位置"""
+    if not block:
+        return max(0, min(expected, len(lines)))
+    for normalize in (lambda s: s, str.rstrip, lambda s: " ".join(s.split())):
+        wanted = [normalize(line) for line in block]
+        candidates = [i for i in range(len(lines) - len(block) + 1) if normalize(lines[i]) == wanted[0]]
+        for i in sorted(candidates, key=lambda i: abs(i - expected)):
+            if all(normalize(lines[i + j]) == wanted[j] for j in range(1, len(block))):
+                return i
+    return None
+
+
+def apply_hunks(text, hunks, max_fuzz=2):
+    """把diff块应用到文本上：位置按行号偏移就近查找，找不到时最多去掉max_fuzz行首尾上下文再试"""
+    lines = text.splitlines()
+    offset = 0
+    for number, (old_start, hunk_lines) in enumerate(hunks, 1):
+        leading = next((i for i, (tag, _) in enumerate(hunk_lines) if tag != ' '), len(hunk_lines))
+        trailing = next((i for i, (tag, _) in enumerate(reversed(hunk_lines)) if tag != ' '), len(hunk_lines))
+        nominal = (old_start - 1) if old_start else 0
+        for fuzz in range(max_fuzz + 1):
+            cut_start = min(fuzz, leading)
+            cut_end = min(fuzz, trailing)
+            body = hunk_lines[cut_start:len(hunk_lines) - cut_end]
+            old = [text for tag, text in body if tag in ' -']
+            new = [text for tag, text in body if tag in ' +']
+            position = _find_block(lines, old, nominal + offset + cut_start)
+            if position is not None:
+                break
+        else:
+            raise PatchError(f"第{number}个diff块无法匹配当前文件内容")
+        lines[position:position + len(old)] = new
+        offset = position - nominal - cut_start + len(new) - len(old)
+    return "\n".join(lines) + "\n"
+
+
+# 静态预检时视为已定义的模块级名称
+_MODULE_NAMES = {"__name__", "__file__", "__doc__", "__spec__", "__loader__", "__package__", "__builtins__",
+                 "__annotations__", "__path__", "__cached__", "__class__", "__qualname__", "__module__"}
+# 出现这些调用时名称可能被动态定义，不检查未定义的名称
+_DYNAMIC_SCOPE_CALLS = {"exec", "eval", "globals", "locals", "vars", "__import__"}
+# match语句的捕获模式（Python 3.10+）
+_MATCH_CAPTURES = tuple(getattr(ast, name) for name in ("MatchAs", "MatchStar") if hasattr(ast, name))
+
+
+def _bound_names(tree):
+    """收集模块中任意作用域内绑定过的名称（不区分作用域，宁可漏报不误报），有 import * 时返回None"""
+    bound = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+            bound.add(node.id)
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            bound.add(node.name)
+        elif isinstance(node, ast.arg):
+            bound.add(node.arg)
+        elif isinstance(node, (ast.Import, ast.ImportFrom)):
+            for alias in node.names:
+                if alias.name == "*":
+                    return None
+                bound.add(alias.asname or alias.name.split(".")[0])
+        elif isinstance(node, ast.ExceptHandler) and node.name:
+            bound.add(node.name)
+        elif isinstance(node, (ast.Global, ast.Nonlocal)):
+            bound.update(node.names)
+        elif isinstance(node, _MATCH_CAPTURES) and node.name:
+            bound.add(node.name)
+        elif getattr(node, "rest", None) and isinstance(node.rest, str):
+            # match语句中的 **rest
+            bound.add(node.rest)
+    return bound
+
+
+def _is_main_guard(test):
+    """是否为 if __name__ == "__main__" 条件（作为脚本运行时总是成立）"""
+    return (isinstance(test, ast.Compare) and isinstance(test.left, ast.Name) and test.left.id == "__name__"
+            and len(test.ops) == 1 and isinstance(test.ops[0], ast.Eq)
+            and isinstance(test.comparators[0], ast.Constant) and test.comparators[0].value == "__main__")
+
+
+def _unguarded_imports(statements):
+    """模块级一定会执行的导入，返回 [(模块顶层名, 行号)]
+
+    函数、类、try语句和if语句中的导入都视为受保护（例如 if TYPE_CHECKING、按平台导入），
+    只有 if __name__ == "__main__" 的主体例外
+    """
+    imports = []
+    for node in statements:
+        if isinstance(node, ast.Import):
+            imports.extend((alias.name.split(".")[0], node.lineno) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if not node.level and node.module:
+                imports.append((node.module.split(".")[0], node.lineno))
+        elif isinstance(node, ast.If):
+            if _is_main_guard(node.test):
+                imports.extend(_unguarded_imports(node.body))
+        elif isinstance(node, (ast.For, ast.While, ast.With)):
+            imports.extend(_unguarded_imports(node.body))
+            imports.extend(_unguarded_imports(getattr(node, "orelse", [])))
+    return imports
+
+
+def static_check(code, filename="main.py"):
+    """在进程内对候选代码做静态预检：语法错误和未定义的名称
+
+    返回 (问题列表, 语法树)，问题为带行号的中文诊断；有语法错误时语法树为None
+    """
+    try:
+        tree = ast.parse(code, filename=filename)
+        compile(tree, filename, "exec")
+    except SyntaxError as e:
+        problem = f"第{e.lineno}行: 语法错误: {e.msg}"
+        if e.text:
+            problem += f"\n    {e.text.rstrip()}"
+            if e.offset:
+                problem += f"\n    {' ' * (e.offset - 1)}^"
+        return [problem], None
+    except ValueError as e:
+        # 例如源码中含有空字节
+        return [f"无法编译: {e}"], None
+
+    bound = _bound_names(tree)
+    if bound is None:
+        return [], tree
+    loads = [node for node in ast.walk(tree) if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Load)]
+    if any(node.id in _DYNAMIC_SCOPE_CALLS for node in loads):
+        return [], tree
+    known = bound | _MODULE_NAMES | set(dir(builtins))
+    problems = []
+    reported = set()
+    for node in sorted(loads, key=lambda node: (node.lineno, node.col_offset)):
+        if node.id in known or node.id in reported:
+            continue
+        reported.add(node.id)
+        problem = f"第{node.lineno}行: 未定义的名称 '{node.id}'"
+        similar = difflib.get_close_matches(node.id, known, n=1)
+        if similar:
+            problem += f"，是否应为 '{similar[0]}'？"
+        problems.append(problem)
+    return problems, tree
+
+
+# 只执行不影响可导入模块的代码的.pth文件（setuptools安装的distutils替换钩子）
+_NEUTRAL_PTH_FILES = {"distutils-precedence.pth"}
+
+
+def site_packages_modules(venv_path):
+    """虚拟环境site-packages中可导入的顶层模块名（包括.pth中列出的目录）
+
+    找不到site-packages，或者.pth中有执行代码的import行时返回None：可编辑安装和命名空间包通过这些代码
+    注册导入钩子，其中的模块无法从目录中列出
+    """
+    venv_path = Path(venv_path)
+    directories = list(venv_path.glob("lib/python*/site-packages")) + list(venv_path.glob("Lib/site-packages"))
+    if not directories:
+        return None
+    names = set()
+    index = 0
+    while index < len(directories):
+        directory = directories[index]
+        index += 1
+        try:
+            entries = list(directory.iterdir())
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.suffix == ".pth":
+                try:
+                    lines = entry.read_text(encoding='utf-8', errors='replace').splitlines()
+                except OSError:
+                    continue
+                for line in lines:
+                    line = line.strip()
+                    if line.startswith(("import ", "import\t")) and entry.name not in _NEUTRAL_PTH_FILES:
+                        return None
+                    if line and not line.startswith(("#", "import ", "import\t")):
+                        path = Path(line) if Path(line).is_absolute() else directory / line
+                        if path.is_dir() and path not in directories:
+                            directories.append(path)
+            elif entry.is_dir():
+                names.add(entry.name)
+            elif entry.suffix in (".py", ".so", ".pyd"):
+                names.add(entry.name.split(".")[0])
+    return names
+
+
+class TestCase:
+    """一个测试用例：标准输入、命令行参数和预期输出，可单独指定验证方式"""
+
+    __slots__ = ("name", "input", "args", "expected", "validator", "options")
+
+    def __init__(self, name, input=None, args=None, expected="", validator=None, options=None):
+        self.name = name
+        self.input = input
+        self.args = [str(arg) for arg in (args or [])]
+        self.expected = expected
+        self.validator = validator
+        self.options = options or {}
+        if validator and validator not in VALIDATORS:
+            raise ValueError(f"测试用例 {name} 的验证方式未知: {validator}")
+
+    @classmethod
+    def from_dict(cls, data, index=1):
+        args = data.get("args")
+        if isinstance(args, str):
+            args = args.split()
+        return cls(
+            name=data.get("name") or f"case{index}",
+            input=data.get("input"),
+            args=args,
+            expected=str(data.get("expected", "")),
+            validator=data.get("validator"),
+            options=data.get("options")
+        )
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def describe(self, limit=200):
+        """用于提示词的简短描述"""
+        parts = [self.name]
+        if self.args:
+            parts.append(f"参数: {' '.join(self.args)}")
+        if self.input is not None:
+            parts.append(f"标准输入: {self.input[:limit]!r}")
+        parts.append(f"预期输出: {self.expected[:limit]!r}")
+        return ", ".join(parts)
+
+
+def load_test_cases(source):
+    """从用例列表、JSON文本或JSON文件路径加载测试用例"""
+    if not source:
+        return []
+    if isinstance(source, str):
+        text = source
+        if not source.lstrip().startswith('['):
+            with open(source, 'r', encoding='utf-8') as f:
+                text = f.read()
+        source = json.loads(text)
+    return [case if isinstance(case, TestCase) else TestCase.from_dict(case, index)
+            for index, case in enumerate(source, 1)]
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def get_http_session():
+    """获取进程内共享的HTTP连接池"""
+    global _http_session
+    with _http_session_lock:
+        if _http_session is None:
+            import requests
+
+            _http_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=64)
+            _http_session.mount("http://", adapter)
+            _http_session.mount("https://", adapter)
+        return _http_session
+
+
+def parse_endpoints(text, default_port=1234):
+    """解析端点列表，支持 "host:port, host2:port2" 字符串或 (host, port) 列表"""
+    if isinstance(text, str):
+        items = [item for item in re.split(r'[,\s;]+', text) if item]
+    else:
+        items = list(text or [])
+
+    endpoints = []
+    for item in items:
+        if isinstance(item, (tuple, list)):
+            host, port = item
+        else:
+            address = re.sub(r'^https?://', '', item.strip()).rstrip('/')
+            host, sep, port = address.rpartition(':')
+            if not sep:
+                host, port = address, default_port
+        try:
+            port = int(port)
+        except ValueError:
+            raise ValueError(f"端点端口必须是数字: {item}")
+        if not host:
+            raise ValueError(f"端点缺少主机名: {item}")
+        endpoints.append((host, port))
+
+    if not endpoints:
+        raise ValueError("至少需要一个LLM服务端点")
+    return endpoints
+
+
+class LLMEndpoint:
+    """单个LLM服务端点的负载与健康状态"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.base_url = f"http://{host}:{port}"
+        self.outstanding = 0  # 正在进行中的请求数
+        self.latency_ewma = None  # 请求延迟的指数加权平均（秒）
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # 熔断打开的截止时间
+        self.half_open_probe = False  # 熔断半开时是否已有试探请求
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    def is_open(self, now):
+        return now < self.open_until
+
+    def __repr__(self):
+        return f"LLMEndpoint({self.address})"
+
+
+class LLMEndpointPool:
+    """LLM服务端点池：负载均衡路由、周期健康检查、熔断与故障转移"""
+
+    STRATEGIES = ("least_outstanding", "latency_ewma")
+
+    def __init__(self, endpoints, strategy="least_outstanding", failure_threshold=3,
+                 cooldown=30, health_interval=15, ewma_alpha=0.3):
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"未知的负载均衡策略: {strategy}")
+        self.endpoints = [LLMEndpoint(host, port) for host, port in endpoints]
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.health_interval = health_interval
+        self.ewma_alpha = ewma_alpha
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._health_thread = None
+
+    def _available(self, endpoint, now):
+        """端点是否可以接收新请求（熔断关闭，或冷却结束后允许一个试探请求）"""
+        if endpoint.open_until == 0.0:
+            return True
+        if endpoint.is_open(now):
+            return False
+        return not endpoint.half_open_probe
+
+    def _load(self, endpoint):
+        if self.strategy == "latency_ewma":
+            # 尚无延迟数据的端点优先被探索
+            latency = endpoint.latency_ewma or 0.0
+            return latency * (endpoint.outstanding + 1), endpoint.consecutive_failures
+        return endpoint.outstanding, endpoint.consecutive_failures, endpoint.latency_ewma or 0.0
+
+    def acquire(self, exclude=()):
+        """选择一个端点并登记进行中的请求，没有可用端点时返回None"""
+        with self._lock:
+            now = time.time()
+            candidates = [endpoint for endpoint in self.endpoints
+                          if endpoint not in exclude and self._available(endpoint, now)]
+            if not candidates:
+                return None
+            endpoint = min(candidates, key=self._load)
+            if endpoint.open_until:
+                endpoint.half_open_probe = True
+            endpoint.outstanding += 1
+            return endpoint
+
+    def release(self, endpoint, success, latency=None):
+        """请求结束，更新端点的延迟统计与熔断状态"""
+        with self._lock:
+            endpoint.outstanding = max(0, endpoint.outstanding - 1)
+            endpoint.half_open_probe = False
+            if success:
+                self._record_success(endpoint, latency)
+            else:
+                self._record_failure(endpoint)
+
+    def _record_success(self, endpoint, latency=None):
+        endpoint.consecutive_failures = 0
+        endpoint.open_until = 0.0
+        if latency is not None:
+            if endpoint.latency_ewma is None:
+                endpoint.latency_ewma = latency
+            else:
+                endpoint.latency_ewma += self.ewma_alpha * (latency - endpoint.latency_ewma)
+
+    def _record_failure(self, endpoint):
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.failure_threshold or endpoint.open_until:
+            endpoint.open_until = time.time() + self.cooldown
+
+    def probe(self, endpoint):
+        """对端点执行一次健康检查（GET /v1/models）"""
+        try:
+            response = get_http_session().get(f"{endpoint.base_url}/v1/models", timeout=5)
+            healthy = response.status_code == 200
+        except Exception:
+            healthy = False
+        with self._lock:
+            if healthy:
+                # 健康检查只关闭熔断，不计入请求延迟
+                self._record_success(endpoint)
+            else:
+                self._record_failure(endpoint)
+        return healthy
+
+    def start_health_checks(self):
+        """启动后台健康检查线程"""
+        if self._health_thread or self.health_interval <= 0:
+            return
+        self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+        self._health_thread.start()
+
+    def _health_loop(self):
+        while not self._stop_event.wait(self.health_interval):
+            for endpoint in self.endpoints:
+                self.probe(endpoint)
+
+    def stop(self):
+        """停止健康检查"""
+        self._stop_event.set()
+
+    def status(self):
+        """返回各端点的状态快照"""
+        with self._lock:
+            now = time.time()
+            return [{
+                "address": endpoint.address,
+                "outstanding": endpoint.outstanding,
+                "latency_ewma": endpoint.latency_ewma,
+                "consecutive_failures": endpoint.consecutive_failures,
+                "circuit_open": endpoint.is_open(now)
+            } for endpoint in self.endpoints]
+
+
+_endpoint_pools = {}
+_endpoint_pools_lock = threading.Lock()
+
+
+def get_endpoint_pool(endpoints, strategy="least_outstanding"):
+    """获取进程内共享的端点池，相同端点列表的会话共用负载与健康状态"""
+    key = (tuple(endpoints), strategy)
+    with _endpoint_pools_lock:
+        pool = _endpoint_pools.get(key)
+        if pool is None:
+            pool = LLMEndpointPool(endpoints, strategy=strategy)
+            pool.start_health_checks()
+            _endpoint_pools[key] = pool
+        return pool
+
+
+
+# 执行节点的RPC协议：每帧为4字节大端长度加UTF-8 JSON，请求 {"id", "token", "method", "params"}，
+# 响应 {"id", "result"} 或 {"id", "error"}
+WORKER_DEFAULT_PORT = 7341
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+_FRAME_HEADER = struct.Struct(">I")
+
+
+class WorkerError(Exception):
+    """执行节点返回了错误"""
+
+
+class WorkerUnavailable(WorkerError):
+    """执行节点无法连接或连接中断，可以换到其他节点重试"""
+
+
+def send_frame(sock, message):
+    """发送一帧"""
+    data = json.dumps(message, ensure_ascii=False).encode("utf-8")
+    sock.sendall(_FRAME_HEADER.pack(len(data)) + data)
+
+
+def _recv_exact(sock, size):
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1024 * 1024))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def recv_frame(sock):
+    """接收一帧，对方在帧边界关闭连接时返回None"""
+    header = _recv_exact(sock, _FRAME_HEADER.size)
+    if header is None:
+        return None
+    (length,) = _FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME_BYTES:
+        raise ValueError(f"帧过大: {length} 字节")
+    data = _recv_exact(sock, length)
+    if data is None:
+        raise ConnectionError("连接在帧中途关闭")
+    return json.loads(data)
+
+
+class WorkerNode:
+    """单个执行节点的连接参数、负载与健康状态"""
+
+    def __init__(self, host, port, token=None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.capacity = 1  # 节点同时运行的进程数上限，由健康检查更新
+        self.running = 0  # 节点上正在运行的进程数（所有客户端），由健康检查更新
+        self.bound = 0  # 本进程中绑定到该节点的会话数
+        self.consecutive_failures = 0
+        self.open_until = 0.0  # 熔断打开的截止时间
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+    def __repr__(self):
+        return f"WorkerNode({self.address})"
+
+    def call(self, method, params, timeout=None, cancel_token=None, abort=None):
+        """调用节点上的方法并等待结果；timeout为等待结果的时限（None为不限）
+
+        等待期间取消或abort事件被设置时通知节点结束对应的进程，然后抛出 OperationCancelled / ProcessAborted
+        """
+        call_id = uuid.uuid4().hex
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=10)
+        except OSError as e:
+            raise WorkerUnavailable(f"无法连接执行节点 {self.address}: {e}")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            send_frame(sock, {"id": call_id, "token": self.token, "method": method, "params": params})
+            while True:
+                readable, _, _ = select.select([sock], [], [], 0.2)
+                if readable:
+                    sock.settimeout(60)
+                    response = recv_frame(sock)
+                    break
+                if cancel_token is not None and cancel_token.cancelled:
+                    self._cancel(call_id)
+                    raise OperationCancelled(cancel_token.reason)
+                if abort is not None and abort.is_set():
+                    self._cancel(call_id)
+                    raise ProcessAborted()
+                if deadline is not None and time.monotonic() > deadline:
+                    self._cancel(call_id)
+                    raise WorkerUnavailable(f"执行节点 {self.address} 在 {timeout:.0f} 秒内没有响应")
+        except (OSError, ValueError) as e:
+            raise WorkerUnavailable(f"与执行节点 {self.address} 的连接中断: {e}")
+        finally:
+            sock.close()
+        if response is None:
+            raise WorkerUnavailable(f"执行节点 {self.address} 关闭了连接")
+        if "error" in response:
+            raise WorkerError(response["error"])
+        return response["result"]
+
+    def _cancel(self, call_id):
+        """通知节点结束正在运行的调用（尽力而为）"""
+        try:
+            with socket.create_connection((self.host, self.port), timeout=5) as sock:
+                send_frame(sock, {"id": uuid.uuid4().hex, "token": self.token, "method": "cancel",
+                                  "params": {"call_id": call_id}})
+                sock.settimeout(5)
+                recv_frame(sock)
+        except (OSError, ValueError):
+            pass
+
+
+class WorkerPool:
+    """执行节点池：按负载为会话选择节点（会话之后固定在该节点上，工作区和虚拟环境留在节点上）、
+    周期健康检查与熔断"""
+
+    def __init__(self, nodes, token=None, failure_threshold=2, cooldown=30, health_interval=10):
+        self.nodes = [WorkerNode(host, port, token) for host, port in nodes]
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.health_interval = health_interval
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._health_thread = None
+
+    def _load(self, node):
+        # 节点上正在运行的进程加上本进程绑定到节点的会话，按节点容量折算
+        return (node.running + node.bound) / max(1, node.capacity), node.consecutive_failures
+
+    def bind(self, exclude=()):
+        """为一个会话选择负载最低的可用节点，没有可用节点时返回None"""
+        with self._lock:
+            now = time.time()
+            candidates = [node for node in self.nodes if node not in exclude and now >= node.open_until]
+            if not candidates:
+                return None
+            node = min(candidates, key=self._load)
+            node.bound += 1
+            return node
+
+    def unbind(self, node):
+        """会话不再使用该节点"""
+        with self._lock:
+            node.bound = max(0, node.bound - 1)
+
+    def record_failure(self, node):
+        with self._lock:
+            node.consecutive_failures += 1
+            if node.consecutive_failures >= self.failure_threshold or node.open_until:
+                node.open_until = time.time() + self.cooldown
+
+    def probe(self, node):
+        """对节点执行一次健康检查，同时更新节点报告的容量和负载"""
+        try:
+            status = node.call("status", {}, timeout=5)
+        except WorkerError:
+            self.record_failure(node)
+            return False
+        with self._lock:
+            node.capacity = status.get("capacity", node.capacity)
+            node.running = status.get("running", 0)
+            node.consecutive_failures = 0
+            node.open_until = 0.0
+        return True
+
+    def start_health_checks(self):
+        """启动后台健康检查线程（启动时先检查一次，以便第一次选择节点时已有负载数据）"""
+        if self._health_thread or self.health_interval <= 0:
+            return
+        self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+        self._health_thread.start()
+
+    def _health_loop(self):
+        while True:
+            for node in self.nodes:
+                self.probe(node)
+            if self._stop_event.wait(self.health_interval):
+                return
+
+    def stop(self):
+        """停止健康检查"""
+        self._stop_event.set()
+
+    def status(self):
+        """返回各节点的状态快照"""
+        with self._lock:
+            now = time.time()
+            return [{
+                "address": node.address,
+                "capacity": node.capacity,
+                "running": node.running,
+                "bound": node.bound,
+                "consecutive_failures": node.consecutive_failures,
+                "circuit_open": now < node.open_until
+            } for node in self.nodes]
+
+
+_worker_pools = {}
+_worker_pools_lock = threading.Lock()
+
+
+def get_worker_pool(nodes):
+    """获取进程内共享的执行节点池，相同节点列表的会话共用负载与健康状态；
+    节点要求认证时用环境变量 AUTOCODER_WORKER_TOKEN 指定令牌"""
+    key = tuple(nodes)
+    with _worker_pools_lock:
+        pool = _worker_pools.get(key)
+        if pool is None:
+            pool = WorkerPool(nodes, token=os.environ.get("AUTOCODER_WORKER_TOKEN") or None)
+            pool.start_health_checks()
+            _worker_pools[key] = pool
+        return pool
+
+
+class AdaptiveConcurrencyLimiter:
+    """自适应并发限制器：按AIMD根据延迟和错误调整允许的并发请求数，调用者按先来先服务排队"""
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=64, backoff=0.5,
+                 latency_tolerance=2.0, latency_target=None, ewma_alpha=0.1):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff  # 乘性减小系数
+        self.latency_tolerance = latency_tolerance  # 延迟超过基线的倍数视为过载
+        self.latency_target = latency_target  # 指定时用固定延迟目标代替基线
+        self.ewma_alpha = ewma_alpha
+        self.latency_baseline = None
+        self._in_flight = 0
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._last_decrease = 0.0
+        # 指标
+        self.total_acquired = 0
+        self.total_timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def effective_limit(self):
+        return max(self.min_limit, int(self.limit))
+
+    def acquire(self, timeout=None, cancel_token=None):
+        """排队获取一个并发许可，返回等待时间（秒），超时返回None，被取消时抛出 OperationCancelled"""
+        ticket = object()
+        with self._cond:
+            enqueued = time.monotonic()
+            self._queue.append(ticket)
+            acquired = False
+            try:
+                while True:
+                    if self._queue[0] is ticket and self._in_flight < self.effective_limit:
+                        self._queue.popleft()
+                        self._in_flight += 1
+                        acquired = True
+                        break
+                    if cancel_token:
+                        cancel_token.check()
+                    remaining = None if timeout is None else enqueued + timeout - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self.total_timeouts += 1
+                        break
+                    # 分段等待以便及时响应取消
+                    self._cond.wait(0.2 if remaining is None else min(remaining, 0.2))
+            finally:
+                if not acquired:
+                    self._queue.remove(ticket)
+                # 队首变化后唤醒其他等待者
+                self._cond.notify_all()
+
+            if not acquired:
+                return None
+            wait = time.monotonic() - enqueued
+            self.total_acquired += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            return wait
+
+    def release(self, success=True, latency=None):
+        """归还许可并根据本次请求结果调整并发上限"""
+        with self._cond:
+            self._in_flight = max(0, self._in_flight - 1)
+            if not success:
+                self._decrease()
+            elif latency is not None:
+                threshold = self.latency_target
+                if threshold is None and self.latency_baseline is not None:
+                    threshold = self.latency_baseline * self.latency_tolerance
+                if threshold is not None and latency > threshold:
+                    self._decrease()
+                else:
+                    # 加性增加：每个完整窗口大约增加1
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.effective_limit)
+                if self.latency_baseline is None:
+                    self.latency_baseline = latency
+                else:
+                    self.latency_baseline += self.ewma_alpha * (latency - self.latency_baseline)
+            self._cond.notify_all()
+
+    def _decrease(self):
+        # 同一批并发请求的连续失败只减小一次
+        now = time.monotonic()
+        cooldown = self.latency_baseline or 1.0
+        if now - self._last_decrease < cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.backoff)
+
+    def metrics(self):
+        """返回当前指标快照"""
+        with self._cond:
+            return {
+                "limit": self.effective_limit,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._queue),
+                "total_acquired": self.total_acquired,
+                "total_timeouts": self.total_timeouts,
+                "avg_wait": self.total_wait / self.total_acquired if self.total_acquired else 0.0,
+                "max_wait": self.max_wait,
+                "latency_baseline": self.latency_baseline
+            }
+
+
+_TOKEN_RE = re.compile(r'[A-Za-z_][A-Za-z0-9_]*|\d+|[一-鿿]')
+
+
+class LatencyStats:
+    """按阶段记录耗时样本（每个阶段保留最近window个），供自适应超时取分位数"""
+
+    def __init__(self, window=50):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def observe(self, phase, value):
+        with self._lock:
+            samples = self._samples.get(phase)
+            if samples is None:
+                samples = self._samples[phase] = deque(maxlen=self.window)
+            samples.append(value)
+
+    def quantile(self, phase, q, min_samples=3):
+        """q分位数，样本不足min_samples个时返回None"""
+        with self._lock:
+            samples = sorted(self._samples.get(phase, ()))
+        if len(samples) < min_samples:
+            return None
+        position = q * (len(samples) - 1)
+        lower = int(position)
+        upper = min(lower + 1, len(samples) - 1)
+        return samples[lower] + (samples[upper] - samples[lower]) * (position - lower)
+
+    def metrics(self):
+        """各阶段的样本数、中位数和p95"""
+        with self._lock:
+            phases = list(self._samples)
+        return {phase: {"count": len(self._samples[phase]),
+                        "p50": self.quantile(phase, 0.5, min_samples=1),
+                        "p95": self.quantile(phase, 0.95, min_samples=1)}
+                for phase in phases}
+
+
+class TokenLedger:
+    """LLM调用的token用量，按任务累计并按开发周期细分（只保留最近max_cycles个周期的细分）"""
+
+    def __init__(self, max_cycles=200):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.estimated_calls = 0  # 服务未返回usage、按字符数估算的调用数
+        self.max_cycles = max_cycles
+        self.per_cycle = {}
+        self._lock = threading.Lock()
+
+    @property
+    def total_tokens(self):
+        return self.prompt_tokens + self.completion_tokens
+
+    def record(self, cycle, prompt_tokens, completion_tokens, estimated=False):
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            if estimated:
+                self.estimated_calls += 1
+            usage = self.per_cycle.setdefault(cycle, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0})
+            usage["calls"] += 1
+            usage["prompt_tokens"] += prompt_tokens
+            usage["completion_tokens"] += completion_tokens
+            while len(self.per_cycle) > self.max_cycles:
+                del self.per_cycle[min(self.per_cycle)]
+
+    def describe(self):
+        """单行描述"""
+        text = (f"{self.total_tokens} tokens (提示 {self.prompt_tokens}, 生成 {self.completion_tokens}, "
+                f"{self.calls} 次调用)")
+        if self.estimated_calls:
+            text += f"，其中 {self.estimated_calls} 次为估算"
+        return text
+
+    def restore(self, data):
+        """从to_dict()的结果恢复（检查点恢复时使用）"""
+        with self._lock:
+            self.calls = data["calls"]
+            self.prompt_tokens = data["prompt_tokens"]
+            self.completion_tokens = data["completion_tokens"]
+            self.estimated_calls = data["estimated_calls"]
+            self.per_cycle = {int(cycle): dict(usage) for cycle, usage in data["per_cycle"].items()}
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.total_tokens,
+                "estimated_calls": self.estimated_calls,
+                "per_cycle": {cycle: dict(usage) for cycle, usage in self.per_cycle.items()}
+            }
+
+
+# 停止序列：模型开始复述提示词、虚构下一轮的执行结果或输出对话模板标记时结束生成
+STOP_SEQUENCES = ["[执行结果]", "[原始任务需求]", "<|im_end|>", "<|im_start|>"]
+# 预计的动作只需要较短的响应时使用的生成上限（占max_tokens的比例），CODE使用完整的max_tokens
+ACTION_TOKEN_RATIOS = {"COMMAND": 0.4, "SEARCH": 0.4, "PATCH": 0.6}
+MIN_ACTION_TOKENS = 512
+
+_ACTION_RE = re.compile(r'\[ACTION\]\s*(CODE|PATCH|COMMAND|SEARCH)', re.IGNORECASE)
+_CONTENT_HEADER_RE = re.compile(r'\[CONTENT(?:[ \t]+\d+)?\]')
+# 一个部分的内容已结束：有非空内容，之后出现空行或下一个部分的"["
+_SECTION_END_RE = re.compile(r'\s*\S.*?(?:\n[ \t]*\n|\[)', re.DOTALL)
+
+
+def response_complete(text, require_expected=False):
+    """流式生成过程中判断响应是否已包含解析所需的全部部分（ACTION、CONTENT、NEXT STEPS，
+    require_expected时还需要EXPECTED OUTPUT），且最后一个部分已经结束
+
+    带编号的多动作响应只检查最后一个动作及其之后的部分
+    """
+    if "<think>" in text:
+        if "</think>" not in text:
+            return False
+        text = text.split("</think>", 1)[1]
+    if text.count("```") % 2:
+        return False
+    actions = list(_PLAN_ACTION_RE.finditer(text))
+    if actions:
+        text = text[actions[-1].end():]
+    elif not _ACTION_RE.search(text):
+        return False
+    content = _CONTENT_HEADER_RE.search(text)
+    if content is None:
+        return False
+    ends = [content.end()]
+    for header in ["[NEXT STEPS]"] + (["[EXPECTED OUTPUT]"] if require_expected else []):
+        position = text.find(header)
+        if position < 0:
+            return False
+        ends.append(position + len(header))
+    return _SECTION_END_RE.match(text, max(ends)) is not None
+
+
+class PlannedAction:
+    """多动作响应中的一个动作"""
+
+    __slots__ = ("index", "action", "content", "depends_on")
+
+    def __init__(self, index, action, content, depends_on=None):
+        self.index = index
+        self.action = action
+        self.content = content  # 动作的原始内容段落，执行前按动作类型提取
+        self.depends_on = depends_on  # 依赖的动作编号，None表示未标注
+
+    @property
+    def is_install(self):
+        return self.action == "COMMAND" and self.content.lstrip().startswith("pip install")
+
+    def describe(self):
+        return f"动作{self.index} {self.action}"
+
+
+_PLAN_ACTION_RE = re.compile(
+    r'^[ \t]*\[ACTION[ \t]+(\d+)\][ \t]*(?:[(（][ \t]*(?:依赖|depends?(?:[ \t]+on)?|after)[ \t]*[:：]?([^)）\n]*)[)）])?'
+    r'\s*(CODE|PATCH|COMMAND|SEARCH)\b', re.IGNORECASE | re.MULTILINE)
+_PLAN_END_RE = re.compile(r'^[ \t]*\[(?:EXPECTED OUTPUT|NEXT STEPS)\]', re.MULTILINE)
+
+
+def parse_action_plan(response):
+    """解析带编号的多动作响应（[ACTION 1]、[ACTION 2] (依赖: 1) ...），不是多动作格式时返回空列表"""
+    if "</think>" in response:
+        response = response.split("</think>", 1)[1]
+    headers = list(_PLAN_ACTION_RE.finditer(response))
+    plan = []
+    for position, header in enumerate(headers):
+        end = headers[position + 1].start() if position + 1 < len(headers) else len(response)
+        tail = _PLAN_END_RE.search(response, header.end(), end)
+        segment = response[header.end():tail.start() if tail else end]
+        segment = re.sub(r'^\s*\[CONTENT(?:[ \t]+\d+)?\]', '', segment).strip()
+        depends_on = None
+        if header.group(2) is not None:
+            depends_on = [int(number) for number in re.findall(r'\d+', header.group(2))]
+        plan.append(PlannedAction(int(header.group(1)), header.group(3).upper(), segment, depends_on))
+    return plan
+
+
+# 多动作响应的格式说明，单次提示和多轮对话模式共用
+MULTI_ACTION_PROMPT = """如果需要多个步骤（例如先安装依赖再运行代码），可以在一次响应中给出编号的多个动作，
+每个动作可以用"(依赖: 编号)"标注需要先完成的动作：
+[ACTION 1]
+COMMAND
+[CONTENT 1]
+pip install xxx
+
+[ACTION 2] (依赖: 1)
+CODE
+[CONTENT 2]
+# filename: main.py
+代码内容...
+互不依赖的动作会并发执行；未标注依赖时，pip安装和搜索立即执行，CODE、PATCH和运行脚本在之前的全部动作完成后执行。
+"""
+
+SYSTEM_PROMPT = "你是一个Python专家，请分析问题并生成代码解决方案。使用<think>标签记录你的思考过程。"
+
+# 多轮对话模式下放在系统提示中的响应格式说明（不随周期变化，以便服务端复用前缀缓存）
+CONVERSATION_FORMAT = """每次回复先在<think>标签中分析当前状况并规划解决方案，然后使用以下固定格式给出行动方案：
+
+[ACTION]
+(必须且只能选择以下之一)
+CODE - 生成代码文件
+COMMAND - 执行环境命令
+SEARCH - 搜索相关资料
+PATCH - 修改当前文件（统一diff格式，只输出改动的部分；只在已有当前文件时可用，小改动优先使用）
+
+[CONTENT]
+根据ACTION类型，提供具体内容：
+- CODE时: 包含文件名和完整代码
+  # filename: xxx.py
+  代码内容...
+- PATCH时: 提供针对当前文件的统一diff
+  ```diff
+  --- a/文件名
+  +++ b/文件名
+  @@ -起始行,行数 +起始行,行数 @@
+   上下文行
+  -删除的行
+  +新增的行
+  ```
+- COMMAND时: 提供命令
+  pip install xxx 或 python xxx.py
+- SEARCH时: 提供搜索关键词
+  keyword1 keyword2 ...
+
+[EXPECTED OUTPUT]
+运行代码后的精确预期输出结果...
+
+[NEXT STEPS]
+- 列出下一步需要实现的功能或需要解决的问题
+- 每行一个步骤
+
+""" + MULTI_ACTION_PROMPT
+
+
+def estimate_tokens(text):
+    """粗略估算token数：按UTF-8字节数的1/3计算（中文约每字1个token，英文偏保守）"""
+    return len(text.encode("utf-8")) // 3 + 4
+
+
+class Conversation:
+    """多轮对话模式的消息历史
+
+    系统提示和任务描述作为固定前缀，之后每个周期追加一轮（观察结果, 模型响应），
+    服务端的前缀缓存可以复用之前各轮已计算的部分。历史超出上下文时一次丢弃最早的若干轮，
+    直到只占可用空间的一半，之后的几个周期前缀又保持稳定
+    """
+
+    def __init__(self, context_tokens=8192):
+        self.context_tokens = context_tokens
+        self.turns = []  # [(observation, response)]，第一轮的observation为None（任务描述即前缀）
+        self.dropped = 0  # 因超出上下文被丢弃的轮数
+        self.observed_cycle = 0  # 已在观察结果中报告过的最后一个周期
+        self.errors_seen = 0  # 已在观察结果中报告过的错误日志条数
+
+    def messages(self, prefix, observation, reserve_tokens):
+        """构造本次请求的消息：前缀 + 历史轮次 + 本周期的观察结果；reserve_tokens为生成预留的token数"""
+        available = self.context_tokens - reserve_tokens - sum(estimate_tokens(m["content"]) for m in prefix)
+        if observation:
+            available -= estimate_tokens(observation)
+        used = sum(self._turn_tokens(turn) for turn in self.turns)
+        if used > available and self.turns:
+            while self.turns and used > available // 2:
+                used -= self._turn_tokens(self.turns.pop(0))
+                self.dropped += 1
+
+        messages = list(prefix)
+        if self.dropped:
+            # 丢弃的轮次用一条占位的assistant消息代替，保持user/assistant交替
+            messages.append({"role": "assistant", "content": f"（较早的 {self.dropped} 轮对话已省略）"})
+        for turn_observation, response in self.turns:
+            if turn_observation:
+                messages.append({"role": "user", "content": turn_observation})
+            messages.append({"role": "assistant", "content": response})
+        if observation:
+            messages.append({"role": "user", "content": observation})
+        return messages
+
+    @staticmethod
+    def _turn_tokens(turn):
+        observation, response = turn
+        return estimate_tokens(response) + (estimate_tokens(observation) if observation else 0)
+
+    def add_turn(self, observation, response, cycle, errors_seen):
+        """记录一轮成功的对话"""
+        # 历史中不保留思考过程，减少后续每轮的提示长度
+        response = re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL).strip()
+        self.turns.append((observation, response))
+        self.observed_cycle = cycle
+        self.errors_seen = errors_seen
+
+    @property
+    def last_response(self):
+        return self.turns[-1][1] if self.turns else ""
+
+    def restore(self, data):
+        """从to_dict()的结果恢复（检查点恢复时使用）"""
+        self.turns = [tuple(turn) for turn in data["turns"]]
+        self.dropped = data["dropped"]
+        self.observed_cycle = data["observed_cycle"]
+        self.errors_seen = data["errors_seen"]
+
+    def to_dict(self):
+        return {
+            "turns": [list(turn) for turn in self.turns],
+            "dropped": self.dropped,
+            "observed_cycle": self.observed_cycle,
+            "errors_seen": self.errors_seen
+        }
+
+
+# 检查点格式版本，格式不兼容时旧检查点不再用于恢复
+CHECKPOINT_VERSION = 1
+# 可以从检查点继续的运行状态（成功、失败或因token预算用完而结束的运行不再恢复）
+RESUMABLE_STATUSES = ("running",)
+
+
+# 自适应超时的下限和默认上限（秒），上限可通过AutoCoder的timeout_ceilings覆盖
+TIMEOUT_FLOORS = {"llm_first_token": 10, "llm_total": 30, "run": 5, "pip": 20}
+DEFAULT_TIMEOUT_CEILINGS = {"llm_first_token": 600, "llm_total": 1800, "run": 600, "pip": 900}
+
+
+def tokenize(text):
+    """分词：英文标识符转小写整词，中文按单字"""
+    return [token.lower() for token in _TOKEN_RE.findall(text or "")]
+
+
+def code_hash(code):
+    """代码内容的短哈希，用于识别重复的方案"""
+    return hashlib.sha1(code.encode('utf-8')).hexdigest()[:12]
+
+
+def error_signature(text):
+    """把错误输出归一化为签名：异常行加出错代码行，去掉路径、内存地址和数字"""
+    lines = [line.strip() for line in (text or "").strip().splitlines() if line.strip()]
+    if not lines:
+        return ""
+
+    signature = lines[-1]
+    for line in reversed(lines):
+        if re.match(r'^[A-Za-z_][\w.]*(Error|Exception|Warning|Exit|Interrupt)\b', line):
+            signature = line
+            break
+
+    # Traceback 最后一帧 "File ..." 的下一行是出错的代码
+    for i in range(len(lines) - 1, -1, -1):
+        if lines[i].startswith('File "') and i + 1 < len(lines) and lines[i + 1] != signature:
+            signature += f" @ {lines[i + 1]}"
+            break
+
+    signature = re.sub(r'(?:[A-Za-z]:)?[\\/][^\s"\',]+', '<path>', signature)
+    signature = re.sub(r'0x[0-9a-fA-F]+', '<addr>', signature)
+    signature = re.sub(r'\d+', 'N', signature)
+    return signature[:300]
+
+
+class BM25Index:
+    """轻量BM25词法索引，支持增删文档"""
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._terms = {}  # 文档ID -> {词: 词频}
+        self._lengths = {}
+        self._postings = {}  # 词 -> 包含该词的文档ID集合
+        self._total_length = 0
+
+    def __len__(self):
+        return len(self._terms)
+
+    def add(self, doc_id, text):
+        """添加（或替换）文档"""
+        if doc_id in self._terms:
+            self.remove(doc_id)
+        counts = {}
+        tokens = tokenize(text)
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        self._terms[doc_id] = counts
+        self._lengths[doc_id] = len(tokens)
+        self._total_length += len(tokens)
+        for token in counts:
+            self._postings.setdefault(token, set()).add(doc_id)
+
+    def remove(self, doc_id):
+        """删除文档"""
+        counts = self._terms.pop(doc_id, None)
+        if counts is None:
+            return
+        self._total_length -= self._lengths.pop(doc_id)
+        for token in counts:
+            postings = self._postings[token]
+            postings.discard(doc_id)
+            if not postings:
+                del self._postings[token]
+
+    def search(self, query, k=5):
+        """返回得分最高的k个文档 [(文档ID, 得分), ...]"""
+        if not self._terms:
+            return []
+        total = len(self._terms)
+        average_length = self._total_length / total or 1.0
+        scores = {}
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id in postings:
+                tf = self._terms[doc_id][token]
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[doc_id] / average_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class AttemptRecord:
+    """一次开发尝试的精简记录"""
+
+    __slots__ = ("cycle", "action", "target", "code_hash", "error_signature", "success")
+
+    def __init__(self, cycle, action, target="", code_hash=None, error_signature="", success=False):
+        self.cycle = cycle
+        self.action = action
+        self.target = target
+        self.code_hash = code_hash
+        self.error_signature = error_signature
+        self.success = success
+
+    def describe(self):
+        """单行描述，用于提示词和摘要"""
+        text = f"周期{self.cycle} {self.action}"
+        if self.target:
+            text += f" {self.target[:80]}"
+        if self.code_hash:
+            text += f" [代码#{self.code_hash[:8]}]"
+        if self.success:
+            return text + " 成功"
+        return text + (f" 失败: {self.error_signature}" if self.error_signature else " 失败")
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class AttemptStore:
+    """内存有界的尝试记录，按错误签名建立BM25索引，用于检索相关的历史失败"""
+
+    def __init__(self, max_records=200):
+        self.max_records = max_records
+        self._records = deque()  # (文档ID, 记录)
+        self._index = BM25Index()
+        self._next_id = 0
+        self._lock = threading.Lock()  # 多动作并发执行时多个线程同时记录
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return (record for _, record in self._records)
+
+    def add(self, record):
+        """添加记录，超出上限时淘汰最早的记录"""
+        with self._lock:
+            doc_id = self._next_id
+            self._next_id += 1
+            self._records.append((doc_id, record))
+            self._index.add(doc_id, f"{record.action} {record.target} {record.error_signature}")
+            while len(self._records) > self.max_records:
+                old_id, _ = self._records.popleft()
+                self._index.remove(old_id)
+
+    def same_code(self, code_hash):
+        """之前提交过相同代码的记录"""
+        return [record for record in self if record.code_hash == code_hash]
+
+    def relevant_failures(self, query, k=3):
+        """与查询最相关的k条失败记录（按时间排序），查询无匹配时退回最近的失败"""
+        by_id = dict(self._records)
+        matches = [by_id[doc_id] for doc_id, _ in self._index.search(query, k=k * 3)
+                   if not by_id[doc_id].success][:k]
+        if not matches:
+            matches = [record for record in self if not record.success][-k:]
+        return sorted(matches, key=lambda record: record.cycle)
+
+
+
+class ErrorEntry:
+    """按错误签名合并的一条错误"""
+
+    __slots__ = ("message", "signature", "count", "sequence")
+
+    def __init__(self, message, signature, count=1, sequence=0):
+        self.message = message  # 最近一次出现时的错误文本
+        self.signature = signature
+        self.count = count
+        self.sequence = sequence  # 最近一次出现时的序号（错误日志累计的第几条）
+
+    def describe(self):
+        return self.message if self.count == 1 else f"{self.message}（已出现 {self.count} 次）"
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ErrorLog:
+    """内存有界的错误日志：签名相同的错误合并为一条并计数，超出上限时淘汰最久未出现的错误，过长的错误文本只保留首尾
+
+    按序列访问时得到错误文本，最近出现的在最后，与原来的列表用法兼容
+    """
+
+    def __init__(self, max_entries=100, max_chars=4000):
+        self.max_entries = max_entries
+        self.max_chars = max_chars
+        self.total = 0  # 累计记录的错误条数（含合并的重复错误）
+        self._entries = {}  # 签名 -> ErrorEntry，按最近出现的顺序排列
+        self._lock = threading.Lock()  # 多动作并发执行时多个线程同时记录
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self.messages())
+
+    def __getitem__(self, index):
+        return self.messages()[index]
+
+    def messages(self):
+        with self._lock:
+            return [entry.message for entry in self._entries.values()]
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries.values())
+
+    def _truncate(self, message):
+        if len(message) <= self.max_chars:
+            return message
+        # Traceback的关键信息在末尾，保留开头的四分之一和末尾的四分之三
+        head = self.max_chars // 4
+        tail = self.max_chars - head
+        return f"{message[:head]}\n...（省略 {len(message) - self.max_chars} 个字符）...\n{message[-tail:]}"
+
+    def append(self, message):
+        """记录一条错误，与已有错误签名相同时合并"""
+        message = self._truncate(message)
+        signature = error_signature(message) or message[:300]
+        with self._lock:
+            self.total += 1
+            entry = self._entries.pop(signature, None)
+            if entry is None:
+                entry = ErrorEntry(message, signature, sequence=self.total)
+            else:
+                entry.message = message
+                entry.count += 1
+                entry.sequence = self.total
+            self._entries[signature] = entry
+            while len(self._entries) > self.max_entries:
+                del self._entries[next(iter(self._entries))]
+
+    def since(self, sequence):
+        """累计第sequence条之后新出现（或再次出现）的错误"""
+        return [entry for entry in self.entries() if entry.sequence > sequence]
+
+    def restore(self, data):
+        """从to_dict()的结果恢复，也接受旧检查点中的错误文本列表"""
+        if isinstance(data, list):
+            for message in data:
+                self.append(message)
+            return
+        with self._lock:
+            self.total = data["total"]
+            self._entries = {entry["signature"]: ErrorEntry(**entry) for entry in data["entries"]}
+
+    def to_dict(self):
+        return {"total": self.total, "entries": [entry.to_dict() for entry in self.entries()]}
+
+
+class FileRegistry:
+    """项目文件登记：同一文件只记录一次，按最近写入的顺序排列，超出上限时淘汰最久未写入的文件
+
+    按序列访问时得到文件路径，最近写入的在最后，与原来的列表用法兼容
+    """
+
+    def __init__(self, max_files=1000):
+        self.max_files = max_files
+        self._files = {}  # 路径 -> None，按最近写入的顺序排列
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._files)
+
+    def __iter__(self):
+        return iter(self.paths())
+
+    def __reversed__(self):
+        return reversed(self.paths())
+
+    def __getitem__(self, index):
+        return self.paths()[index]
+
+    def __contains__(self, path):
+        return str(path) in self._files
+
+    def paths(self):
+        with self._lock:
+            return list(self._files)
+
+    def append(self, path):
+        """登记写入的文件，已登记的文件移到最后"""
+        path = str(path)
+        with self._lock:
+            self._files.pop(path, None)
+            self._files[path] = None
+            while len(self._files) > self.max_files:
+                del self._files[next(iter(self._files))]
+
+    def restore(self, paths):
+        for path in paths:
+            self.append(path)
+
+
+class HistoryEntry:
+    """一个开发周期的历史记录（思考过程只保留开头部分，完整内容在日志中）"""
+
+    __slots__ = ("cycle", "thinking", "action", "expected_output", "next_steps")
+
+    THINKING_CHARS = 1000
+
+    def __init__(self, cycle, thinking="", action="", expected_output=None, next_steps=()):
+        self.cycle = cycle
+        self.thinking = (thinking or "")[:self.THINKING_CHARS]
+        self.action = action
+        self.expected_output = expected_output
+        self.next_steps = list(next_steps or ())
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+_MINHASH_PRIME = (1 << 61) - 1
+
+
+def _shingles(text, size=3):
+    """把文本切成词级别的n元组集合"""
+    tokens = tokenize(text)
+    if len(tokens) < size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    """MinHash签名，用于估计两段文本shingle集合的Jaccard相似度"""
+
+    def __init__(self, num_perm=64, seed=20240501):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self._params = [(rng.randrange(1, _MINHASH_PRIME), rng.randrange(0, _MINHASH_PRIME))
+                        for _ in range(num_perm)]
+
+    def signature(self, text):
+        hashes = [int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+                  for shingle in _shingles(text)]
+        if not hashes:
+            return [_MINHASH_PRIME] * self.num_perm
+        return [min((a * h + b) % _MINHASH_PRIME for h in hashes) for a, b in self._params]
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        if not sig_a or len(sig_a) != len(sig_b):
+            return 0.0
+        return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class SolutionStore:
+    """跨任务的成功方案库（sqlite持久化），按任务文本的MinHash签名查找近似重复的任务"""
+
+    def __init__(self, db_path=None, max_entries=2000, num_perm=64):
+        self.db_path = str(db_path or cache_dir() / "solutions.db")
+        self.max_entries = max_entries
+        self.hasher = MinHasher(num_perm=num_perm)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS solutions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    task_key TEXT UNIQUE NOT NULL,
+                    task TEXT NOT NULL,
+                    notes TEXT NOT NULL,
+                    expected_output TEXT,
+                    filename TEXT NOT NULL,
+                    code TEXT NOT NULL,
+                    packages TEXT NOT NULL,
+                    signature TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )""")
+            rows = self._conn.execute("SELECT id, signature FROM solutions").fetchall()
+        # 签名常驻内存，查找时不必访问数据库
+        self._signatures = {row["id"]: json.loads(row["signature"]) for row in rows}
+
+    @staticmethod
+    def _task_text(task, notes=""):
+        return f"{task}\n{notes}".strip()
+
+    @staticmethod
+    def _task_key(task, notes="", expected_output=None):
+        normalized = " ".join(tokenize(f"{task}\n{notes}\n{expected_output or ''}"))
+        return hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+
+    def add(self, task, notes, expected_output, filename, code, packages=()):
+        """保存成功的方案，相同任务（含预期输出）覆盖旧方案"""
+        signature = self.hasher.signature(self._task_text(task, notes))
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO solutions (task_key, task, notes, expected_output, filename, code, packages,
+                                          signature, created, last_used)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(task_key) DO UPDATE SET filename = excluded.filename, code = excluded.code,
+                       packages = excluded.packages, last_used = excluded.last_used""",
+                (self._task_key(task, notes, expected_output), task, notes or "", expected_output, filename, code,
+                 json.dumps(list(packages)), json.dumps(signature), now, now)
+            )
+            row = self._conn.execute("SELECT id FROM solutions WHERE task_key = ?",
+                                     (self._task_key(task, notes, expected_output),)).fetchone()
+            self._signatures[row["id"]] = signature
+            self._prune()
+
+    def _prune(self):
+        """超出上限时淘汰最久未使用的方案（调用方持有锁）"""
+        overflow = len(self._signatures) - self.max_entries
+        if overflow <= 0:
+            return
+        rows = self._conn.execute("SELECT id FROM solutions ORDER BY last_used LIMIT ?", (overflow,)).fetchall()
+        for row in rows:
+            self._conn.execute("DELETE FROM solutions WHERE id = ?", (row["id"],))
+            self._signatures.pop(row["id"], None)
+
+    def lookup(self, task, notes="", min_similarity=0.5):
+        """查找最相似的历史方案，返回 (方案字典, 相似度)，没有足够相似的方案时返回 (None, 0.0)"""
+        signature = self.hasher.signature(self._task_text(task, notes))
+        with self._lock:
+            best_id, best = None, 0.0
+            for solution_id, other in self._signatures.items():
+                similarity = MinHasher.similarity(signature, other)
+                if similarity > best:
+                    best_id, best = solution_id, similarity
+            if best_id is None or best < min_similarity:
+                return None, 0.0
+            row = self._conn.execute("SELECT * FROM solutions WHERE id = ?", (best_id,)).fetchone()
+        if row is None:
+            return None, 0.0
+        solution = dict(row)
+        solution["packages"] = json.loads(solution["packages"])
+        del solution["signature"]
+        return solution, best
+
+    def mark_used(self, solution_id):
+        """记录一次命中"""
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE solutions SET hits = hits + 1, last_used = ? WHERE id = ?",
+                               (time.time(), solution_id))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_solution_store = None
+_solution_store_lock = threading.Lock()
+
+
+def get_solution_store():
+    """获取进程内共享的方案库，打开失败时返回None（方案库只是加速手段，不影响正常开发）"""
+    global _solution_store
+    with _solution_store_lock:
+        if _solution_store is None:
+            try:
+                _solution_store = SolutionStore()
+            except (sqlite3.Error, OSError):
+                return None
+        return _solution_store
+
+
+
+# 搜索结果页面抓取：并发数、单页超时（秒）、读取的最大字节数和磁盘缓存有效期（秒）
+PAGE_FETCH_WORKERS = 4
+PAGE_FETCH_TIMEOUT = 10
+PAGE_MAX_BYTES = 2 * 1024 * 1024
+PAGE_CACHE_TTL = 24 * 3600
+
+_PAGE_SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form",
+                   "button", "select", "iframe"}
+_PAGE_BLOCK_TAGS = {"p", "div", "section", "article", "main", "li", "ul", "ol", "dl", "dt", "dd", "table", "tr",
+                    "td", "th", "blockquote", "h1", "h2", "h3", "h4", "h5", "h6", "br", "hr", "pre", "body",
+                    "figcaption"}
+_SENTENCE_RE = re.compile(r'.+?(?:[。！？；]|[.!?;](?:\s+|$)|$)', re.DOTALL)
+_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+
+class _PassageParser(HTMLParser):
+    """按块级元素把HTML切成段落，跳过脚本、样式和导航等区域，<pre>中的代码保留原有格式"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = ""
+        self.passages = []  # (文本, 是否代码, 是否在<article>/<main>中)
+        self._buffer = []
+        self._skip = 0
+        self._pre = 0
+        self._main = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _PAGE_SKIP_TAGS:
+            self._skip += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag in _PAGE_BLOCK_TAGS:
+            self._flush()
+            if tag == "pre":
+                self._pre += 1
+            elif tag in ("article", "main"):
+                self._main += 1
+
+    def handle_endtag(self, tag):
+        if tag in _PAGE_SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag == "title":
+            self._in_title = False
+        elif tag in _PAGE_BLOCK_TAGS:
+            self._flush()
+            if tag == "pre":
+                self._pre = max(0, self._pre - 1)
+            elif tag in ("article", "main"):
+                self._main = max(0, self._main - 1)
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        if self._in_title:
+            self.title += data
+        else:
+            self._buffer.append(data)
+
+    def _flush(self):
+        text = "".join(self._buffer)
+        self._buffer = []
+        if self._pre:
+            text = "\n".join(line.rstrip() for line in text.strip("\n").splitlines())
+        else:
+            text = " ".join(text.split())
+        if text.strip():
+            self.passages.append((text, self._pre > 0, self._main > 0))
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def _split_passage(text, limit, code=False):
+    """把过长的段落切成不超过limit个字符的片段：代码按行，正文按句子"""
+    if len(text) <= limit:
+        return [text]
+    pieces = text.splitlines() if code else _SENTENCE_RE.findall(text)
+    separator = "\n" if code else ""
+    chunks, current = [], ""
+    for piece in pieces:
+        while len(piece) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(piece[:limit])
+            piece = piece[limit:]
+        if current and len(current) + len(separator) + len(piece) > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}{separator}{piece}" if current else piece
+    if current.strip():
+        chunks.append(current)
+    return [chunk.strip() for chunk in chunks]
+
+
+def extract_passages(html, min_chars=20, max_chars=800):
+    """从HTML中提取标题和正文段落，返回 (标题, [(段落, 是否代码), ...])
+
+    页面有<article>/<main>且其中有足够正文时只取其中的内容；过短的非代码段落（导航残留、按钮文字）被丢弃，
+    过长的段落按句子（代码按行）切分
+    """
+    parser = _PassageParser()
+    parser.feed(html)
+    parser.close()
+    passages = parser.passages
+    main = [passage for passage in passages if passage[2]]
+    if sum(len(text) for text, _, _ in main) >= 200:
+        passages = main
+    result = []
+    for text, is_code, _ in passages:
+        if not is_code and len(text) < min_chars:
+            continue
+        result.extend((chunk, is_code) for chunk in _split_passage(text, max_chars * 2 if is_code else max_chars,
+                                                                   code=is_code))
+    return " ".join(parser.title.split()), result
+
+
+def _decode_html(data, content_type=""):
+    """按Content-Type或<meta>中声明的编码解码页面，未声明时按UTF-8"""
+    match = re.search(r'charset=["\']?([\w-]+)', content_type or "", re.IGNORECASE)
+    charset = match.group(1) if match else None
+    if not charset:
+        match = _CHARSET_RE.search(data[:4096])
+        charset = match.group(1).decode("ascii") if match else "utf-8"
+    try:
+        return data.decode(charset, errors="replace")
+    except LookupError:
+        return data.decode("utf-8", errors="replace")
+
+
+class PageFetcher:
+    """抓取搜索结果页面并提取正文段落，提取结果按URL缓存到磁盘
+
+    默认只抓取 http(s) 页面；allow_local时也读取 file:// 和本地路径（用于用本地HTML文件测试提取和摘要，
+    不缓存）。搜索结果链接来自第三方页面，引擎使用的抓取器不能读取本地文件。
+    """
+
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36"
+
+    def __init__(self, cache_path=None, ttl=PAGE_CACHE_TTL, max_bytes=PAGE_MAX_BYTES, allow_local=False):
+        self.cache_path = Path(cache_path) if cache_path else cache_dir() / "pages"
+        self.cache_path.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.allow_local = allow_local
+
+    def _cache_file(self, url):
+        return self.cache_path / (hashlib.sha1(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _read_cache(self, url):
+        try:
+            with open(self._cache_file(url), 'r', encoding='utf-8') as f:
+                page = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - page.get("fetched_at", 0) > self.ttl:
+            return None
+        page["cached"] = True
+        return page
+
+    def _write_cache(self, page):
+        path = self._cache_file(page["url"])
+        temp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(page, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _local_path(url):
+        """file:// URL或本地路径对应的文件，不是本地文件时返回None"""
+        if url.startswith("file://"):
+            path = unquote(urlparse(url).path)
+            # Windows下 file:///C:/... 解析出的路径带有前导斜杠
+            return Path(path[1:] if re.match(r'^/[A-Za-z]:', path) else path)
+        if "://" not in url and Path(url).is_file():
+            return Path(url)
+        return None
+
+    def _download(self, url, timeout, cancel_token):
+        """下载页面，返回 (内容字节, Content-Type)"""
+        response = get_http_session().get(url, timeout=timeout, stream=True,
+                                          headers={"User-Agent": self.USER_AGENT})
+        try:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if content_type and "html" not in content_type and "text" not in content_type:
+                raise ValueError(f"不是网页: {content_type}")
+            deadline = time.monotonic() + timeout
+            data = bytearray()
+            for chunk in response.iter_content(64 * 1024):
+                data.extend(chunk)
+                if len(data) >= self.max_bytes or time.monotonic() > deadline:
+                    break
+                if cancel_token:
+                    cancel_token.check()
+            return bytes(data[:self.max_bytes]), content_type
+        finally:
+            response.close()
+
+    def fetch(self, url, timeout=PAGE_FETCH_TIMEOUT, cancel_token=None):
+        """抓取一个页面，返回 {"success", "url", "title", "passages": [[段落, 是否代码], ...]} 或错误信息"""
+        local_path = self._local_path(url) if self.allow_local else None
+        if local_path is None and urlparse(url).scheme not in ("http", "https"):
+            return {"success": False, "url": url, "error": "只支持http(s)页面"}
+        if local_path is None:
+            page = self._read_cache(url)
+            if page:
+                return page
+        try:
+            if local_path is not None:
+                with open(local_path, 'rb') as f:
+                    data, content_type = f.read(self.max_bytes), ""
+            else:
+                data, content_type = self._download(url, timeout, cancel_token)
+            title, passages = extract_passages(_decode_html(data, content_type))
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            return {"success": False, "url": url, "error": str(e) or type(e).__name__}
+        page = {"success": True, "url": url, "title": title, "fetched_at": time.time(),
+                "passages": [[text, is_code] for text, is_code in passages]}
+        if local_path is None:
+            self._write_cache(page)
+        return page
+
+
+_page_fetcher = None
+_page_fetcher_lock = threading.Lock()
+
+
+def get_page_fetcher():
+    """获取进程内共享的页面抓取器"""
+    global _page_fetcher
+    with _page_fetcher_lock:
+        if _page_fetcher is None:
+            _page_fetcher = PageFetcher()
+        return _page_fetcher
+
+
+def build_search_digest(query, pages, budget_tokens=1200, similarity_threshold=0.6):
+    """按与查询的相关度从多个页面中挑选段落，去掉重复和近似重复的段落，在token预算内拼成摘要
+
+    pages为 fetch() 返回的页面列表（按搜索结果排序，靠前的页面略微加权）；没有相关段落时返回空字符串
+    """
+    index = BM25Index()
+    passages = {}
+    seen = set()
+    for page_no, page in enumerate(pages):
+        for position, (text, is_code) in enumerate(page.get("passages") or []):
+            key = " ".join(text.lower().split())
+            if key in seen:
+                continue
+            seen.add(key)
+            passages[(page_no, position)] = (text, is_code)
+            index.add((page_no, position), text)
+    ranked = sorted(index.search(query, k=len(passages)),
+                    key=lambda item: item[1] / (1 + 0.1 * item[0][0]), reverse=True)
+
+    headers = {page_no: f"[{page_no + 1}] {page.get('title') or page['url']} ({page['url']})"
+               for page_no, page in enumerate(pages)}
+    chosen, chosen_shingles, used = [], [], 0
+    for doc_id, _ in ranked:
+        text, is_code = passages[doc_id]
+        cost = estimate_tokens(text) + (6 if is_code else 0)
+        if not any(other[0] == doc_id[0] for other in chosen):
+            cost += estimate_tokens(headers[doc_id[0]])
+        if used + cost > budget_tokens:
+            continue
+        shingles = _shingles(text)
+        if any(len(shingles & other) >= similarity_threshold * len(shingles | other)
+               for other in chosen_shingles):
+            continue
+        chosen.append(doc_id)
+        chosen_shingles.append(shingles)
+        used += cost
+
+    blocks = []
+    for page_no, position in sorted(chosen):
+        if not blocks or blocks[-1][0] != page_no:
+            blocks.append((page_no, [headers[page_no]]))
+        text, is_code = passages[(page_no, position)]
+        blocks[-1][1].append(f"```\n{text}\n```" if is_code else text)
+    return "\n\n".join("\n".join(lines) for _, lines in blocks)
+
+
+# 进程内所有AutoCoder会话共用的LLM并发限制器
+llm_limiter = AdaptiveConcurrencyLimiter()
+# 进程内共享的耗时统计，同一进程里后启动的会话直接沿用已学到的超时
+latency_stats = LatencyStats()
+
+
+class ReplayDivergence(OperationCancelled):
+    """回放时引擎请求的外部交互与录制不一致，按取消处理以干净地结束运行"""
+
+
+SESSION_ARCHIVE_VERSION = 1
+
+
+class SessionRecorder:
+    """录制一次运行的全部外部交互（LLM、子进程、搜索、方案库查询），逐条写入gzip压缩的JSON Lines归档"""
+
+    replaying = False
+
+    def __init__(self, path, max_output_chars=1024 * 1024):
+        self.path = Path(path)
+        self.max_output_chars = max_output_chars
+        self.interactions = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = gzip.open(self.path, 'wt', encoding='utf-8')
+
+    def _write(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def start(self, params):
+        self._write({"kind": "header", "version": SESSION_ARCHIVE_VERSION, "created": time.time(), "params": params})
+
+    def call(self, kind, key, func):
+        """执行交互并记录结果或异常"""
+        started = time.monotonic()
+        try:
+            result = func()
+        except OperationCancelled:
+            raise
+        except Exception as e:
+            error = {"type": type(e).__name__, "message": str(e), "timeout": getattr(e, "timeout", None)}
+            self._write({"kind": kind, "key": key, "error": error, "elapsed": time.monotonic() - started})
+            self.interactions += 1
+            raise
+        self._write({"kind": kind, "key": key, "result": result, "elapsed": time.monotonic() - started})
+        self.interactions += 1
+        return result
+
+    def finish(self, success):
+        """写入运行结果并关闭归档"""
+        with self._lock:
+            if self._file.closed:
+                return
+        self._write({"kind": "end", "success": success, "interactions": self.interactions})
+        with self._lock:
+            self._file.close()
+
+
+class SessionReplayer:
+    """回放录制的会话：LLM、搜索和方案库按顺序返回，子进程按命令与输入匹配（并发用例的顺序不固定）"""
+
+    replaying = True
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.header = None
+        self.recorded_success = None
+        self.recorded_time = 0.0
+        self.divergence = None
+        self._queues = {}
+        self._lock = threading.Lock()
+        with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["kind"] == "header":
+                    if entry["version"] != SESSION_ARCHIVE_VERSION:
+                        raise ValueError(f"不支持的会话归档版本: {entry['version']}")
+                    self.header = entry
+                elif entry["kind"] == "end":
+                    self.recorded_success = entry["success"]
+                else:
+                    self.recorded_time += entry.get("elapsed", 0.0)
+                    self._queues.setdefault(self._queue_key(entry["kind"], entry["key"]), deque()).append(entry)
+        if self.header is None:
+            raise ValueError(f"会话归档缺少头部: {self.path}")
+
+    @property
+    def params(self):
+        return self.header["params"]
+
+    @property
+    def remaining(self):
+        """尚未被回放的交互数"""
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    @staticmethod
+    def _queue_key(kind, key):
+        # LLM调用按顺序匹配；其他交互可能并发发生（多动作并发执行），按键匹配
+        return (kind,) if kind in ("llm", "knowledge") else (kind, json.dumps(key, ensure_ascii=False))
+
+    def start(self, params):
+        pass
+
+    def call(self, kind, key, func):
+        """返回录制的结果，不执行func；录制中没有对应的交互时抛出ReplayDivergence"""
+        with self._lock:
+            queue = self._queues.get(self._queue_key(kind, key))
+            entry = queue.popleft() if queue else None
+        if entry is None:
+            self.divergence = f"没有录制的{kind}交互: {str(key)[:200]}"
+            raise ReplayDivergence(f"回放偏离: {self.divergence}")
+        error = entry.get("error")
+        if error is None:
+            return entry["result"]
+        if error["type"] == "TimeoutExpired":
+            raise subprocess.TimeoutExpired(key, error["timeout"])
+        if error["type"] == "ProcessAborted":
+            raise ProcessAborted()
+        raise RuntimeError(error["message"])
+
+    def finish(self, success):
+        pass
+
+
+class AutoCoder:
+    def __init__(self, task, notes="", workspace="safe_workspace", host="localhost", port=1234,
+                 ui_callback=None, max_tokens=2000, expected_output=None, auto_expect=False,
+                 max_attempts=5, command_timeout=30, api_timeout=120, search_results=5,
+                 validator="auto", validator_options=None, endpoints=None,
+                 balance_strategy="least_outstanding", run_timeout=None, cancel_token=None,
+                 max_history=200, knowledge_base=True, test_cases=None, max_parallel_cases=4,
+                 adaptive_timeouts=True, timeout_ceilings=None, token_budget=None, resume=False,
+                 session=None, log_callback=None, conversation=False, context_tokens=8192,
+                 max_parallel_actions=4, search_pages=3, search_digest_tokens=1200, max_errors=100,
+                 workers=None):
+        """初始化代码生成器
+
+        ui_callback接收日志文本，log_callback接收本次运行的LogRecord（带级别和阶段）；
+        conversation=True时使用多轮对话模式：固定的系统提示和任务前缀之后逐周期追加观察结果和模型响应，
+        context_tokens为模型的上下文长度，历史超出时丢弃最早的轮次；
+        workers为执行节点列表（"host:port,..."），指定时代码运行和pip安装分派到执行节点，本地只保留工作区
+        （工作区的改动同步到节点，程序在节点上生成的文件留在节点上，不复制回工作区）；
+        搜索后并发抓取前search_pages个结果页面，与任务相关的段落在search_digest_tokens的预算内放入下一周期的提示词；
+        resume=True时如果工作区中有同一任务未完成的检查点，则从检查点继续；
+        session为SessionRecorder时录制全部外部交互，为SessionReplayer时回放录制的交互，不访问模型、网络和浏览器
+        """
+        # 构造参数随检查点和会话归档保存，供 AutoCoder.resume() / AutoCoder.replay() 使用
+        self._params = {name: value for name, value in locals().items()
+                        if name not in ("self", "ui_callback", "log_callback", "cancel_token", "resume", "session")}
+        self.session = session
+        replaying = bool(session and session.replaying)
+        self.task = task
+        self.notes = notes
+        self.workspace = Path(workspace).absolute()
+        self.venv_path = self.workspace / "venv"
+        # 文件登记、错误日志、开发历史和尝试记录都有上限，长时间运行不会无限增长
+        self.project_files = FileRegistry()
+        self.error_log = ErrorLog(max_entries=max_errors)
+        self.development_history = deque(maxlen=max_history)
+        self.attempts = AttemptStore(max_records=max_history)
+        # 跨任务的成功方案库：高度相似的任务直接复用，相似的任务作为提示词参考
+        self.knowledge_base = knowledge_base
+        self.solution_store = get_solution_store() if knowledge_base and not replaying else None
+        self.reference_solution = None  # (方案, 相似度)
+        self.installed_packages = []
+        self.spawns_avoided = 0  # 静态预检拦截、因此省去的子进程启动次数
+        self.require_full_code = False  # 补丁无法应用后，下一周期要求输出完整文件
+        # LLM服务端点，未指定endpoints时只使用host:port
+        self.endpoints = parse_endpoints(endpoints if endpoints else [(host, port)], default_port=port)
+        self.host, self.port = self.endpoints[0]
+        self.endpoint_pool = get_endpoint_pool(self.endpoints, strategy=balance_strategy)
+        # 日志：每次运行一个ID，日志记录带运行ID、周期和阶段，界面回调作为该运行的日志订阅者
+        self.run_id = uuid.uuid4().hex[:12]
+        self.phase = "setup"
+        self.ui_callback = ui_callback
+        self._log_handles = []
+        if ui_callback:
+            self._log_handles.append(get_log_hub().subscribe(lambda record: ui_callback(record.message + "\n"),
+                                                             session=self.run_id))
+        if log_callback:
+            self._log_handles.append(get_log_hub().subscribe(log_callback, session=self.run_id))
+        self.max_tokens = max_tokens
+        self.expected_output = expected_output  # 用户指定的预期输出
+        self.auto_expect = auto_expect  # 是否使用LLM生成的预期输出
+        self.llm_expected_output = None  # LLM生成的预期输出
+        self.original_task = task  # 保存原始任务
+        self.next_steps = []  # 跟踪下一步需要实现的功能
+        self.current_cycle = 0  # 当前开发周期（从1开始，0表示尚未开始）
+
+        # 新增网络参数
+        self.max_attempts = max_attempts
+        self.command_timeout = command_timeout
+        self.api_timeout = api_timeout
+        # 自适应超时：有足够的耗时样本后按分位数设置每次调用的超时，静态值只作为冷启动默认值
+        self.adaptive_timeouts = adaptive_timeouts
+        self.timeout_ceilings = {**DEFAULT_TIMEOUT_CEILINGS, **(timeout_ceilings or {})}
+        self.timeouts_used = {}
+        # token用量统计；token_budget为整个任务的token上限，用完后停止运行（检查点不再恢复）
+        self.token_usage = TokenLedger(max_cycles=max_history)
+        self.token_budget = token_budget or None
+        self.budget_exhausted = False  # 因token预算用完而停止
+        self._run_phase = f"run:{code_hash(task)}"
+        # 多轮对话模式，None表示每个周期单独构造完整提示词
+        self.conversation = Conversation(context_tokens) if conversation else None
+        self.search_results = search_results
+        self.search_pages = search_pages
+        self.search_digest_tokens = search_digest_tokens
+        self.search_digests = []  # 最近一个有搜索的周期中各次搜索的摘要 {"cycle", "keywords", "digest"}
+        self._search_lock = threading.Lock()
+
+        # 输出验证方式，验证器按预期输出缓存，每个任务只编译一次
+        if validator not in VALIDATORS:
+            raise ValueError(f"未知的验证方式: {validator}")
+        self.validator_name = validator
+        self.validator_options = validator_options or {}
+        self._validators = {}
+        # 多动作并发执行时保护验证器缓存和require_full_code
+        self._state_lock = threading.Lock()
+        # 多用例测试：有用例时代码按用例并发运行，替代单次运行与预期输出比较
+        self.test_cases = load_test_cases(test_cases)
+        self._params["test_cases"] = [case.to_dict() for case in self.test_cases] or None
+        self._params["endpoints"] = [list(endpoint) for endpoint in self.endpoints]
+        if session:
+            session.start(self._params)
+        self.max_parallel_cases = max(1, min(max_parallel_cases, os.cpu_count() or 1))
+        # 多动作响应中互不依赖的动作的并发数（安装和搜索主要在等待IO，不按CPU数限制）
+        self.max_parallel_actions = max(1, max_parallel_actions)
+        self.plan_report = None  # 上一周期多动作执行结果的汇总
+
+        # 取消令牌贯穿整个开发流程，run_timeout为整次运行的时限（秒）
+        self.run_timeout = run_timeout
+        self.cancel_token = cancel_token or CancellationToken()
+
+        self.web_search = WebSearch(max_results=search_results, timeout=command_timeout,
+                                    cancel_token=self.cancel_token, session_id=self.run_id)
+
+        # 分布式执行：会话按负载固定到一个执行节点，运行前只同步有改动的文件；回放时不连接节点
+        self.worker_pool = None
+        if workers and not replaying:
+            self.worker_pool = get_worker_pool(parse_endpoints(workers, default_port=WORKER_DEFAULT_PORT))
+            self.log(f"执行节点: {', '.join(node.address for node in self.worker_pool.nodes)}")
+        self._worker = None
+        # 节点上的会话目录按本机和工作区命名，从检查点恢复时沿用节点上已有的文件和虚拟环境
+        hostname = re.sub(r'[^\w.-]', '_', socket.gethostname())
+        self._worker_session = f"{hostname}-{code_hash(str(self.workspace))}"
+        self._worker_lock = threading.Lock()
+        self._synced = {}  # 已同步到当前节点的文件 -> sha1
+
+        self.log("初始化工作目录: " + str(self.workspace))
+        self.log(f"任务: {task}")
+        if len(self.endpoints) > 1:
+            self.log(f"LLM服务端点: {', '.join(f'{h}:{p}' for h, p in self.endpoints)}")
+        if notes:
+            self.log(f"任务注意事项: {notes}")
+        if expected_output:
+            self.log(f"用户指定的预期输出: {expected_output}")
+        if auto_expect:
+            self.log("启用自动预期验证: 将使用LLM生成的预期输出进行验证")
+        if validator != "auto":
+            self.log(f"输出验证方式: {VALIDATORS[validator].description}")
+
+        # 检查点：每个周期结束后保存完整的运行状态，进程中断后可以继续
+        self._context = None
+        self._cached_responses = {}  # 周期 -> 尚未处理完的LLM响应
+        self._manifest_hashes = {}  # 相对路径 -> ((大小, 修改时间), sha1)
+        self._resume_state = self._find_resumable_checkpoint() if resume else None
+
+            # 初始化环境
+        self._setup_workspace(clean=self._resume_state is None)
+        if not replaying and not self.worker_pool:
+            self._setup_venv()
+
+        # 创建任务跟踪文件
+        self._initialize_task_tracking()
+
+        if self._resume_state:
+            self._restore_checkpoint(self._resume_state)
+
+    @staticmethod
+    def checkpoint_path(workspace):
+        """工作区的检查点文件路径"""
+        return Path(workspace).absolute() / ".autocoder" / "checkpoint.json"
+
+    @classmethod
+    def read_checkpoint(cls, workspace):
+        """读取工作区的检查点，不存在或无法解析时返回None"""
+        try:
+            with open(cls.checkpoint_path(workspace), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        return state if state.get("version") == CHECKPOINT_VERSION else None
+
+    @classmethod
+    def replay(cls, archive, workspace=None, ui_callback=None, **overrides):
+        """按录制的会话归档构造回放运行；默认在临时目录中回放，不会清理录制时的工作目录"""
+        replayer = archive if isinstance(archive, SessionReplayer) else SessionReplayer(archive)
+        if workspace is None:
+            workspace = tempfile.mkdtemp(prefix="autocoder_replay_")
+        params = {**replayer.params, **overrides, "workspace": workspace}
+        return cls(ui_callback=ui_callback, session=replayer, **params)
+
+    @classmethod
+    def resume(cls, workspace, ui_callback=None, cancel_token=None, **overrides):
+        """从工作区中未完成的检查点恢复运行，任务参数取自检查点，overrides可覆盖部分参数"""
+        state = cls.read_checkpoint(workspace)
+        if state is None or state["status"] not in RESUMABLE_STATUSES:
+            raise ValueError(f"工作区中没有可恢复的检查点: {workspace}")
+        params = {**state["params"], **overrides, "workspace": workspace}
+        return cls(ui_callback=ui_callback, cancel_token=cancel_token, resume=True, **params)
+
+    def _find_resumable_checkpoint(self):
+        """查找同一任务未完成的检查点"""
+        state = self.read_checkpoint(self.workspace)
+        if state is None or state["status"] not in RESUMABLE_STATUSES:
+            return None
+        saved = state["params"]
+        if (saved["task"], saved["notes"], saved["expected_output"]) != (self.task, self.notes, self.expected_output):
+            self.log("工作区中的检查点属于其他任务，重新开始")
+            return None
+        return state
+
+    def _workspace_manifest(self):
+        """工作区文件清单（不含虚拟环境、输出目录和任务跟踪文件），记录大小和内容哈希
+
+        虚拟环境和输出目录不遍历；大小和修改时间都没变的文件沿用上次计算的哈希，每个周期保存检查点时不必重读全部文件
+        """
+        manifest = {}
+        hashes = {}
+        for root, dirs, files in os.walk(self.workspace):
+            if root == str(self.workspace):
+                dirs[:] = [name for name in dirs if name not in ("venv", ".autocoder")]
+                files = [name for name in files if name != "task_tracking.json"]
+            dirs.sort()
+            for name in sorted(files):
+                path = Path(root) / name
+                relative = path.relative_to(self.workspace).as_posix()
+                try:
+                    stat = path.stat()
+                    key = (stat.st_size, stat.st_mtime_ns)
+                    cached = self._manifest_hashes.get(relative)
+                    sha1 = cached[1] if cached and cached[0] == key else hashlib.sha1(path.read_bytes()).hexdigest()
+                except OSError:
+                    continue
+                hashes[relative] = (key, sha1)
+                manifest[relative] = {"size": stat.st_size, "sha1": sha1}
+        self._manifest_hashes = hashes
+        return manifest
+
+    def _save_checkpoint(self, completed_cycle, status="running"):
+        """保存运行状态（先写临时文件再替换，中途崩溃不会留下损坏的检查点）"""
+        self._cached_responses = {cycle: response for cycle, response in self._cached_responses.items()
+                                  if cycle > completed_cycle}
+        state = {
+            "version": CHECKPOINT_VERSION,
+            "status": status,
+            "saved_at": time.time(),
+            "params": self._params,
+            "completed_cycle": completed_cycle,
+            "context": self._context,
+            "error_log": self.error_log.to_dict(),
+            "project_files": self.project_files.paths(),
+            "development_history": [entry.to_dict() for entry in self.development_history],
+            "attempts": [record.to_dict() for record in self.attempts],
+            "llm_expected_output": self.llm_expected_output,
+            "next_steps": self.next_steps,
+            "installed_packages": self.installed_packages,
+            "spawns_avoided": self.spawns_avoided,
+            "plan_report": self.plan_report,
+            "search_digests": self.search_digests,
+            "require_full_code": self.require_full_code,
+            "token_usage": self.token_usage.to_dict(),
+            "conversation": self.conversation.to_dict() if self.conversation else None,
+            "responses": {str(cycle): response for cycle, response in self._cached_responses.items()},
+            "manifest": self._workspace_manifest()
+        }
+        path = self.checkpoint_path(self.workspace)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_suffix(".tmp")
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            self.log(f"保存检查点失败: {e}")
+
+    def _restore_checkpoint(self, state):
+        """从检查点恢复运行状态"""
+        self.error_log.restore(state["error_log"])
+        self.project_files.restore(state["project_files"])
+        self.development_history.extend(HistoryEntry(**entry) for entry in state["development_history"])
+        for record in state["attempts"]:
+            self.attempts.add(AttemptRecord(**record))
+        self.llm_expected_output = state["llm_expected_output"]
+        self.next_steps = state["next_steps"]
+        self.installed_packages = state["installed_packages"]
+        self.spawns_avoided = state.get("spawns_avoided", 0)
+        self.plan_report = state.get("plan_report")
+        self.search_digests = state.get("search_digests", [])
+        self.require_full_code = state["require_full_code"]
+        self.token_usage.restore(state["token_usage"])
+        if self.conversation and state.get("conversation"):
+            self.conversation.restore(state["conversation"])
+        self._cached_responses = {int(cycle): response for cycle, response in state["responses"].items()}
+        self.current_cycle = state["completed_cycle"]
+        self._context = state["context"]
+
+        self.log(f"从检查点恢复: 已完成 {state['completed_cycle']} 个开发周期，"
+                 f"已用 {self.token_usage.total_tokens} tokens")
+        current = self._workspace_manifest()
+        changed = [name for name, info in state["manifest"].items() if current.get(name) != info]
+        if changed:
+            self.log(f"⚠️ 保存检查点之后以下文件被修改或删除: {', '.join(changed[:10])}")
+
+    def cancel(self, reason="用户中断"):
+        """取消当前运行：中断LLM请求、结束子进程、关闭借用的浏览器"""
+        self.cancel_token.cancel(reason)
+
+    def _external(self, kind, key, func):
+        """执行一次外部交互；录制会话时记录结果，回放时直接返回录制的结果而不调用func"""
+        if self.session is None:
+            return func()
+        return self.session.call(kind, key, func)
+
+    def log(self, message, level=None):
+        """输出日志信息（异步），由日志分发线程写到控制台、UI和日志文件"""
+        get_log_hub().emit(message, level=level, phase=self.phase, session=self.run_id, cycle=self.current_cycle)
+
+    def close_log(self):
+        """等待本次运行的日志全部送达后取消UI订阅"""
+        hub = get_log_hub()
+        while self._log_handles:
+            hub.unsubscribe(self._log_handles.pop())
+        hub.flush()
+
+    def _initialize_task_tracking(self):
+        """初始化任务跟踪"""
+        # 创建任务跟踪文件
+        tracking_file = self.workspace / "task_tracking.json"
+        tracking_data = {
+            "original_task": self.original_task,
+            "notes": self.notes,
+            "expected_output": self.expected_output,
+            "auto_expect": self.auto_expect,
+            "current_step": "初始化环境",
+            "next_steps": [],
+            "progress": 0.0
+        }
+
+        with open(tracking_file, 'w', encoding='utf-8') as f:
+            json.dump(tracking_data, f, ensure_ascii=False, indent=2)
+
+        self.log("任务跟踪初始化完成")
+
+    def _update_task_tracking(self, current_step, next_steps, progress):
+        """更新任务跟踪"""
+        tracking_file = self.workspace / "task_tracking.json"
+
+        try:
+            with open(tracking_file, 'r', encoding='utf-8') as f:
+                tracking_data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            tracking_data = {
+                "original_task": self.original_task,
+                "notes": self.notes,
+                "expected_output": self.expected_output,
+                "auto_expect": self.auto_expect
+            }
+
+        tracking_data["current_step"] = current_step
+        tracking_data["next_steps"] = next_steps
+        tracking_data["progress"] = progress
+
+        # 如果有LLM生成的预期输出，也保存下来
+        if self.llm_expected_output:
+            tracking_data["llm_expected_output"] = self.llm_expected_output
+
+        with open(tracking_file, 'w', encoding='utf-8') as f:
+            json.dump(tracking_data, f, ensure_ascii=False, indent=2)
+
+        self.next_steps = next_steps
+
+    def _setup_workspace(self, clean=True):
+        """创建并清理工作目录（从检查点恢复时保留已有文件）"""
+        if self.workspace.exists() and not clean:
+            self.log(f"保留工作目录中的文件: {self.workspace}")
+        elif self.workspace.exists():
+            self.log(f"清理工作目录: {self.workspace}")
+            # 清理现有文件
+            for item in self.workspace.glob('*'):
+                if item.is_file():
+                    try:
+                        item.unlink()
+                    except Exception as e:
+                        self.log(f"无法删除文件 {item}: {e}")
+                elif item.is_dir() and item.name != 'venv':  # 保留venv
+                    try:
+                        shutil.rmtree(item)
+                    except Exception as e:
+                        self.log(f"无法删除目录 {item}: {e}")
+        else:
+            self.log(f"创建工作目录: {self.workspace}")
+            self.workspace.mkdir(parents=True, exist_ok=True)
+
+    def _setup_venv(self):
+        """创建虚拟环境"""
+        if not self.venv_path.exists():
+            self.log("创建虚拟环境...")
+            try:
+                venv.create(self.venv_path, with_pip=True)
+                self.log("虚拟环境创建成功")
+            except Exception as e:
+                self.log(f"创建虚拟环境失败: {e}")
+                self.error_log.append(f"创建虚拟环境失败: {e}")
+
+    def _get_python_path(self):
+        """获取虚拟环境中的Python解释器路径"""
+        # 检查Windows路径
+        win_path = self.venv_path / "Scripts" / "python.exe"
+        if win_path.exists():
+            return str(win_path)
+
+            # 检查Unix路径
+        unix_path = self.venv_path / "bin" / "python"
+        if unix_path.exists():
+            return str(unix_path)
+
+            # 返回系统Python
+        return "python"
+
+    def _get_pip_path(self):
+        """获取虚拟环境中的pip路径"""
+        # 检查Windows路径
+        win_path = self.venv_path / "Scripts" / "pip.exe"
+        if win_path.exists():
+            return str(win_path)
+
+            # 检查Unix路径
+        unix_path = self.venv_path / "bin" / "pip"
+        if unix_path.exists():
+            return str(unix_path)
+
+            # 返回系统pip
+        return "pip"
+
+    def _call_llm(self, prompt, messages=None):
+        """调用LLM API，失败时自动切换到其他可用端点；messages不为空时直接使用（多轮对话模式）"""
+        self.log("请求LLM生成代码...")
+
+        if messages is None:
+            key = code_hash(prompt)
+            messages = [
+                {
+                    "role": "system",
+                    "content": SYSTEM_PROMPT
+                },
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        else:
+            key = code_hash(json.dumps(messages, ensure_ascii=False))
+
+        full_tokens = self.max_tokens
+        if self.token_budget:
+            remaining = self.token_budget - self.token_usage.total_tokens
+            if remaining <= 0:
+                # 预算在调用LLM之前检查，已生成的代码仍会执行和验证
+                raise BudgetExhausted(f"已用完token预算 ({self.token_usage.total_tokens}/{self.token_budget})")
+            full_tokens = min(full_tokens, remaining)
+        expected_action = self._expected_action()
+        max_tokens = self._action_max_tokens(expected_action, full_tokens)
+
+        payload = {
+            "model": "local-model",
+            "messages": messages,
+            "temperature": 0.1,
+            "max_tokens": max_tokens,
+            "stop": STOP_SEQUENCES,
+            "stream": True,
+            "stream_options": {"include_usage": True}
+        }
+
+        prompt_chars = sum(len(message["content"]) for message in messages)
+        content, stream_stats = self._external("llm", key, lambda: self._limited_completion(payload))
+        if content is not None:
+            self._record_usage(prompt_chars, stream_stats)
+            if max_tokens < full_tokens and stream_stats.get("finish_reason") == "length" \
+                    and not response_complete(content, require_expected=self.auto_expect):
+                # 按预计动作缩短的上限不够用（模型选择了其他动作），用完整上限重新生成一次
+                self.log(f"响应在 {max_tokens} tokens处被截断（预计动作 {expected_action}），使用完整上限重新生成")
+                payload = {**payload, "max_tokens": full_tokens}
+                content, stream_stats = self._external("llm", key, lambda: self._limited_completion(payload))
+                if content is not None:
+                    self._record_usage(prompt_chars, stream_stats)
+        return content
+
+    def _expected_action(self):
+        """根据当前状态预计模型本周期最可能的动作，用于选择生成上限"""
+        if any(entry.action == "PLAN" for entry in self.development_history):
+            # 模型在本任务中用过多动作响应，一次响应可能同时包含安装和完整代码，按CODE使用完整上限
+            return "CODE"
+        last_error = self.error_log[-1] if self.error_log else ""
+        if re.search(r"ModuleNotFoundError|No module named", last_error):
+            return "COMMAND"
+        if self.current_cycle > 1 and self._current_filename() and not self.require_full_code:
+            return "PATCH"
+        return "CODE"
+
+    def _action_max_tokens(self, action, full_tokens):
+        """预计动作对应的生成上限，不超过full_tokens"""
+        ratio = ACTION_TOKEN_RATIOS.get(action)
+        if ratio is None:
+            return full_tokens
+        return min(full_tokens, max(MIN_ACTION_TOKENS, int(self.max_tokens * ratio)))
+
+    def _limited_completion(self, payload):
+        """在进程级并发限制下请求补全，返回 (内容, 流式统计)，失败时内容为None"""
+        # 进程级并发限制，排队等待的时间计入API超时
+        wait = llm_limiter.acquire(timeout=self.cancel_token.timeout(self.api_timeout),
+                                   cancel_token=self.cancel_token)
+        if wait is None:
+            error_msg = "LLM调用错误: 等待并发许可超时"
+            self.error_log.append(error_msg)
+            self.log(error_msg)
+            return None, {}
+        if wait >= 1:
+            metrics = llm_limiter.metrics()
+            self.log(f"等待LLM并发许可 {wait:.1f}秒 (并发上限 {metrics['limit']}, 排队 {metrics['queue_depth']})")
+
+        started = time.time()
+        success = False
+        try:
+            content, stream_stats = self._request_completion(payload)
+            success = content is not None
+            return content, stream_stats
+        finally:
+            llm_limiter.release(success=success, latency=time.time() - started if success else None)
+
+    def _request_completion(self, payload):
+        """向端点池发送补全请求，端点故障时切换到下一个端点，返回 (内容, 流式统计)"""
+        tried = []
+        while True:
+            endpoint = self.endpoint_pool.acquire(exclude=tried)
+            if endpoint is None:
+                error_msg = "LLM调用错误: 没有可用的LLM服务端点" if not tried else "LLM调用错误: 所有端点均调用失败"
+                self.error_log.append(error_msg)
+                self.log(error_msg)
+                return None, {}
+            tried.append(endpoint)
+
+            api_url = f"{endpoint.base_url}/v1/chat/completions"
+            prompt_chars = sum(len(message["content"]) for message in payload["messages"])
+            first_token_timeout, total_timeout = self._llm_timeouts(prompt_chars, payload["max_tokens"])
+            started = time.time()
+            try:
+                response = get_http_session().post(api_url, json=payload, stream=True,
+                                                   timeout=self.cancel_token.timeout(first_token_timeout))
+            except Exception as e:
+                self.endpoint_pool.release(endpoint, success=False)
+                self.cancel_token.check()
+                self.log(f"LLM调用错误 ({endpoint.address}): {str(e)}")
+                continue
+
+            if response.status_code == 200:
+                # 取消时关闭连接，打断正在进行的流式读取
+                handle = self.cancel_token.register(response.close)
+                stream_stats = {}
+                try:
+                    content = self._read_completion(response, started, total_timeout, stream_stats,
+                                                    complete=lambda text: response_complete(
+                                                        text, require_expected=self.auto_expect))
+                except GenerationTimeout as e:
+                    # 端点本身正常，同样的请求换端点也会超时
+                    self.endpoint_pool.release(endpoint, success=True)
+                    error_msg = f"LLM调用错误 ({endpoint.address}): {e}"
+                    self.error_log.append(error_msg)
+                    self.log(error_msg)
+                    return None, {}
+                except Exception as e:
+                    self.endpoint_pool.release(endpoint, success=False)
+                    self.cancel_token.check()
+                    self.log(f"LLM响应格式错误 ({endpoint.address}): {str(e)}")
+                    continue
+                except OperationCancelled:
+                    self.endpoint_pool.release(endpoint, success=True)
+                    raise
+                finally:
+                    self.cancel_token.unregister(handle)
+                    response.close()
+                self.endpoint_pool.release(endpoint, success=True, latency=time.time() - started)
+                self._observe_llm(started, prompt_chars, stream_stats)
+                if stream_stats.get("finish_reason") == "complete":
+                    self.log(f"已生成全部所需部分，提前结束生成 ({stream_stats.get('tokens', 0)} tokens)")
+                self.log("LLM响应成功" if len(self.endpoints) == 1 else f"LLM响应成功 ({endpoint.address})")
+                return content.strip(), stream_stats
+
+            response.close()
+            # 5xx视为端点故障并切换端点，其他状态码是请求本身的问题
+            server_error = response.status_code >= 500
+            self.endpoint_pool.release(endpoint, success=not server_error)
+            error_msg = f"API调用失败: {response.status_code}"
+            if server_error:
+                self.log(f"{error_msg} ({endpoint.address})")
+                continue
+            self.error_log.append(error_msg)
+            self.log(error_msg)
+            return None, {}
+
+    def _read_completion(self, response, started, total_timeout=None, stream_stats=None, complete=None):
+        """读取补全结果，支持流式（SSE）与普通JSON响应，流式读取过程中响应取消，超过total_timeout时中止
+
+        stream_stats 会被填入首个token的到达时间、输出的token数和结束原因，用于学习超时；
+        complete(已生成文本)返回True时提前结束流式生成（所需的部分已经全部生成）
+        """
+        stats = stream_stats if stream_stats is not None else {}
+        if 'text/event-stream' not in response.headers.get('Content-Type', ''):
+            data = response.json()
+            content = data['choices'][0]['message']['content']
+            stats["finish_reason"] = data['choices'][0].get('finish_reason')
+            stats["usage"] = data.get('usage')
+            stats["tokens"] = (data.get('usage') or {}).get('completion_tokens') or len(content) // 4
+            return content
+
+        parts = []
+        stats["tokens"] = 0
+        for line in response.iter_lines():
+            self.cancel_token.check()
+            if total_timeout and time.time() - started > total_timeout:
+                raise GenerationTimeout(f"生成超时 ({total_timeout:.0f}秒)")
+            line = line.decode('utf-8', errors='replace').strip()
+            if not line.startswith('data:'):
+                continue
+            data = line[5:].strip()
+            if data == '[DONE]':
+                break
+            chunk = json.loads(data)
+            if chunk.get('usage'):
+                # stream_options.include_usage 时最后一个分块携带用量
+                stats["usage"] = chunk['usage']
+            if chunk.get('choices'):
+                choice = chunk['choices'][0]
+                if choice.get('finish_reason'):
+                    stats["finish_reason"] = choice['finish_reason']
+                text = choice.get('delta', {}).get('content') or ''
+                if text:
+                    # 本地服务通常每个分块对应一个token
+                    stats.setdefault("first_token", time.time())
+                    stats["tokens"] += 1
+                parts.append(text)
+                # 只在可能结束一个部分的分块之后检查，避免每个token都扫描全文
+                if complete and ('\n' in text or '[' in text) and complete(''.join(parts)):
+                    stats["finish_reason"] = "complete"
+                    break
+        self.cancel_token.check()
+        return ''.join(parts)
+
+    def _pick_timeout(self, name, learned, default, ceiling=None):
+        """选择本次调用的超时：有统计数据时使用学习值（限制在上下限之间），否则使用静态默认值"""
+        if self.adaptive_timeouts and learned is not None:
+            ceiling = self.timeout_ceilings[name] if ceiling is None else min(ceiling, self.timeout_ceilings[name])
+            value = min(max(learned, TIMEOUT_FLOORS[name]), ceiling)
+        else:
+            value = default
+        self.timeouts_used[name] = value
+        return value
+
+    def _llm_timeouts(self, prompt_chars, max_tokens):
+        """LLM调用的超时：首token按每千字符的预填充耗时估计，整体时限再加上按最慢生成速度估计的输出时间"""
+        prefill = latency_stats.quantile("llm_prefill_per_1k", 0.95)
+        first_token = self._pick_timeout(
+            "llm_first_token",
+            None if prefill is None else prefill * max(1.0, prompt_chars / 1000) * 3 + 5,
+            self.api_timeout
+        )
+        rate = latency_stats.quantile("llm_tokens_per_sec", 0.05)
+        total = self._pick_timeout(
+            "llm_total",
+            None if not rate else first_token + max_tokens / rate * 1.5,
+            None
+        )
+        return first_token, total
+
+    def _observe_llm(self, started, prompt_chars, stream_stats):
+        """记录一次成功调用的预填充耗时和生成速度"""
+        first_token = stream_stats.get("first_token")
+        if first_token is None:
+            return
+        latency_stats.observe("llm_prefill_per_1k", (first_token - started) / max(1.0, prompt_chars / 1000))
+        generation = time.time() - first_token
+        if stream_stats.get("tokens", 0) > 10 and generation > 0:
+            latency_stats.observe("llm_tokens_per_sec", stream_stats["tokens"] / generation)
+
+    def _record_usage(self, prompt_chars, stream_stats):
+        """记录一次调用的token用量，服务未返回usage时按字符数估算"""
+        usage = stream_stats.get("usage") or {}
+        estimated = not usage
+        prompt_tokens = usage.get("prompt_tokens") or prompt_chars // 4
+        completion_tokens = usage.get("completion_tokens") or stream_stats.get("tokens", 0)
+        self.token_usage.record(self.current_cycle, prompt_tokens, completion_tokens, estimated=estimated)
+        self.log(f"LLM用量: 提示 {prompt_tokens}, 生成 {completion_tokens} tokens"
+                 f"{'（估算）' if estimated else ''}，本任务累计 {self.token_usage.total_tokens}")
+        if self.token_budget and self.token_usage.total_tokens >= self.token_budget:
+            self.log(f"⚠️ token预算已用完 ({self.token_usage.total_tokens}/{self.token_budget})，本周期结束后停止")
+
+    def _command_timeout(self):
+        """运行生成程序的超时，按本任务历次运行耗时学习，不超过用户指定的command_timeout"""
+        runtime = latency_stats.quantile(self._run_phase, 0.95)
+        return self._pick_timeout("run", None if runtime is None else runtime * 3 + 1, self.command_timeout,
+                                  ceiling=self.command_timeout)
+
+    def _pip_timeout(self):
+        """pip安装的超时，按历次安装耗时学习"""
+        duration = latency_stats.quantile("pip", 0.95)
+        return self._pick_timeout("pip", None if duration is None else duration * 3 + 10, 60)
+
+    def _relevant_attempts_prompt(self, context, k=3):
+        """从尝试记录中检索与当前错误最相关的历史失败，构造提示词片段"""
+        if not self.attempts:
+            return ""
+        query = " ".join([self.error_log[-1] if self.error_log else "",
+                          " ".join(context.get("next_steps", [])), self.task])
+        failures = self.attempts.relevant_failures(query, k=k)
+        if not failures:
+            return ""
+        lines = "\n".join(f"- {record.describe()}" for record in failures)
+        return f"[相关的历史尝试（以下方案已失败，请不要重复）]\n{lines}\n"
+
+    def _test_cases_prompt(self, limit=20):
+        """测试用例说明"""
+        if not self.test_cases:
+            return ""
+        lines = "\n".join(f"- {case.describe()}" for case in self.test_cases[:limit])
+        more = f"\n- ...共 {len(self.test_cases)} 个用例" if len(self.test_cases) > limit else ""
+        return (f"[测试用例（程序从标准输入和命令行参数读取数据，每个用例单独运行，输出必须符合预期）]\n"
+                f"{lines}{more}\n")
+
+    def _reference_solution_prompt(self):
+        """相似任务的历史方案作为参考"""
+        if not self.reference_solution:
+            return ""
+        solution, similarity = self.reference_solution
+        packages = f"依赖包: {', '.join(solution['packages'])}\n" if solution["packages"] else ""
+        return (f"[相似任务的历史方案（相似度 {similarity * 100:.0f}%，仅供参考）]\n"
+                f"任务: {solution['task'][:500]}\n{packages}"
+                f"# filename: {solution['filename']}\n```python\n{solution['code'][:4000]}\n```\n")
+
+    def _record_attempt(self, action, result, target="", error=""):
+        """记录一次尝试的结果，返回记录"""
+        record = AttemptRecord(
+            cycle=self.current_cycle,
+            action=action,
+            target=target or result.get("filename", ""),
+            code_hash=result.get("code_hash"),
+            error_signature=error_signature(error),
+            success=bool(result.get("success")) and not error
+        )
+        if record.code_hash:
+            repeated = [r.cycle for r in self.attempts.same_code(record.code_hash) if not r.success]
+            if repeated:
+                self.log(f"⚠️ 生成的代码与周期 {', '.join(map(str, repeated))} 中已失败的代码相同")
+        self.attempts.add(record)
+        return record
+
+    def _generate_code(self, context):
+        """生成代码的提示词构建"""
+        if self.conversation:
+            return self._converse(context)
+        # 组合任务和注意事项
+        task_with_notes = self.task
+        if self.notes:
+            task_with_notes += f"\n\n[重要注意事项]\n{self.notes}"
+
+        current_file = self._current_filename()
+        current_file_prompt = ""
+        patch_option = ""
+        patch_content = ""
+        if current_file:
+            try:
+                current_code = (self.workspace / current_file).read_text(encoding='utf-8')
+            except OSError:
+                current_code = None
+            if current_code is not None:
+                current_file_prompt = f"[当前文件 {current_file}]\n```python\n{current_code[:8000]}\n```\n"
+                if self.require_full_code:
+                    current_file_prompt += "上次的补丁无法应用到当前文件，本次请使用CODE给出完整文件。\n"
+                else:
+                    patch_option = "PATCH - 修改当前文件（统一diff格式，只输出改动的部分，小改动优先使用）  \n"
+                    patch_content = f"""- PATCH时: 提供针对当前文件的统一diff  
+  ```diff
+  --- a/{current_file}
+  +++ b/{current_file}
+  @@ -起始行,行数 +起始行,行数 @@
+   上下文行
+  -删除的行
+  +新增的行
+  ```  
+
+"""
+
+        auto_expect_prompt = """同时，你需要准确预测代码的输出结果，并在响应中包含[EXPECTED OUTPUT]部分。这个部分应该包含运行代码后预期得到的精确输出，这将用于验证代码是否正确执行。""" if self.auto_expect else ""
+
+        prompt = f"""请分析并完成以下任务：  
+
+[原始任务需求]  
+{task_with_notes}  
+
+[当前执行环境]  
+- 已生成文件: {', '.join(self.project_files[-3:]) if self.project_files else '无'}  
+- 最近错误日志: {self.error_log[-1][:1000] if self.error_log else '无'}  
+- 当前进度: {context['current_step']} ({context['progress'] * 100:.0f}%)  
+- 下一步需要解决的问题: {', '.join(context['next_steps']) if 'next_steps' in context else '无'}  
+
+{self._plan_report_prompt()}{self._search_digest_prompt()}{current_file_prompt}{self._reference_solution_prompt()}{self._relevant_attempts_prompt(context)}
+{'[用户指定的预期输出] ' + self.expected_output if self.expected_output else ''}  
+{self._test_cases_prompt()}
+作为Python开发专家，请：  
+1. 在<think>标签中分析当前状况并规划解决方案  
+2. 然后使用以下固定格式给出行动方案：  
+
+[ACTION]  
+(必须且只能选择以下之一)  
+CODE - 生成代码文件  
+COMMAND - 执行环境命令  
+SEARCH - 搜索相关资料  
+{patch_option}
+[CONTENT]  
+根据ACTION类型，提供具体内容：  
+- CODE时: 包含文件名和完整代码  
+  # filename: xxx.py  
+  代码内容...  
+
+{patch_content}- COMMAND时: 提供命令  
+  pip install xxx 或 python xxx.py  
+
+- SEARCH时: 提供搜索关键词  
+  keyword1 keyword2 ...  
+
+{auto_expect_prompt}  
+
+[EXPECTED OUTPUT]  
+运行代码后的精确预期输出结果...  
+
+[NEXT STEPS]  
+- 列出下一步需要实现的功能或需要解决的问题  
+- 每行一个步骤  
+
+{MULTI_ACTION_PROMPT}
+请确保每个响应包含[ACTION]、[CONTENT]（多动作时为编号的[ACTION n]、[CONTENT n]）、{('[EXPECTED OUTPUT]' if self.auto_expect else '')}和[NEXT STEPS]部分，不要包含其他部分。  
+"""
+        return self._call_llm(prompt)
+
+    def _plan_report_prompt(self):
+        """上一周期多动作执行结果的提示词片段"""
+        if not self.plan_report:
+            return ""
+        return f"[上一周期各动作的执行结果]\n{self.plan_report}\n"
+
+    def _search_digest_prompt(self, since_cycle=0):
+        """最近搜索到的资料摘要的提示词片段，只包含since_cycle之后的搜索"""
+        sections = [f"[搜索资料摘要（关键词: {entry['keywords']}）]\n{entry['digest']}\n"
+                    for entry in self.search_digests if entry["cycle"] > since_cycle]
+        return "".join(sections)
+
+    def _conversation_prefix(self):
+        """多轮对话的固定前缀：系统提示（含响应格式）和任务描述，整个运行期间保持不变"""
+        auto_expect_prompt = "\n同时准确预测代码的输出结果，放在[EXPECTED OUTPUT]部分，将用于验证代码是否正确执行。" \
+            if self.auto_expect else ""
+        system = f"{SYSTEM_PROMPT}\n\n{CONVERSATION_FORMAT}{auto_expect_prompt}"
+
+        task = f"[原始任务需求]\n{self.task}\n"
+        if self.notes:
+            task += f"\n[重要注意事项]\n{self.notes}\n"
+        if self.expected_output:
+            task += f"\n[用户指定的预期输出]\n{self.expected_output}\n"
+        task += self._test_cases_prompt() + self._reference_solution_prompt()
+        task += "\n之后每轮我会告诉你上一步的执行结果。请给出第一步行动。"
+        return [{"role": "system", "content": system}, {"role": "user", "content": task}]
+
+    def _conversation_observation(self, context):
+        """本周期的观察结果：上一轮之后的尝试结果、新的错误、当前进度和当前文件"""
+        conversation = self.conversation
+        lines = ["[执行结果]"]
+        if self.plan_report:
+            lines.append(self.plan_report)
+        else:
+            records = [record for record in self.attempts if record.cycle > conversation.observed_cycle]
+            lines.extend(f"- {record.describe()}" for record in records)
+        for entry in self.error_log.since(conversation.errors_seen)[-3:]:
+            lines.append(f"- 错误: {entry.describe()[-1000:].strip()}")
+        if len(lines) == 1:
+            lines.append("- 上一次响应没有产生可执行的动作")
+        lines.append(f"- 已生成文件: {', '.join(self.project_files[-3:]) if self.project_files else '无'}")
+        lines.append(f"- 当前进度: {context['current_step']} ({context['progress'] * 100:.0f}%)")
+        if context.get("next_steps"):
+            lines.append(f"- 下一步需要解决的问题: {', '.join(context['next_steps'])}")
+        observation = "\n".join(lines) + "\n"
+        digest = self._search_digest_prompt(since_cycle=conversation.observed_cycle)
+        if digest:
+            observation += "\n" + digest
+
+        current_file = self._current_filename()
+        if current_file:
+            try:
+                current_code = (self.workspace / current_file).read_text(encoding='utf-8')
+            except OSError:
+                current_code = None
+            # 文件内容与模型上一轮给出的完整代码相同时不再重复
+            if current_code is not None and current_code.strip() not in conversation.last_response:
+                observation += f"\n[当前文件 {current_file}]\n```python\n{current_code[:8000]}\n```\n"
+            if self.require_full_code:
+                observation += "上次的补丁无法应用到当前文件，本次请使用CODE给出完整文件。\n"
+        if conversation.dropped:
+            # 较早的轮次已被丢弃，用检索到的相关失败补充
+            observation += self._relevant_attempts_prompt(context)
+        return observation + "\n请根据以上结果继续，按约定的格式给出下一步行动。"
+
+    def _converse(self, context):
+        """多轮对话模式：在固定前缀和已有轮次之后追加本周期的观察结果"""
+        conversation = self.conversation
+        observation = self._conversation_observation(context) if conversation.turns else None
+        dropped = conversation.dropped
+        messages = conversation.messages(self._conversation_prefix(), observation, self.max_tokens)
+        if conversation.dropped > dropped:
+            self.log(f"对话历史超出上下文，已丢弃最早的 {conversation.dropped - dropped} 轮")
+        response = self._call_llm(observation or messages[-1]["content"], messages=messages)
+        if response:
+            conversation.add_turn(observation, response, self.current_cycle - 1, self.error_log.total)
+        return response
+
+    def _extract_content(self, action, response):
+        """按动作类型从响应中提取内容（代码块、diff、命令或搜索关键词），提取不到时返回None"""
+        content = None
+        if action == "CODE":
+            # 提取代码块和文件名
+            file_match = re.search(r'# filename:\s*(\S+)', response)
+            code_block_match = re.search(r'```python\s*(.*?)\s*```', response, re.DOTALL)
+
+            if file_match and code_block_match:
+                filename = file_match.group(1).strip()
+                code = code_block_match.group(1).strip()
+                content = f"# filename: {filename}\n{code}"
+            else:
+                # 备用提取方法
+                code_section = response.split("# filename:", 1)
+                if len(code_section) > 1:
+                    code_part = code_section[1].strip()
+                    filename_match = re.search(r'^([\w\.]+)', code_part)
+                    filename = filename_match.group(1) if filename_match else "main.py"
+                    content = f"# filename: {filename}\n{code_part}"
+
+        elif action == "PATCH":
+            # 提取diff，优先取```diff代码块
+            diff_match = re.search(r'```(?:diff|patch)[^\n]*\n(.*?)```', response, re.DOTALL)
+            if not diff_match:
+                diff_match = re.search(r'\[CONTENT\]\s*(.*?)(?=\[EXPECTED OUTPUT\]|\[NEXT STEPS\]|$)', response,
+                                       re.DOTALL)
+            if diff_match:
+                content = diff_match.group(1)
+
+        elif action == "COMMAND":
+            # 提取命令
+            command_match = re.search(r'(pip install\s+\S+|python\s+[\w\.]+)', response)
+            if command_match:
+                content = command_match.group(1)
+            else:
+                # 备用提取方法
+                for line in response.split('\n'):
+                    if line.strip().startswith('pip ') or line.strip().startswith('python '):
+                        content = line.strip()
+                        break
+
+        elif action == "SEARCH":
+            # 提取搜索关键词
+            search_match = re.search(r'\[CONTENT\]\s*(.*?)(?=\[|$)', response, re.DOTALL)
+            if search_match:
+                content = search_match.group(1).strip()
+            else:
+                lines = response.split('\n')
+                for i, line in enumerate(lines):
+                    if "SEARCH" in line.upper() and i + 1 < len(lines):
+                        content = lines[i + 1].strip()
+                        break
+        return content
+
+    def _parse_response(self, response):
+        """解析LLM的响应，适配DeepSeek模型的输出特点"""
+        try:
+            # 提取思考过程
+            think_match = re.search(r'<think>(.*?)</think>', response, re.DOTALL)
+            thinking = think_match.group(1).strip() if think_match else ""
+
+            # 提取动作类型(支持多种格式)
+            action = None
+            content = None
+            next_steps = []
+            expected_output = None
+
+            # 尝试提取标准格式的ACTION
+            action_match = re.search(r'\[ACTION\]\s*(CODE|PATCH|COMMAND|SEARCH)', response, re.IGNORECASE)
+            if action_match:
+                action = action_match.group(1).upper()
+
+                # 如果没有明确的ACTION标记，尝试通过内容推断
+            if not action:
+                if re.search(r'^@@.*@@', response, re.MULTILINE):
+                    action = "PATCH"
+                elif "# filename:" in response:
+                    action = "CODE"
+                elif "pip install" in response or "python " in response:
+                    action = "COMMAND"
+                elif re.search(r'搜索|关键词|search', response, re.IGNORECASE):
+                    action = "SEARCH"
+
+                    # 提取预期输出
+            expected_match = re.search(r'\[EXPECTED OUTPUT\](.*?)(?=\[|$)', response, re.DOTALL)
+            if expected_match:
+                expected_output = expected_match.group(1).strip()
+                if expected_output:
+                    self.log("提取到LLM生成的预期输出")
+                    self.llm_expected_output = expected_output
+
+                    # 提取内容
+            content = self._extract_content(action, response)
+
+                            # 提取下一步步骤
+            next_steps_match = re.search(r'\[NEXT STEPS\](.*?)($|\[)', response, re.DOTALL)
+            if next_steps_match:
+                steps_text = next_steps_match.group(1).strip()
+                next_steps = [step.strip().strip('-').strip() for step in steps_text.split('\n') if step.strip()]
+
+            # 带编号的多动作响应，各动作的内容在执行时再提取
+            plan = parse_action_plan(response)
+            if plan:
+                action, content = "PLAN", plan
+
+                # 确保我们至少得到了一些内容
+            if not content:
+                self.log("警告: 无法提取有效内容，使用原始响应")
+                content = response
+
+                # 如果我们没有得到明确的动作类型，基于内容再次推断
+            if not action:
+                if "# filename:" in content or "```python" in content:
+                    action = "CODE"
+                elif "pip " in content or "python " in content:
+                    action = "COMMAND"
+                else:
+                    action = "SEARCH"
+
+            if action == "PLAN":
+                self.log(f"解析结果: {len(content)} 个动作 ({', '.join(self._describe_planned(planned) for planned in content)})")
+            else:
+                self.log(f"解析结果: 动作={action}")
+            if expected_output:
+                self.log(f"LLM预期输出: {expected_output}")
+            if next_steps:
+                self.log(f"下一步计划: {', '.join(next_steps)}")
+
+                # 记录开发历史
+            self.development_history.append(HistoryEntry(self.current_cycle, thinking, action, expected_output,
+                                                         next_steps))
+
+            return action, content, thinking, next_steps
+
+        except Exception as e:
+            error_msg = f"响应解析错误: {str(e)}"
+            self.error_log.append(error_msg)
+            self.log(error_msg)
+            self.log(f"原始响应: {response[:100]}...")
+            return "ERROR", response, "", []
+
+    def _extract_code_from_response(self, content):
+        """从响应中提取代码和文件名"""
+        try:
+            # 确保有文件名
+            if "# filename:" not in content:
+                # 尝试查找或推断文件名
+                code_match = re.search(r'```python\s*(.*?)\s*```', content, re.DOTALL)
+                if code_match:
+                    code = code_match.group(1).strip()
+                    return "main.py", code
+                else:
+                    return "main.py", content
+
+                    # 提取文件名
+            file_match = re.search(r'# filename:\s*(\S+)', content)
+            filename = file_match.group(1) if file_match else "main.py"
+
+            # 提取代码
+            code_parts = []
+            capture = False
+
+            # 处理Markdown代码块
+            if "```python" in content:
+                code_match = re.search(r'```python\s*(.*?)\s*```', content, re.DOTALL)
+                if code_match:
+                    return filename, code_match.group(1).strip()
+
+                    # 处理常规代码
+            for line in content.split('\n'):
+                if line.strip().startswith('# filename:'):
+                    continue
+                code_parts.append(line)
+
+            code = '\n'.join(code_parts).strip()
+            return filename, code
+
+        except Exception as e:
+            self.error_log.append(f"代码提取错误: {str(e)}")
+            return "main.py", content
+
+    def _current_filename(self):
+        """最近生成的文件（相对工作区的路径），没有时返回None"""
+        for file in reversed(self.project_files):
+            path = Path(file)
+            if path.exists():
+                try:
+                    return str(path.relative_to(self.workspace))
+                except ValueError:
+                    continue
+        return None
+
+    def _apply_patch(self, diff_text):
+        """把统一diff应用到工作区文件，返回可交给_execute_safe的代码块；无法应用时返回None，下一周期改为要求完整文件"""
+        try:
+            file_patches = parse_unified_diff(diff_text or "")
+            patched_files = []
+            for name, hunks in file_patches:
+                filename = name or self._current_filename()
+                if filename and not (self.workspace / filename).exists():
+                    # 模型有时给出带目录的路径，退回到同名文件
+                    filename = Path(filename).name
+                if not filename or not (self.workspace / filename).exists():
+                    raise PatchError(f"要修改的文件不存在: {name or '未指定'}")
+                original = (self.workspace / filename).read_text(encoding='utf-8')
+                patched_files.append((filename, apply_hunks(original, hunks)))
+        except (PatchError, OSError) as e:
+            error_msg = f"补丁应用失败: {e}"
+            self.log(f"\n❌ {error_msg}，下一周期要求重新生成完整文件")
+            self.error_log.append(error_msg)
+            self._record_attempt("PATCH", {}, error=error_msg)
+            with self._state_lock:
+                self.require_full_code = True
+            return None
+
+        # 多文件补丁先写入其余文件，然后执行第一个文件
+        for filename, code in patched_files[1:]:
+            (self.workspace / filename).write_text(code, encoding='utf-8')
+        self.log(f"补丁已应用: {', '.join(filename for filename, _ in patched_files)}")
+        filename, code = patched_files[0]
+        return f"# filename: {filename}\n```python\n{code}\n```"
+
+    def _run_process(self, cmd, timeout, cwd=None, stdout=subprocess.PIPE, input=None, abort=None, phase=None):
+        """运行子进程（独立进程组），超时、取消或abort事件被设置时结束整个进程组
+
+        指定phase时把运行耗时计入该阶段的统计（超时按时限计入），用于学习后续的超时。
+        录制/回放会话时stdout为文件的输出也一并录制和回放
+        """
+        if self.session is None:
+            return self._spawn_process(cmd, timeout, cwd, stdout, input, abort, phase)
+
+        def run():
+            result = self._spawn_process(cmd, timeout, cwd, stdout, input, abort, phase)
+            out = result.stdout
+            if out is None and hasattr(stdout, "name"):
+                stdout.flush()
+                with open(stdout.name, 'r', encoding='utf-8', errors='replace') as f:
+                    out = f.read(self.session.max_output_chars)
+            return {"returncode": result.returncode, "stdout": out, "stderr": result.stderr}
+
+        self.cancel_token.check()
+        recorded = self._external("process", self._portable_command(cmd) + [input], run)
+        out = recorded["stdout"]
+        if hasattr(stdout, "write"):
+            if self.session.replaying:
+                stdout.write(out or "")
+            out = None
+        return subprocess.CompletedProcess(cmd, recorded["returncode"], out, recorded["stderr"])
+
+    def _portable_command(self, cmd):
+        """把命令中的解释器、pip和工作区路径换成占位符，用作会话录制的匹配键，也用于在执行节点上运行"""
+        aliases = {self._get_python_path(): "<python>", self._get_pip_path(): "<pip>"}
+        return [aliases.get(str(part)) or str(part).replace(str(self.workspace), "<workspace>") for part in cmd]
+
+    def _spawn_process(self, cmd, timeout, cwd, stdout, input, abort, phase):
+        """实际启动并等待子进程（指定了执行节点时在节点上运行）"""
+        if self.worker_pool:
+            return self._spawn_remote(cmd, timeout, stdout, input, abort, phase)
+        kwargs = {}
+        if os.name == 'nt':
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+
+        self.cancel_token.check()
+        stdin = subprocess.DEVNULL if input is None else subprocess.PIPE
+        process = subprocess.Popen(cmd, stdin=stdin, stdout=stdout, stderr=subprocess.PIPE, text=True, cwd=cwd,
+                                   **kwargs)
+        started = time.monotonic()
+        deadline = started + timeout
+        try:
+            while True:
+                try:
+                    out, err = process.communicate(input=input, timeout=0.2)
+                    if phase:
+                        latency_stats.observe(phase, time.monotonic() - started)
+                    return subprocess.CompletedProcess(cmd, process.returncode, out, err)
+                except subprocess.TimeoutExpired:
+                    input = None  # 输入只能在第一次communicate时传入
+                    if self.cancel_token.cancelled:
+                        raise OperationCancelled(self.cancel_token.reason)
+                    if abort is not None and abort.is_set():
+                        raise ProcessAborted()
+                    if time.monotonic() >= deadline:
+                        # 超时的运行只说明实际耗时超过当前时限，不计入样本，否则时限会逐次放大
+                        raise subprocess.TimeoutExpired(cmd, timeout)
+        except BaseException:
+            kill_process_tree(process)
+            process.communicate()
+            raise
+
+    def _spawn_remote(self, cmd, timeout, stdout, input, abort, phase):
+        """在本会话的执行节点上运行命令，输出写回本地（stdout为文件时写入该文件）"""
+        result = self._remote("run", {"cmd": self._portable_command(cmd), "input": input, "timeout": timeout},
+                              timeout=timeout + 120, abort=abort)
+        if result.get("timed_out"):
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        if phase:
+            latency_stats.observe(phase, result["elapsed"])
+        if result.get("truncated"):
+            self.log("⚠️ 程序输出过长，执行节点只返回了开头部分")
+        out = result["stdout"]
+        if hasattr(stdout, "write"):
+            stdout.write(out)
+            out = None
+        return subprocess.CompletedProcess(cmd, result["returncode"], out, result["stderr"])
+
+    def _remote(self, method, params, timeout=None, abort=None):
+        """调用本会话的执行节点（运行命令前先同步工作区），节点不可用时换到负载最低的其他节点重试"""
+        tried = []
+        while True:
+            self.cancel_token.check()
+            node = None
+            try:
+                with self._worker_lock:
+                    if self._worker is None:
+                        self._bind_worker(exclude=tried)
+                    node = self._worker
+                    if method == "run":
+                        self._sync_worker(node)
+                return node.call(method, {"session": self._worker_session, **params}, timeout=timeout,
+                                 cancel_token=self.cancel_token, abort=abort)
+            except WorkerUnavailable as e:
+                node = node or self._worker  # 绑定新节点后重新安装包时失败
+                if node is None:
+                    raise
+                self.worker_pool.record_failure(node)
+                tried.append(node)
+                with self._worker_lock:
+                    if self._worker is node:
+                        self.worker_pool.unbind(node)
+                        self._worker = None
+                self.log(f"⚠️ {e}，切换到其他执行节点")
+
+    def _bind_worker(self, exclude=()):
+        """为本会话选择负载最低的执行节点；换到新节点时在节点上重新安装之前安装过的包"""
+        node = self.worker_pool.bind(exclude)
+        if node is None:
+            raise WorkerUnavailable("没有可用的执行节点")
+        self._worker = node
+        self._synced = {}
+        self.log(f"会话分配到执行节点 {node.address}")
+        self._reinstall_packages(node)
+
+    def _reinstall_packages(self, node):
+        """在执行节点上重新安装本会话之前安装过的包"""
+        if not self.installed_packages:
+            return
+        self.log(f"在执行节点上安装之前安装过的包: {' '.join(self.installed_packages)}")
+        result = node.call("run", {"session": self._worker_session, "cmd": ["<pip>", "install",
+                                                                            *self.installed_packages],
+                                   "input": None, "timeout": self._pip_timeout()},
+                           timeout=self._pip_timeout() + 120, cancel_token=self.cancel_token)
+        if result.get("returncode") != 0:
+            self.log(f"⚠️ 重新安装失败: {error_signature(result.get('stderr', ''))}")
+
+    def _sync_worker(self, node):
+        """把工作区相对上次同步的改动同步到执行节点：只传输新增和修改的文件，删除工作区中已删除的文件
+
+        没有改动时也发送清单，以便发现节点上被清理过的会话目录：缺少的文件重新传输，
+        虚拟环境被清理时重新安装之前安装过的包。程序在节点上生成的文件留在节点上，不复制回工作区。
+        """
+        manifest = {name: info["sha1"] for name, info in self._workspace_manifest().items()}
+        changed = [name for name, sha1 in manifest.items() if self._synced.get(name) != sha1]
+        removed = [name for name in self._synced if name not in manifest]
+        missing, deleted = changed, removed
+        for _ in range(2):
+            files = {name: base64.b64encode((self.workspace / name).read_bytes()).decode("ascii")
+                     for name in missing}
+            result = node.call("sync", {"session": self._worker_session, "manifest": manifest, "files": files,
+                                        "deleted": deleted},
+                               timeout=300, cancel_token=self.cancel_token)
+            missing, deleted = result["missing"], []
+            if not missing:
+                break
+            # 节点上的文件与记录的不一致（例如节点重启或会话目录被清理），补传这些文件
+            self.log(f"执行节点 {node.address} 缺少 {len(missing)} 个文件，重新传输")
+        else:
+            raise WorkerUnavailable(f"无法同步工作区到执行节点 {node.address}")
+        if changed or removed:
+            self.log(f"同步到执行节点 {node.address}: {len(changed)} 个文件有改动"
+                     + (f"，删除 {len(removed)} 个" if removed else "")
+                     + f"，{len(manifest) - len(changed)} 个未变化")
+        self._synced = manifest
+        if result.get("new_venv") and self.installed_packages:
+            # 会话目录被节点清理过（节点上的会话数超过上限），虚拟环境是空的
+            self.log(f"⚠️ 执行节点 {node.address} 上的会话目录已被清理")
+            self._reinstall_packages(node)
+
+    def _release_worker(self):
+        """运行结束后解除会话与执行节点的绑定（节点上的会话目录保留，恢复运行时沿用）"""
+        with self._worker_lock:
+            if self._worker is not None:
+                self.worker_pool.unbind(self._worker)
+                self._worker = None
+
+    def _output_dir(self):
+        """程序输出落盘目录"""
+        output_dir = self.workspace / ".autocoder"
+        output_dir.mkdir(parents=True, exist_ok=True)
+        return output_dir
+
+    def _read_output_preview(self, path):
+        """读取落盘输出的预览，超长部分截断"""
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            preview = f.read(OUTPUT_PREVIEW_CHARS)
+            if f.read(1):
+                preview += f"\n...(输出过长已截断，完整输出见 {path})"
+        return preview
+
+    def _execute_safe(self, code_block):
+        """安全执行生成的代码"""
+        try:
+            # 提取文件名和代码
+            filename, code = self._extract_code_from_response(code_block)
+
+            self.log(f"保存代码到文件: {filename}")
+            self.log("代码内容:")
+            self.log("-" * 40)
+            self.log(code)
+            self.log("-" * 40)
+
+            # 保存代码文件
+            file_path = self.workspace / filename
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(code)
+
+            self.project_files.append(str(file_path))
+            code_info = {"filename": filename, "code_hash": code_hash(code)}
+
+            # 进程内静态预检：语法错误、未定义的名称和缺少的模块不必启动子进程就能发现
+            problems = self._precheck(code, filename)
+            if problems:
+                self.spawns_avoided += 1
+                diagnostic = "静态预检未通过:\n" + "\n".join(problems)
+                self.log(f"静态预检发现 {len(problems)} 个问题，不启动子进程运行")
+                return {**code_info, "success": False, "error": diagnostic, "prechecked": True}
+
+            if self.test_cases:
+                return {**code_info, **self._run_test_cases(filename, file_path)}
+
+            # 在虚拟环境中执行
+            python_path = self._get_python_path()
+            self.log(f"使用Python解释器: {python_path}")
+            self.log(f"执行代码: {filename}")
+
+            cmd = [python_path, str(file_path)]
+            # 标准输出直接落盘，验证时逐行读取，不必整体驻留内存
+            stdout_path = self._output_dir() / f"{Path(filename).stem}.stdout"
+            try:
+                with open(stdout_path, 'w', encoding='utf-8') as stdout_file:
+                    result = self._run_process(
+                        cmd,
+                        timeout=self._command_timeout(),
+                        cwd=str(self.workspace),
+                        stdout=stdout_file,
+                        phase=self._run_phase
+                    )
+                stdout = self._read_output_preview(stdout_path)
+
+                execution_result = {
+                    **code_info,
+                    "success": result.returncode == 0,
+                    "stdout": stdout,
+                    "stdout_path": str(stdout_path),
+                    "stderr": result.stderr,
+                    "returncode": result.returncode
+                }
+
+                self.log(f"执行结果: {'成功' if result.returncode == 0 else '失败'}")
+                self.log(f"标准输出: {stdout}")
+
+                if result.stderr:
+                    self.log(f"错误输出: {result.stderr}")
+
+                return execution_result
+
+            except subprocess.TimeoutExpired:
+                self.error_log.append(f"执行超时: {filename}")
+                return {**code_info, "success": False, "error": "执行超时"}
+            except Exception as e:
+                self.error_log.append(f"执行异常: {str(e)}")
+                return {**code_info, "success": False, "error": str(e)}
+
+        except Exception as e:
+            error_msg = f"代码执行准备失败: {str(e)}"
+            self.error_log.append(error_msg)
+            self.log(error_msg)
+            return {"success": False, "error": str(e)}
+
+    def _precheck(self, code, filename):
+        """静态预检，返回问题列表（为空表示通过）"""
+        started = time.perf_counter()
+        problems, tree = static_check(code, filename)
+        if tree is not None:
+            imports = _unguarded_imports(tree.body)
+            modules = sorted({name for name, _ in imports})
+            missing = set(self._external("imports", modules, lambda: self._missing_modules(modules)))
+            for name, line in imports:
+                if name in missing:
+                    missing.discard(name)
+                    problems.append(f"第{line}行: 缺少模块 '{name}'，请先使用COMMAND安装（pip install ...）")
+        if not problems:
+            self.log(f"静态预检通过 ({(time.perf_counter() - started) * 1000:.1f}ms)")
+        return problems
+
+    def _missing_modules(self, modules):
+        """虚拟环境中无法导入的模块；无法判断时（没有虚拟环境或解释器不提供标准库列表）返回空列表"""
+        stdlib = getattr(sys, "stdlib_module_names", None)
+        if self.worker_pool:
+            try:
+                available = self._remote("modules", {}, timeout=300)["modules"]
+            except WorkerError as e:
+                self.log(f"⚠️ 无法获取执行节点上已安装的模块: {e}")
+                available = None
+            available = None if available is None else set(available)
+        else:
+            available = site_packages_modules(self.venv_path)
+        if stdlib is None or available is None:
+            return []
+        return [name for name in modules
+                if name not in stdlib and name not in sys.builtin_module_names and name not in available
+                and not (self.workspace / f"{name}.py").exists() and not (self.workspace / name).is_dir()]
+
+    def _run_test_cases(self, filename, file_path):
+        """在有界线程池中并发运行全部测试用例，有用例失败时终止其余用例，返回逐用例的结果"""
+        python_path = self._get_python_path()
+        self.log(f"运行 {len(self.test_cases)} 个测试用例 (并发 {self.max_parallel_cases}): {filename}")
+        abort = threading.Event()
+        timeout = self._command_timeout()
+        outcomes = [None] * len(self.test_cases)
+        with ThreadPoolExecutor(max_workers=min(self.max_parallel_cases, len(self.test_cases))) as executor:
+            futures = {
+                executor.submit(self._run_test_case, index, case, python_path, file_path, abort, timeout): index
+                for index, case in enumerate(self.test_cases)
+            }
+            try:
+                for future in as_completed(futures):
+                    outcome = future.result()
+                    outcomes[futures[future]] = outcome
+                    if outcome["status"] != "passed":
+                        abort.set()
+            except BaseException:
+                abort.set()
+                raise
+
+        passed = sum(1 for outcome in outcomes if outcome["status"] == "passed")
+        icons = {"passed": "✅", "failed": "❌", "skipped": "⏭"}
+        lines = [f"测试用例 {passed}/{len(outcomes)} 通过:"]
+        for outcome in outcomes:
+            line = f"- {icons[outcome['status']]} {outcome['name']}"
+            if outcome["detail"]:
+                line += f": {outcome['detail']}"
+            lines.append(line)
+        report = "\n".join(lines)
+        self.log(report)
+
+        result = {
+            "success": passed == len(outcomes),
+            "cases": outcomes,
+            "stdout": report,
+            "returncode": 0 if passed == len(outcomes) else 1
+        }
+        if not result["success"]:
+            result["error"] = report
+        return result
+
+    def _run_test_case(self, index, case, python_path, file_path, abort, timeout):
+        """运行单个测试用例并验证输出"""
+        outcome = {"name": case.name, "status": "skipped", "detail": "未运行（已有用例失败）"}
+        if abort.is_set():
+            return outcome
+
+        stdout_path = self._output_dir() / f"{file_path.stem}.case{index + 1}.stdout"
+        try:
+            with open(stdout_path, 'w', encoding='utf-8') as stdout_file:
+                result = self._run_process(
+                    [python_path, str(file_path)] + case.args,
+                    timeout=timeout,
+                    cwd=str(self.workspace),
+                    stdout=stdout_file,
+                    input=case.input,
+                    abort=abort,
+                    phase=self._run_phase
+                )
+        except ProcessAborted:
+            return {**outcome, "detail": "已终止（已有用例失败）"}
+        except subprocess.TimeoutExpired:
+            return {**outcome, "status": "failed", "detail": f"执行超时 ({timeout:.0f}秒)"}
+
+        if result.returncode != 0:
+            detail = f"退出码 {result.returncode}: {error_signature(result.stderr) or '无错误输出'}"
+            return {**outcome, "status": "failed", "detail": detail}
+
+        try:
+            validator = self._get_validator(case.expected, case.validator, case.options) if case.validator \
+                else self._get_validator(case.expected)
+        except ValueError as e:
+            return {**outcome, "status": "failed", "detail": f"验证器构建失败: {e}"}
+        if validator.match_file(stdout_path):
+            return {**outcome, "status": "passed", "detail": ""}
+        actual = self._read_output_preview(stdout_path)
+        return {**outcome, "status": "failed", "detail": f"输出不符合预期，实际输出: {actual[:200]!r}"}
+
+    def _run_safe_command(self, command):
+        """安全执行命令"""
+        self.log(f"执行命令: {command}")
+
+        # 只允许安全命令
+        if command.startswith('pip install'):
+            package = command.split('pip install')[1].strip()
+            pip_path = self._get_pip_path()
+
+            self.log(f"使用pip安装包: {package}")
+            try:
+                result = self._run_process([pip_path, 'install', *package.split()], timeout=self._pip_timeout(),
+                                           phase="pip")
+
+                if result.returncode == 0:
+                    msg = f"包安装成功: {package}"
+                    self.installed_packages.extend(name for name in dict.fromkeys(package.split())
+                                                   if name not in self.installed_packages)
+                    self.log(msg)
+                    return {"success": True, "message": msg, "stdout": result.stdout}
+                else:
+                    msg = f"包安装失败: {result.stderr}"
+                    self.error_log.append(msg)
+                    self.log(msg)
+                    return {"success": False, "error": msg}
+
+            except Exception as e:
+                msg = f"包安装异常: {str(e)}"
+                self.error_log.append(msg)
+                self.log(msg)
+                return {"success": False, "error": str(e)}
+
+        elif command.startswith('python '):
+            script = command.split('python ')[1].strip()
+            python_path = self._get_python_path()
+            script_path = self.workspace / script
+
+            if not script_path.exists():
+                msg = f"脚本不存在: {script}"
+                self.error_log.append(msg)
+                self.log(msg)
+                return {"success": False, "error": msg}
+
+            self.log(f"执行Python脚本: {script}")
+            try:
+                result = self._run_process(
+                    [python_path, script],
+                    timeout=self._command_timeout(),
+                    cwd=str(self.workspace),
+                    phase=self._run_phase
+                )
+
+                self.log(f"脚本执行结果: {'成功' if result.returncode == 0 else '失败'}")
+                self.log(f"标准输出: {result.stdout}")
+
+                if result.stderr:
+                    self.log(f"错误输出: {result.stderr}")
+
+                return {
+                    "success": result.returncode == 0,
+                    "stdout": result.stdout,
+                    "stderr": result.stderr
+                }
+
+            except Exception as e:
+                msg = f"脚本执行异常: {str(e)}"
+                self.error_log.append(msg)
+                self.log(msg)
+                return {"success": False, "error": str(e)}
+        else:
+            msg = f"不支持的命令: {command}"
+            self.error_log.append(msg)
+            self.log(msg)
+            return {"success": False, "error": msg}
+
+    def _perform_web_search(self, keywords):
+        """执行网络搜索"""
+        return self._external("search", keywords, lambda: self.web_search.search(keywords))
+
+    def _digest_search(self, keywords, results):
+        """并发抓取排名靠前的搜索结果页面，提取与任务相关的段落，摘要放入下一周期的提示词；返回成功抓取的页面数"""
+        links = [result["link"] for result in results
+                 if urlparse(result.get("link") or "").scheme in ("http", "https")][:self.search_pages]
+        if not links:
+            return 0
+        fetcher = get_page_fetcher()
+        timeout = min(self.command_timeout, PAGE_FETCH_TIMEOUT)
+        self.log(f"抓取 {len(links)} 个结果页面")
+        with ThreadPoolExecutor(max_workers=min(len(links), PAGE_FETCH_WORKERS)) as executor:
+            futures = [executor.submit(self._external, "fetch", link,
+                                       lambda link=link: fetcher.fetch(link, timeout, self.cancel_token))
+                       for link in links]
+            pages = [future.result() for future in futures]
+        for page in pages:
+            if not page.get("success"):
+                self.log(f"⚠️ 页面抓取失败 {page['url']}: {page.get('error', '')}")
+        fetched = [page for page in pages if page.get("success")]
+
+        query = " ".join([keywords, self.task, self.error_log[-1][:500] if self.error_log else ""])
+        digest = build_search_digest(query, fetched, self.search_digest_tokens)
+        if not digest:
+            self.log("结果页面中没有找到与任务相关的内容")
+            return 0
+        with self._search_lock:
+            # 只保留本周期的搜索摘要，更早的摘要已经在之前的提示词中用过
+            self.search_digests = [entry for entry in self.search_digests if entry["cycle"] == self.current_cycle]
+            self.search_digests.append({"cycle": self.current_cycle, "keywords": keywords, "digest": digest})
+        cached = sum(1 for page in fetched if page.get("cached"))
+        self.log(f"已从 {len(fetched)} 个页面提取资料摘要（约 {estimate_tokens(digest)} tokens"
+                 + (f"，其中 {cached} 个页面来自缓存）" if cached else "）"))
+        return len(fetched)
+
+    def _get_validator(self, expected, name=None, options=None):
+        """获取预期输出对应的验证器（同一预期输出只编译一次），name/options为空时使用会话的验证方式"""
+        key = expected if name is None else (name, expected, json.dumps(options or {}, sort_keys=True))
+        with self._state_lock:
+            validator = self._validators.get(key)
+            if validator is None:
+                if name is None:
+                    validator = create_validator(self.validator_name, expected, **self.validator_options)
+                else:
+                    validator = create_validator(name, expected, **(options or {}))
+                self._validators[key] = validator
+                # 自动预期模式下预期输出每个周期都可能变化，只缓存最近的验证器
+                while len(self._validators) > 32:
+                    del self._validators[next(iter(self._validators))]
+        return validator
+
+    def validate_result(self, result):
+        """验证执行结果"""
+        if not isinstance(result, dict):
+            return False
+
+        # 多用例测试的结果在运行用例时已经逐个验证
+        if "cases" in result:
+            if result["success"]:
+                self.log(f"✅ 全部 {len(result['cases'])} 个测试用例通过")
+            return result["success"]
+
+        if not result.get("success", False):
+            return False
+
+        # 如果自动预期验证已启用且有LLM生成的预期输出，使用它进行验证
+        if self.auto_expect and self.llm_expected_output:
+            expected = self.llm_expected_output.strip()
+            self.log("使用LLM生成的预期输出进行验证...")
+            # 否则使用用户指定的预期输出
+        elif self.expected_output:
+            expected = self.expected_output.strip()
+            self.log("使用用户指定的预期输出进行验证...")
+        else:
+            # 没有预期输出，只验证程序执行成功
+            self.log("没有预期输出，仅验证程序执行成功")
+            return True
+
+        try:
+            validator = self._get_validator(expected)
+        except ValueError as e:
+            msg = f"验证器构建失败: {str(e)}"
+            self.error_log.append(msg)
+            self.log(f"❌ {msg}")
+            return False
+
+        # 有落盘输出时直接与文件比较，避免把大输出整体读入内存
+        stdout_path = result.get("stdout_path")
+        if stdout_path and os.path.exists(stdout_path):
+            matched = validator.match_file(stdout_path)
+        else:
+            matched = validator.match_text(result.get("stdout", ""))
+
+        if matched:
+            matched_by = getattr(validator, "matched_by", None) or validator
+            self.log(f"✅ 输出通过验证 ({matched_by.description})")
+            return True
+
+        self.log("❌ 输出与预期不匹配")
+        return False
+
+    def development_cycle(self):
+        """开发主循环，可被取消，设置了运行时限时到期自动停止"""
+        if self.run_timeout:
+            self.cancel_token.set_deadline(self.run_timeout)
+        success = False
+        try:
+            success = self._development_loop()
+            # 已结束的运行不再恢复；被取消或进程中断时保留最近的检查点
+            self._save_checkpoint(self.current_cycle, status="succeeded" if success else "failed")
+            return success
+        except BudgetExhausted as e:
+            self.budget_exhausted = True
+            msg = f"开发已停止: {e}"
+            self.error_log.append(msg)
+            self.log(f"\n⏹ {msg}")
+            # 预算用完的运行已结束，恢复运行只会继续消耗token
+            self._save_checkpoint(self.current_cycle, status="budget_exhausted")
+            return False
+        except OperationCancelled as e:
+            msg = f"开发已停止: {e}"
+            self.error_log.append(msg)
+            self.log(f"\n⏹ {msg}")
+            return False
+        finally:
+            self.phase = "finish"
+            self.cancel_token.clear_deadline()
+            self.web_search.close()
+            if self.worker_pool:
+                self._release_worker()
+            if self.session:
+                self.session.finish(success)
+            self.close_log()
+
+    def _try_known_solution(self, reuse_threshold=0.9):
+        """在调用LLM之前查找方案库：高度相似时直接验证历史方案，成功则无需调用模型"""
+        if not self.knowledge_base:
+            return False
+        solution, similarity = self._external(
+            "knowledge", self.task,
+            lambda: self.solution_store.lookup(self.task, self.notes) if self.solution_store else (None, 0.0)
+        )
+        if not solution:
+            return False
+
+        self.log(f"📚 找到相似的历史任务 (相似度 {similarity * 100:.0f}%): {solution['task'][:80]}")
+        self.reference_solution = (solution, similarity)
+        # 没有预期输出时验证只检查退出码，只有任务完全相同才直接复用
+        same_task = solution["task"].strip() == self.task.strip() and solution["notes"] == (self.notes or "")
+        if similarity < reuse_threshold or not (self.expected_output or same_task):
+            return False
+
+        self.log("直接验证历史方案...")
+        for package in solution["packages"]:
+            self._run_safe_command(f"pip install {package}")
+        result = self._execute_safe(f"# filename: {solution['filename']}\n```python\n{solution['code']}\n```")
+        if self.validate_result(result):
+            self._record_attempt("CACHE", result)
+            if self.solution_store:
+                self.solution_store.mark_used(solution["id"])
+            self.log("\n✅ 历史方案验证通过，跳过LLM生成")
+            return True
+
+        error_msg = result.get("stderr") or result.get("error") or f"输出不符合预期: {result.get('stdout', '')}"
+        self._record_attempt("CACHE", result, error=error_msg)
+        self.log("历史方案未通过验证，作为参考交给LLM")
+        return False
+
+    def _save_solution(self, result):
+        """把验证通过的代码保存到方案库"""
+        if not self.solution_store or not result.get("filename"):
+            return
+        try:
+            code = (self.workspace / result["filename"]).read_text(encoding='utf-8')
+            expected = self.expected_output or (self.llm_expected_output if self.auto_expect else None)
+            self.solution_store.add(self.task, self.notes, expected, result["filename"], code,
+                                    self.installed_packages)
+        except (OSError, sqlite3.Error) as e:
+            self.log(f"保存方案失败: {e}")
+
+    def _perform_action(self, action, content, context):
+        """执行一个动作并记录结果，返回 (任务是否已完成, 动作是否成功, 结果说明)"""
+        if action == "PATCH":
+            content = self._apply_patch(content)
+            if content is None:
+                context["current_step"] = "重新生成完整代码"
+                return False, False, self.error_log[-1]
+
+        if action in ("CODE", "PATCH"):
+            if action == "CODE":
+                with self._state_lock:
+                    self.require_full_code = False
+            result = self._execute_safe(content)
+            validation_result = self.validate_result(result)
+            if validation_result:
+                self._record_attempt(action, result)
+                self._save_solution(result)
+                self.log("\n✅ 代码执行成功!")
+                self.log(f"输出: {result.get('stdout', '')}")
+                return True, True, "输出通过验证"
+            error_msg = result.get("stderr", result.get("error", "未知错误"))
+            if not error_msg and result.get("success", False):
+                # 执行成功但验证失败，可能是输出格式不匹配
+                error_msg = f"输出不符合预期: {result.get('stdout', '')}"
+            self.log(f"\n❌ 代码验证失败: {error_msg}")
+            self.error_log.append(f"验证失败: {error_msg}")
+            self._record_attempt(action, result, error=error_msg)
+            context["current_step"] = "修复执行错误"
+            return False, False, error_msg
+
+        if action == "COMMAND":
+            result = self._run_safe_command(content)
+            context["current_step"] = "执行环境配置"
+            return False, *self._command_outcome(content, result)
+
+        # SEARCH
+        self.log(f"\n🔍 搜索关键词: {content}")
+        search_result = self._perform_web_search(content)
+        self._record_attempt("SEARCH", search_result, target=content,
+                             error="" if search_result.get("success") else search_result.get("error", "搜索失败"))
+        context["current_step"] = "搜索相关资料"
+        if search_result.get("success", False):
+            results = search_result.get("results", [])
+            self.log(f"找到 {len(results)} 条搜索结果:")
+            for i, result in enumerate(results):
+                self.log(f"\n结果 {i + 1}: {result['title']}")
+                self.log(f"链接: {result['link']}")
+                self.log(f"摘要: {result['abstract'][:200]}...")
+            digested = self._digest_search(content, results)
+            detail = f"找到 {len(results)} 条结果: " + "; ".join(result['title'] for result in results[:3])
+            if digested:
+                detail += f"；已从 {digested} 个页面提取相关资料"
+            return False, True, detail
+        error_msg = search_result.get("error", "搜索失败")
+        self.log(f"❌ 搜索失败: {error_msg}")
+        self.error_log.append(f"搜索失败: {error_msg}")
+        return False, False, error_msg
+
+    def _command_outcome(self, command, result):
+        """记录命令的执行结果，返回 (是否成功, 结果说明)"""
+        if result.get("success", False):
+            self._record_attempt("COMMAND", result, target=command)
+            self.log(f"\n✅ 命令执行成功: {result.get('message', '')}")
+            if "stdout" in result:
+                self.log(f"输出: {result['stdout']}")
+            return True, result.get("message") or "成功"
+        error_msg = result.get("error", "未知错误")
+        self.log(f"\n❌ 命令执行失败: {error_msg}")
+        self.error_log.append(f"命令失败: {error_msg}")
+        self._record_attempt("COMMAND", result, target=command, error=error_msg)
+        return False, error_msg
+
+    def _describe_planned(self, planned):
+        """多动作中一个动作的简短描述"""
+        text = planned.describe()
+        if planned.depends_on:
+            text += f"(依赖{','.join(map(str, planned.depends_on))})"
+        return text
+
+    def _plan_dependencies(self, plan):
+        """确定每个动作依赖的动作编号：只允许依赖排在前面的动作；未标注时pip安装和搜索不依赖其他动作，
+        代码、补丁和运行脚本依赖之前的全部动作"""
+        earlier = []
+        for planned in plan:
+            if planned.depends_on is not None:
+                planned.depends_on = [index for index in planned.depends_on if index in earlier]
+            elif planned.is_install or planned.action == "SEARCH":
+                planned.depends_on = []
+            else:
+                planned.depends_on = list(earlier)
+            earlier.append(planned.index)
+
+    def _planned_content(self, planned):
+        """提取多动作中一个动作的内容"""
+        if planned.action == "COMMAND":
+            # 保留整行命令，多个包的pip安装合并执行
+            for line in planned.content.splitlines():
+                if line.strip().startswith(("pip install", "python ")):
+                    return line.strip()
+        return self._extract_content(planned.action, f"[CONTENT]\n{planned.content}\n") or planned.content
+
+    def _planned_files(self, planned):
+        """多动作中一个动作会写入或运行的文件（按文件名去掉扩展名，输出文件也按它命名），其他动作返回空集合"""
+        content = self._planned_content(planned)
+        if planned.action == "CODE":
+            file_match = re.search(r'# filename:\s*(\S+)', content)
+            names = [file_match.group(1) if file_match else "main.py"]
+        elif planned.action == "PATCH":
+            try:
+                names = [name or self._current_filename() for name, _ in parse_unified_diff(content)]
+            except PatchError:
+                names = []
+            names = [name for name in names if name] or [self._current_filename() or "main.py"]
+        elif planned.action == "COMMAND" and content.startswith("python "):
+            names = content.split()[1:2]
+        else:
+            return set()
+        return {Path(name).stem for name in names}
+
+    def _run_plan(self, plan, context):
+        """按依赖关系执行多个动作：互不依赖的动作并发执行，同时就绪的pip安装合并为一次安装
+
+        依赖的动作失败（搜索除外）时跳过该动作；写入或运行同一文件的动作依次执行，每个动作使用context的副本，
+        完成后把它修改的内容合并回context；各动作的结果汇总到下一周期的提示词中，返回任务是否已完成
+        """
+        # 编号重复时以顺序为准
+        for position, planned in enumerate(plan, 1):
+            if planned.index in {other.index for other in plan[:position - 1]}:
+                planned.index = max(other.index for other in plan) + 1
+        self._plan_dependencies(plan)
+        by_index = {planned.index: planned for planned in plan}
+        self.log(f"执行 {len(plan)} 个动作 (并发上限 {self.max_parallel_actions})")
+
+        outcomes = {}  # 动作编号 -> (是否成功, 结果说明)
+        solved = False
+        pending = list(plan)
+        with ThreadPoolExecutor(max_workers=self.max_parallel_actions) as executor:
+            running = {}
+            action_state = {}  # 正在执行的动作 -> (它写入或运行的文件, 它使用的context副本, 副本的初始内容)
+            while pending or running:
+                self.cancel_token.check()
+                if solved and pending:
+                    # 任务已完成，不再启动后面的动作（它们可能覆盖已通过验证的文件）
+                    for planned in pending:
+                        outcomes[planned.index] = (None, "任务已完成，未执行")
+                    self.log(f"任务已完成，跳过其余 {len(pending)} 个动作")
+                    pending = []
+                    continue
+                ready = [planned for planned in pending if all(index in outcomes for index in planned.depends_on)]
+                installs = []
+                for planned in ready:
+                    files = self._planned_files(planned)
+                    if any(files & busy for busy, _, _ in action_state.values()):
+                        continue  # 等待写入或运行同一文件的动作完成
+                    pending.remove(planned)
+                    failed = [index for index in planned.depends_on
+                              if not outcomes[index][0] and by_index[index].action != "SEARCH"]
+                    if failed:
+                        outcomes[planned.index] = (None, f"依赖的动作 {', '.join(map(str, failed))} 失败，未执行")
+                        self.log(f"⚠️ 跳过{planned.describe()}: {outcomes[planned.index][1]}")
+                    elif planned.is_install:
+                        installs.append(planned)
+                    else:
+                        self.log(f"开始{self._describe_planned(planned)}")
+                        action_context = dict(context)
+                        future = executor.submit(self._perform_action, planned.action,
+                                                 self._planned_content(planned), action_context)
+                        running[future] = [planned]
+                        action_state[future] = (files, action_context, dict(context))
+                if installs:
+                    running[executor.submit(self._install_planned, installs)] = installs
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    actions = running.pop(future)
+                    if future in action_state:
+                        _, action_context, initial = action_state.pop(future)
+                        context.update({key: value for key, value in action_context.items()
+                                        if initial.get(key) != value})
+                    if len(actions) == 1 and not actions[0].is_install:
+                        task_solved, success, detail = future.result()
+                        solved = solved or task_solved
+                        outcomes[actions[0].index] = (success, detail)
+                    else:
+                        outcomes.update(future.result())
+
+        lines = []
+        for planned in plan:
+            success, detail = outcomes[planned.index]
+            status = "成功" if success else ("跳过" if success is None else "失败")
+            lines.append(f"- {self._describe_planned(planned)}: {status} - {str(detail)[:300].strip()}")
+        self.plan_report = "\n".join(lines)
+        self.log("多动作执行结果:\n" + self.plan_report)
+        return solved
+
+    def _install_planned(self, installs):
+        """把同时就绪的pip安装合并为一次安装（并发运行多个pip会争用同一个site-packages），
+        合并安装失败时逐个安装以确定失败的包；返回 {动作编号: (是否成功, 结果说明)}"""
+        commands = [self._planned_content(planned) for planned in installs]
+        if len(installs) > 1:
+            packages = [package for command in commands for package in command.split()[2:]]
+            result = self._run_safe_command("pip install " + " ".join(packages))
+            if result.get("success"):
+                return {planned.index: self._command_outcome(command, result)
+                        for planned, command in zip(installs, commands)}
+            self.log("合并安装失败，逐个安装以确定失败的包")
+        return {planned.index: self._command_outcome(command, self._run_safe_command(command))
+                for planned, command in zip(installs, commands)}
+
+    def _development_loop(self):
+        """开发周期循环，从检查点恢复时跳过已完成的周期"""
+        first_step = self._resume_state["completed_cycle"] if self._resume_state else 0
+        if self._context is None:
+            self._context = {
+                "current_step": "初始化开发环境",
+                "progress": 0.0,
+                "next_steps": ["分析任务需求", "编写初始代码"]
+            }
+        context = self._context
+
+        # 更新任务跟踪
+        self._update_task_tracking(context["current_step"], context["next_steps"], context["progress"])
+
+        if not first_step and self._try_known_solution():
+            return True
+
+        for step in range(first_step, self.max_attempts):
+            if step > first_step:
+                # 上一个周期已完成
+                self._save_checkpoint(step)
+            self.cancel_token.check()
+            self.current_cycle = step + 1
+            self.phase = "generate"
+            self.log(f"\n{'=' * 20} 开发周期 {step + 1}/{self.max_attempts} {'=' * 20}")
+
+            # 生成代码，恢复运行时优先使用检查点中已付费的响应
+            llm_response = self._cached_responses.get(self.current_cycle)
+            if llm_response:
+                self.log("使用检查点中保存的LLM响应")
+            else:
+                llm_response = self._generate_code(context)
+                if llm_response:
+                    self._cached_responses[self.current_cycle] = llm_response
+                    self._save_checkpoint(step)
+            if not llm_response:
+                self.log("LLM响应失败，重试...")
+                self.cancel_token.wait(1)
+                continue
+
+                # 解析响应
+            action, content, thinking, next_steps = self._parse_response(llm_response)
+
+            # 显示思考过程
+            if thinking:
+                self.log("\n思考过程:")
+                self.log("-" * 40)
+                self.log(thinking[:500] + "..." if len(thinking) > 500 else thinking)
+                self.log("-" * 40)
+
+                # 如果解析失败，尝试进行修复
+            if action == "ERROR":
+                self.log("响应解析失败，尝试简单解析...")
+                # 尝试简单启发式解析
+                if re.search(r'^@@.*@@', llm_response, re.MULTILINE):
+                    action = "PATCH"
+                    content = llm_response
+                elif "# filename:" in llm_response:
+                    action = "CODE"
+                    content = llm_response
+                elif "pip install" in llm_response or "python " in llm_response:
+                    action = "COMMAND"
+                    # 提取第一个看起来像命令的行
+                    for line in llm_response.split('\n'):
+                        if "pip install" in line or "python " in line:
+                            content = line.strip()
+                            break
+                    if not content:
+                        content = llm_response
+                else:
+                    self.log("无法解析内容，跳过此周期")
+                    context["current_step"] = "修复解析错误"
+                    context["progress"] = min(1.0, (step + 1) / self.max_attempts)
+                    self._update_task_tracking(context["current_step"], next_steps or context.get("next_steps", []),
+                                               context["progress"])
+                    continue
+
+            self.plan_report = None
+            if action == "PLAN":
+                self.phase = "plan"
+                solved = self._run_plan(content, context)
+            else:
+                self.phase = action.lower()
+                self.log(f"执行动作: {action}")
+                solved, _, _ = self._perform_action(action, content, context)
+            if solved:
+                return True
+
+                # 更新进度
+            context["progress"] = min(1.0, (step + 1) / self.max_attempts)
+            # 更新下一步计划
+            context["next_steps"] = next_steps if next_steps else context.get("next_steps", [])
+            # 更新任务跟踪
+            self._update_task_tracking(context["current_step"], context["next_steps"], context["progress"])
+
+        self.current_cycle = self.max_attempts
+        self.log("\n❌ 达到最大重试次数，开发失败")
+        return False
+
+    def get_summary(self):
+        """获取开发摘要"""
+        summary = "\n" + "=" * 50 + "\n"
+
+        if self.project_files:
+            summary += "✅ 开发成功!\n\n"
+            summary += "生成的文件:\n"
+            for file in self.project_files:
+                summary += f"- {file}\n"
+
+                # 显示最终文件内容
+            latest_file = self.project_files[-1]
+            summary += f"\n最终文件内容 ({latest_file}):\n"
+            summary += "-" * 40 + "\n"
+            try:
+                with open(latest_file, 'r', encoding='utf-8') as f:
+                    summary += f.read() + "\n"
+            except Exception as e:
+                summary += f"无法读取文件: {e}\n"
+            summary += "-" * 40 + "\n"
+        else:
+            summary += "❌ 开发失败\n\n"
+            summary += "错误日志:\n"
+            for entry in self.error_log.entries()[-10:]:  # 仅显示最近10条错误
+                summary += f"- {entry.describe()}\n"
+
+        summary += f"\nLLM用量: {self.token_usage.describe()}"
+        if self.token_budget:
+            summary += f"，预算 {self.token_budget}"
+        summary += "\n"
+        if self.spawns_avoided:
+            summary += f"静态预检拦截: {self.spawns_avoided} 次（省去的子进程启动）\n"
+
+        if self.timeouts_used:
+            names = {"llm_first_token": "LLM首token", "llm_total": "LLM整体", "run": "程序运行", "pip": "pip安装"}
+            summary += "\n本次使用的超时: " + ", ".join(
+                f"{names[name]} {'不限' if value is None else f'{value:.0f}秒'}"
+                for name, value in self.timeouts_used.items()) + "\n"
+
+        metrics = llm_limiter.metrics()
+        summary += (f"\nLLM并发: 上限 {metrics['limit']}, 进行中 {metrics['in_flight']}, "
+                    f"排队 {metrics['queue_depth']}, 平均等待 {metrics['avg_wait']:.2f}秒, "
+                    f"最长等待 {metrics['max_wait']:.2f}秒\n")
+
+        if self.worker_pool:
+            summary += "\n执行节点:\n"
+            for node in self.worker_pool.status():
+                state = "熔断中" if node["circuit_open"] else f"运行中 {node['running']}/{node['capacity']}"
+                summary += f"- {node['address']}: {state}, 连续失败 {node['consecutive_failures']}\n"
+
+        if self.attempts:
+            summary += "\n尝试记录:\n"
+            for record in self.attempts:
+                summary += f"- {record.describe()}\n"
+
+        summary += "\n开发历史总结:\n"
+        for entry in self.development_history:
+            summary += f"\n周期 {entry.cycle}:\n"
+            usage = self.token_usage.per_cycle.get(entry.cycle)
+            if usage:
+                summary += f"- token用量: 提示 {usage['prompt_tokens']}, 生成 {usage['completion_tokens']}\n"
+            summary += f"- 动作: {entry.action}\n"
+            if entry.thinking:
+                thinking_summary = entry.thinking[:100] + "..." if len(entry.thinking) > 100 else entry.thinking
+                summary += f"- 思考摘要: {thinking_summary}\n"
+            if entry.expected_output:
+                summary += f"- 预期输出: {entry.expected_output}\n"
+            if entry.next_steps:
+                summary += f"- 下一步计划: {', '.join(entry.next_steps)}\n"
+
+        return summary
+
+
+def main():
+    """无头运行入口：python auto_coder.py --task "..." [--expected-output "..."]，或 --resume --workspace 目录"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="AutoCoder无头运行")
+    parser.add_argument("--task", help="任务描述")
+    parser.add_argument("--notes", default="", help="任务注意事项")
+    parser.add_argument("--expected-output", help="预期输出")
+    parser.add_argument("--auto-expect", action="store_true", help="使用LLM生成的预期输出进行验证")
+    parser.add_argument("--workspace", default="safe_workspace")
+    parser.add_argument("--endpoints", default="localhost:1234", help="LLM服务端点，多个用逗号分隔")
+    parser.add_argument("--max-tokens", type=int, default=2000)
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--command-timeout", type=int, default=30)
+    parser.add_argument("--api-timeout", type=int, default=120)
+    parser.add_argument("--run-timeout", type=int, help="整次运行的时限（秒）")
+    parser.add_argument("--validator", default="auto", choices=sorted(VALIDATORS))
+    parser.add_argument("--test-cases", help="测试用例JSON文件：[{\"input\": ..., \"args\": [...], \"expected\": ...}, ...]")
+    parser.add_argument("--parallel-cases", type=int, default=4, help="并发运行的测试用例数")
+    parser.add_argument("--parallel-actions", type=int, default=4, help="多动作响应中并发执行的动作数")
+    parser.add_argument("--search-pages", type=int, default=3, help="每次搜索后抓取并提取摘要的结果页面数，0表示不抓取")
+    parser.add_argument("--search-digest-tokens", type=int, default=1200, help="搜索资料摘要的token预算")
+    parser.add_argument("--workers", help="执行节点列表（host:port，多个用逗号分隔），代码运行和pip安装在节点上进行")
+    parser.add_argument("--token-budget", type=int, help="整个任务的token预算，用完后停止")
+    parser.add_argument("--no-adaptive-timeouts", action="store_true", help="始终使用静态超时")
+    parser.add_argument("--no-knowledge-base", action="store_true", help="不查找和保存历史方案")
+    parser.add_argument("--offline", action="store_true", help="只使用本地缓存的ChromeDriver，不联网检查版本")
+    parser.add_argument("--conversation", action="store_true",
+                        help="多轮对话模式：保持固定的提示前缀并逐周期追加，便于服务端复用前缀缓存")
+    parser.add_argument("--context-tokens", type=int, default=8192, help="模型上下文长度（多轮对话模式）")
+    parser.add_argument("--resume", action="store_true", help="从工作区的检查点继续未完成的运行（任务参数取自检查点）")
+    parser.add_argument("--record", help="把本次运行的全部外部交互录制到该会话归档（.jsonl.gz）")
+    parser.add_argument("--replay", help="回放会话归档，不访问模型、网络和浏览器")
+    args = parser.parse_args()
+    if not args.task and not args.resume and not args.replay:
+        parser.error("需要 --task、--resume 或 --replay")
+
+    if args.offline:
+        driver_resolver.offline = True
+
+    if args.replay:
+        try:
+            auto_coder = AutoCoder.replay(args.replay)
+        except (OSError, ValueError) as e:
+            print(f"❌ 无法读取会话归档: {e}")
+            return 1
+    elif args.resume and not args.task:
+        try:
+            auto_coder = AutoCoder.resume(args.workspace)
+        except ValueError as e:
+            print(f"❌ {e}")
+            return 1
+    else:
+        auto_coder = AutoCoder(
+            task=args.task,
+            notes=args.notes,
+            workspace=args.workspace,
+            max_tokens=args.max_tokens,
+            expected_output=args.expected_output,
+            auto_expect=args.auto_expect,
+            max_attempts=args.max_attempts,
+            command_timeout=args.command_timeout,
+            api_timeout=args.api_timeout,
+            validator=args.validator,
+            endpoints=args.endpoints,
+            run_timeout=args.run_timeout,
+            knowledge_base=not args.no_knowledge_base,
+            test_cases=args.test_cases,
+            max_parallel_cases=args.parallel_cases,
+            max_parallel_actions=args.parallel_actions,
+            search_pages=args.search_pages,
+            search_digest_tokens=args.search_digest_tokens,
+            workers=args.workers,
+            adaptive_timeouts=not args.no_adaptive_timeouts,
+            token_budget=args.token_budget,
+            conversation=args.conversation,
+            context_tokens=args.context_tokens,
+            resume=args.resume,
+            session=SessionRecorder(args.record) if args.record else None
+        )
+    try:
+        success = auto_coder.development_cycle()
+    except KeyboardInterrupt:
+        auto_coder.cancel("用户中断")
+        success = False
+    print(auto_coder.get_summary())
+    return 0 if success else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
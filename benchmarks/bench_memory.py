@@ -0,0 +1,130 @@
+"""长时间运行的内存基准：用模拟LLM服务驱动一次永远不成功的合成运行，测量引擎状态随周期数的增长
+
+模拟服务每个周期返回不同的失败代码：大多数周期是静态预检就能发现的未定义名称（不启动子进程），
+每10个周期一次运行时失败，向stderr输出大段内容。每隔若干周期记录引擎状态对象的深度大小和tracemalloc统计。
+用法: python benchmarks/bench_memory.py [--cycles 1000] [--interval 100] [--conversation] [--json results.jsonl]
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+# 日志只需要经过日志分发器，不写日志文件
+os.environ.setdefault("AUTOCODER_LOG_FILE", "-")
+
+from auto_coder import AutoCoder, get_log_hub  # noqa: E402
+from mock_llm_server import MockLLMServer  # noqa: E402
+
+# 计入引擎状态的属性
+STATE_ATTRIBUTES = ("error_log", "project_files", "development_history", "attempts", "conversation",
+                    "token_usage", "installed_packages", "search_digests", "_validators", "_cached_responses")
+
+
+class SyntheticLLMServer(MockLLMServer):
+    """每个请求返回不同的失败代码的模拟服务"""
+
+    def reply_for(self, prompt):
+        n = self.request_count
+        thinking = f"第{n}次分析：" + "检查上一次的错误并调整实现。" * 150
+        if n % 10 == 0:
+            filename = f"step_{n % 7}.py"
+            code = f"import sys\nsys.stderr.write('trace line {n}\\n' * 2000)\nraise ValueError('bad value {n}')"
+        else:
+            filename = "main.py"
+            code = f"print(result_{n})"
+        return (f"<think>{thinking}</think>\n[ACTION]\nCODE\n\n[CONTENT]\n# filename: {filename}\n"
+                f"```python\n{code}\n```\n\n[NEXT STEPS]\n- 修复第{n}次的错误\n- 再次运行\n")
+
+
+def deep_size(obj, seen):
+    """对象及其引用的全部对象的大小（字节），跳过模块、类和函数等共享对象"""
+    size = 0
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, (type, types.ModuleType, types.FunctionType, types.MethodType)):
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        stack.extend(gc.get_referents(item))
+    return size
+
+
+class MeasuredAutoCoder(AutoCoder):
+    """每隔interval个周期在保存检查点时采样一次内存（一个周期内可能保存多次检查点，只采样第一次）"""
+
+    interval = 100
+    samples = []
+
+    def _save_checkpoint(self, completed_cycle, status="running"):
+        super()._save_checkpoint(completed_cycle, status)
+        sampled = self.samples and self.samples[-1]["cycle"] == completed_cycle
+        if completed_cycle and completed_cycle % self.interval == 0 and status == "running" and not sampled:
+            seen = set()
+            state = {name: deep_size(getattr(self, name), seen) for name in STATE_ATTRIBUTES}
+            self.samples.append({"cycle": completed_cycle, "state_bytes": sum(state.values()), "state": state,
+                                 "traced_bytes": tracemalloc.get_traced_memory()[0]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="长时间运行的内存基准")
+    parser.add_argument("--cycles", type=int, default=1000)
+    parser.add_argument("--interval", type=int, default=100, help="每隔多少个周期采样一次")
+    parser.add_argument("--conversation", action="store_true", help="使用多轮对话模式")
+    parser.add_argument("--json", help="把结果追加到该JSONL文件，便于跟踪变化")
+    args = parser.parse_args()
+
+    server = SyntheticLLMServer(("127.0.0.1", 0))
+    server.start_background()
+    workspace = Path(tempfile.mkdtemp(prefix="autocoder-bench-"))
+    MeasuredAutoCoder.interval = args.interval
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        # 引擎日志同时打印到标准输出，测量时丢弃（不能缓存在内存中，否则会计入已分配内存）
+        with open(os.devnull, 'w', encoding='utf-8') as devnull, contextlib.redirect_stdout(devnull):
+            auto_coder = MeasuredAutoCoder(
+                task="合成任务：输出ok", workspace=workspace / "ws", port=server.server_address[1],
+                expected_output="ok", max_attempts=args.cycles, knowledge_base=False, adaptive_timeouts=False,
+                conversation=args.conversation)
+            auto_coder.development_cycle()
+            get_log_hub().flush()
+    finally:
+        server.shutdown()
+        shutil.rmtree(workspace, ignore_errors=True)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    samples = MeasuredAutoCoder.samples
+    print(f"{'周期':>6}{'引擎状态(KB)':>14}{'已分配(KB)':>12}  最大的状态对象")
+    for sample in samples:
+        largest = sorted(sample["state"].items(), key=lambda item: item[1], reverse=True)[:3]
+        print(f"{sample['cycle']:>6}{sample['state_bytes'] / 1024:>14.1f}{sample['traced_bytes'] / 1024:>12.1f}  "
+              + ", ".join(f"{name} {size / 1024:.0f}KB" for name, size in largest))
+    print(f"\n共 {auto_coder.current_cycle} 个周期，耗时 {elapsed:.1f}s，已分配内存峰值 {peak / 1024 / 1024:.1f}MB，"
+          f"错误日志 {len(auto_coder.error_log)} 条（累计 {auto_coder.error_log.total} 次），"
+          f"项目文件 {len(auto_coder.project_files)} 个")
+    if len(samples) >= 2:
+        growth = (samples[-1]["state_bytes"] - samples[0]["state_bytes"]) / (samples[-1]["cycle"] - samples[0]["cycle"])
+        print(f"周期 {samples[0]['cycle']} 之后引擎状态平均每周期增长 {growth:.0f} 字节")
+
+    if args.json:
+        record = {"timestamp": time.time(), "python": sys.version.split()[0], "cycles": args.cycles,
+                  "conversation": args.conversation, "elapsed_s": elapsed, "peak_bytes": peak, "samples": samples}
+        with open(args.json, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
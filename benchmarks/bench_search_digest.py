@@ -0,0 +1,75 @@
+"""搜索资料摘要基准：用本地HTML文件测量正文提取和段落排序的耗时，并输出生成的摘要
+
+页面按参数顺序视为搜索结果的排名，与运行时一样并发提取；本地文件不经过页面缓存。
+不指定页面时使用 benchmarks/fixtures/search_pages 中的示例页面（requests超时与重试，含导航、脚本等噪声、
+转载的近似重复段落和GBK编码的页面）。
+用法: python benchmarks/bench_search_digest.py [页面或目录 ...] [--query "关键词 任务"] [--budget 1200] [--runs 5]
+"""
+import argparse
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from auto_coder import PAGE_FETCH_WORKERS, PageFetcher, build_search_digest, estimate_tokens  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "search_pages"
+FIXTURE_QUERY = "requests 超时 重试 timeout retry 给HTTP请求加上超时和失败重试"
+
+
+def find_pages(paths):
+    """展开目录参数，返回全部HTML文件"""
+    pages = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            pages.extend(sorted(path.rglob("*.htm*")))
+        else:
+            pages.append(path)
+    return pages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="搜索资料摘要基准")
+    parser.add_argument("paths", nargs="*", help="HTML文件或包含HTML文件的目录（默认为示例页面）")
+    parser.add_argument("--query", help="排序段落使用的查询（搜索关键词和任务描述），使用示例页面时有默认值")
+    parser.add_argument("--budget", type=int, default=1200, help="摘要的token预算")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    if not args.paths:
+        args.paths = [str(FIXTURES)]
+        args.query = args.query or FIXTURE_QUERY
+    if not args.query:
+        parser.error("指定页面时需要 --query")
+    pages = [str(path) for path in find_pages(args.paths)]
+    if not pages:
+        print("没有找到HTML文件")
+        return 1
+
+    # 运行时的抓取器只接受http(s)链接，基准显式允许读取本地文件
+    fetcher = PageFetcher(allow_local=True)
+    extract_ms, digest_ms = [], []
+    for _ in range(args.runs):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(len(pages), PAGE_FETCH_WORKERS)) as executor:
+            fetched = list(executor.map(fetcher.fetch, pages))
+        extract_ms.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        digest = build_search_digest(args.query, [page for page in fetched if page["success"]], args.budget)
+        digest_ms.append((time.perf_counter() - started) * 1000)
+
+    for page in fetched:
+        status = f"{len(page['passages'])} 个段落" if page["success"] else f"失败: {page['error']}"
+        print(f"{page['url']}: {status}")
+    print(f"\n提取: 中位数 {statistics.median(extract_ms):.1f}ms，排序和摘要: 中位数 {statistics.median(digest_ms):.1f}ms")
+    print(f"摘要约 {estimate_tokens(digest)} tokens（预算 {args.budget}）\n")
+    print(digest or "（没有与查询相关的段落）")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+"""冷启动导入耗时基准：分别测量无头（auto_coder）与GUI（main_with_UI）启动的导入开销
+
+每次测量都在新的解释器进程中进行，结果减去空解释器的启动时间。
+用法: python benchmarks/bench_startup.py [--runs 10] [--json results.jsonl]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+SCENARIOS = {
+    "interpreter": "pass",
+    "headless": "import auto_coder",
+    "headless+http": "import auto_coder; auto_coder.get_http_session()",
+    "gui": "import main_with_UI",
+}
+
+# 无头启动时不应被导入的重量级模块
+HEAVY_MODULES = ("tkinter", "requests", "selenium", "webdriver_manager")
+
+
+def run_once(code):
+    """在新进程中执行代码，返回 (墙钟耗时ms, 导入耗时ms, 已加载的重量级模块)"""
+    probe = (
+        f"{code}\n"
+        "import sys, json\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))\n"
+    )
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", probe],
+                            capture_output=True, text=True, cwd=str(REPO_ROOT), env=env)
+    wall = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "启动失败")
+
+    # -X importtime 输出的是各模块的累计耗时（微秒），顶层模块的累计值之和即总导入耗时
+    import_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit() and not name.startswith("  "):
+            import_us += int(cumulative)
+    heavy = json.loads(result.stdout.strip().splitlines()[-1])
+    return wall, import_us / 1000, heavy
+
+
+def main():
+    parser = argparse.ArgumentParser(description="冷启动导入耗时基准")
+    parser.add_argument("--runs", type=int, default=10, help="每个场景的测量次数")
+    parser.add_argument("--json", help="把结果追加到该JSONL文件，便于跟踪变化")
+    args = parser.parse_args()
+
+    results = {}
+    for name, code in SCENARIOS.items():
+        try:
+            samples = [run_once(code) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{name:<15} 跳过: {e}")
+            continue
+        results[name] = {
+            "wall_ms": statistics.median(sample[0] for sample in samples),
+            "import_ms": statistics.median(sample[1] for sample in samples),
+            "heavy_modules": samples[-1][2],
+        }
+
+    baseline = results.get("interpreter", {}).get("wall_ms", 0.0)
+    print(f"{'场景':<15}{'墙钟(ms)':>10}{'扣除解释器(ms)':>16}{'导入(ms)':>10}  重量级模块")
+    for name, data in results.items():
+        print(f"{name:<15}{data['wall_ms']:>10.1f}{data['wall_ms'] - baseline:>16.1f}"
+              f"{data['import_ms']:>10.1f}  {', '.join(data['heavy_modules']) or '-'}")
+
+    if args.json:
+        record = {"timestamp": time.time(), "python": sys.version.split()[0], "runs": args.runs,
+                  "results": results}
+        with open(args.json, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+if __name__ == "__main__":
+    main()
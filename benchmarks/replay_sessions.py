@@ -0,0 +1,117 @@
+"""批量回放录制的会话归档：用于解析器和引擎改动的回归测试，以及单独测量引擎自身的开销
+
+每个归档在临时工作目录中回放，不访问模型、网络和浏览器。回放结果与录制结果不同、
+或引擎请求了录制中没有的交互（回放偏离）时视为回归，退出码为1。
+用法: python benchmarks/replay_sessions.py 归档或目录 [...] [--profile 20] [--json results.jsonl]
+"""
+import argparse
+import contextlib
+import cProfile
+import io
+import json
+import pstats
+import shutil
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+from auto_coder import AutoCoder, SessionReplayer, get_log_hub  # noqa: E402
+
+
+def find_archives(paths):
+    """展开目录参数，返回全部会话归档"""
+    archives = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            archives.extend(sorted(path.rglob("*.jsonl.gz")))
+        else:
+            archives.append(path)
+    return archives
+
+
+def replay_one(path, profiler=None):
+    """回放一个归档，返回结果字典"""
+    replayer = SessionReplayer(path)
+    # 引擎日志同时打印到标准输出，回放时丢弃；日志异步输出，离开重定向前等待写完
+    with contextlib.redirect_stdout(io.StringIO()):
+        auto_coder = AutoCoder.replay(replayer)
+        get_log_hub().flush()
+    started = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            if profiler:
+                profiler.enable()
+            try:
+                success = auto_coder.development_cycle()
+            finally:
+                if profiler:
+                    profiler.disable()
+    finally:
+        shutil.rmtree(auto_coder.workspace, ignore_errors=True)
+    elapsed = time.perf_counter() - started
+
+    if replayer.divergence:
+        status = "偏离"
+    elif success != replayer.recorded_success or replayer.remaining:
+        status = "结果变化"
+    else:
+        status = "一致"
+    return {
+        "archive": str(path),
+        "status": status,
+        "recorded_success": replayer.recorded_success,
+        "replayed_success": success,
+        "unused_interactions": replayer.remaining,
+        "divergence": replayer.divergence,
+        "replay_ms": elapsed * 1000,
+        "recorded_external_ms": replayer.recorded_time * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量回放会话归档")
+    parser.add_argument("paths", nargs="+", help="会话归档（.jsonl.gz）或包含归档的目录")
+    parser.add_argument("--profile", type=int, metavar="N", help="用cProfile统计引擎开销，输出前N个函数")
+    parser.add_argument("--json", help="把结果追加到该JSONL文件，便于跟踪变化")
+    args = parser.parse_args()
+
+    archives = find_archives(args.paths)
+    if not archives:
+        print("没有找到会话归档")
+        return 1
+
+    profiler = cProfile.Profile() if args.profile else None
+    results = []
+    for path in archives:
+        try:
+            results.append(replay_one(path, profiler))
+        except (OSError, ValueError) as e:
+            results.append({"archive": str(path), "status": "无法读取", "divergence": str(e),
+                            "replay_ms": 0.0, "recorded_external_ms": 0.0})
+
+    print(f"{'状态':<8}{'回放(ms)':>10}{'录制外部耗时(ms)':>18}  归档")
+    for result in results:
+        print(f"{result['status']:<8}{result['replay_ms']:>10.1f}{result['recorded_external_ms']:>18.1f}  "
+              f"{result['archive']}")
+        if result.get("divergence"):
+            print(f"{'':<8}{result['divergence']}")
+
+    regressions = [result for result in results if result["status"] != "一致"]
+    total = sum(result["replay_ms"] for result in results)
+    print(f"\n共 {len(results)} 个会话，{len(results) - len(regressions)} 个一致，回放总耗时 {total:.0f}ms")
+
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(args.profile)
+
+    if args.json:
+        record = {"timestamp": time.time(), "python": sys.version.split()[0], "results": results}
+        with open(args.json, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,323 @@
+"""AutoCoder执行节点：通过socket RPC（长度前缀的JSON帧）提供工作区同步、代码运行和pip安装
+
+引擎用 --workers host:port,... 把代码运行和依赖安装分派到执行节点。每个会话在节点上有独立的工作目录和虚拟环境，
+同步时只传输有改动的文件；节点只运行会话虚拟环境中的python和pip。节点默认只监听本机，
+对外提供服务时应通过 --token（或环境变量 AUTOCODER_WORKER_TOKEN）要求认证。
+同步只从引擎到节点：程序在节点上生成的文件留在节点的会话目录中（之后的命令可以读取），不会复制回引擎的工作区；
+节点只删除引擎工作区中已删除的文件。
+用法: python execution_worker.py [--host 127.0.0.1] [--port 7341] [--root worker_workspaces] [--capacity 4]
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import re
+import shutil
+import socketserver
+import subprocess
+import tempfile
+import threading
+import time
+import venv
+from pathlib import Path
+
+from auto_coder import (WORKER_DEFAULT_PORT, kill_process_tree, recv_frame, send_frame,
+                        site_packages_modules)
+
+# 返回给引擎的标准输出和标准错误上限，超出部分截断（转义后仍须远小于帧大小上限）
+MAX_STDOUT_BYTES = 4 * 1024 * 1024
+# 取消标记的保留时间（秒）：取消请求可能先于运行请求开始执行进程到达
+CANCEL_MARKER_TTL = 600
+# 不参与同步的目录：节点上的虚拟环境和输出目录
+LOCAL_DIRS = ("venv", ".autocoder")
+
+_SESSION_RE = re.compile(r'^[\w.-]{1,128}$')
+
+
+def venv_executable(venv_path, name):
+    """虚拟环境中的可执行文件路径"""
+    if os.name == 'nt':
+        return str(venv_path / "Scripts" / f"{name}.exe")
+    return str(venv_path / "bin" / name)
+
+
+class WorkerSession:
+    """节点上一个会话的工作目录和虚拟环境"""
+
+    def __init__(self, path):
+        self.path = path
+        self.venv_path = path / "venv"
+        self.lock = threading.Lock()
+        self.active = 0  # 正在处理的请求数（由节点在持有节点锁时更新），大于0时不会被清理
+        self._hashes = {}  # 相对路径 -> ((大小, 修改时间), sha1)
+
+    def ensure_venv(self):
+        """第一次运行时创建会话的虚拟环境"""
+        with self.lock:
+            if not self.venv_path.exists():
+                venv.create(self.venv_path, with_pip=True)
+
+    def _resolve(self, name):
+        """会话目录中的文件，拒绝绝对路径和指向目录之外的路径"""
+        path = (self.path / name).resolve()
+        root = self.path.resolve()
+        if root not in path.parents or Path(name).parts[0] in LOCAL_DIRS:
+            raise ValueError(f"非法的文件路径: {name}")
+        return path
+
+    def sha1(self, name):
+        """文件的sha1，大小和修改时间都没变时沿用上次的结果"""
+        path = self.path / name
+        stat = path.stat()
+        key = (stat.st_size, stat.st_mtime_ns)
+        cached = self._hashes.get(name)
+        if cached is None or cached[0] != key:
+            cached = (key, hashlib.sha1(path.read_bytes()).hexdigest())
+            self._hashes[name] = cached
+        return cached[1]
+
+    def sync(self, manifest, files, deleted=()):
+        """写入传来的文件、删除引擎工作区中已删除的文件（程序在节点上生成的文件保留），
+        返回内容与清单不一致的文件，以及虚拟环境是否还不存在（会话目录是新建的或被清理过）"""
+        with self.lock:
+            for name, content in files.items():
+                path = self._resolve(name)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                path.write_bytes(base64.b64decode(content))
+            removed = 0
+            for name in deleted:
+                path = self._resolve(name)
+                self._hashes.pop(name, None)
+                if path.is_file():
+                    path.unlink()
+                    removed += 1
+            missing = []
+            for name, sha1 in manifest.items():
+                self._resolve(name)
+                try:
+                    if self.sha1(name) == sha1:
+                        continue
+                except OSError:
+                    pass
+                missing.append(name)
+        return {"written": len(files), "deleted": removed, "missing": missing,
+                "new_venv": not self.venv_path.exists()}
+
+    def command(self, cmd):
+        """把引擎传来的占位符命令换成本会话的路径，只允许运行虚拟环境中的python和pip"""
+        programs = {"<python>": venv_executable(self.venv_path, "python"),
+                    "<pip>": venv_executable(self.venv_path, "pip")}
+        if not cmd or cmd[0] not in programs:
+            raise ValueError("只允许运行会话虚拟环境中的python和pip")
+        return [programs[cmd[0]]] + [str(part).replace("<workspace>", str(self.path)) for part in cmd[1:]]
+
+
+class WorkerRequestHandler(socketserver.BaseRequestHandler):
+    """处理一个连接上的RPC请求"""
+
+    def handle(self):
+        while True:
+            try:
+                request = recv_frame(self.request)
+            except (OSError, ValueError):
+                return
+            if request is None:
+                return
+            response = {"id": request.get("id")}
+            try:
+                response["result"] = self.server.dispatch(request)
+            except Exception as e:
+                response["error"] = str(e) or type(e).__name__
+            try:
+                send_frame(self.request, response)
+            except OSError:
+                return
+
+
+class ExecutionWorker(socketserver.ThreadingTCPServer):
+    """执行节点服务"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, root="worker_workspaces", capacity=None, token=None, max_sessions=20,
+                 verbose=False):
+        super().__init__(address, WorkerRequestHandler)
+        self.root = Path(root).absolute()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.capacity = capacity or os.cpu_count() or 1
+        self.token = token
+        self.max_sessions = max_sessions
+        self.verbose = verbose
+        self.running = 0
+        self._slots = threading.Semaphore(self.capacity)  # 同时运行的进程数不超过容量，多出的请求排队
+        self._sessions = {}
+        self._processes = {}  # 调用ID -> 正在运行的进程
+        self._cancelled = {}  # 还没有开始运行进程时收到取消的调用ID -> 收到取消的时间
+        self._lock = threading.Lock()
+
+    def log(self, message):
+        if self.verbose:
+            print(message, flush=True)
+
+    def dispatch(self, request):
+        """校验令牌并调用对应的方法"""
+        if self.token and not hmac.compare_digest(str(request.get("token") or ""), self.token):
+            raise PermissionError("认证失败")
+        method = request.get("method")
+        params = request.get("params") or {}
+        if method == "status":
+            return self.status()
+        if method == "cancel":
+            return {"cancelled": self.cancel(params["call_id"])}
+        session = self.session(params["session"])
+        try:
+            if method == "sync":
+                return session.sync(params["manifest"], params["files"], params.get("deleted", ()))
+            if method == "run":
+                return self.run(session, request["id"], params["cmd"], params.get("input"), params["timeout"])
+            if method == "modules":
+                session.ensure_venv()
+                modules = site_packages_modules(session.venv_path)
+                return {"modules": None if modules is None else sorted(modules)}
+            raise ValueError(f"未知的方法: {method}")
+        finally:
+            with self._lock:
+                session.active -= 1
+
+    def status(self):
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "running": self.running,
+                "sessions": len(self._sessions),
+                "load": os.getloadavg()[0] if hasattr(os, "getloadavg") else None
+            }
+
+    def session(self, name):
+        """获取会话并标记为使用中（调用者处理完请求后减少active），
+        会话目录超过上限时删除最久未使用的会话目录"""
+        if not _SESSION_RE.match(name or ""):
+            raise ValueError(f"非法的会话名: {name}")
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is None:
+                path = self.root / name
+                self._evict(keep=path)
+                path.mkdir(exist_ok=True)
+                session = self._sessions[name] = WorkerSession(path)
+            session.active += 1
+        os.utime(session.path)
+        return session
+
+    def _evict(self, keep):
+        """按修改时间删除最久未使用的会话目录，跳过正在处理请求的会话（运行中的进程、pip安装或同步）"""
+        def busy(path):
+            session = self._sessions.get(path.name)
+            return session is not None and (session.active or session.lock.locked())
+
+        paths = sorted((path for path in self.root.iterdir() if path.is_dir() and path != keep and not busy(path)),
+                       key=lambda path: path.stat().st_mtime)
+        active = sum(1 for session in self._sessions.values() if session.active)
+        for path in paths[:max(0, len(paths) + active + 1 - self.max_sessions)]:
+            self.log(f"删除最久未使用的会话目录: {path.name}")
+            self._sessions.pop(path.name, None)
+            shutil.rmtree(path, ignore_errors=True)
+
+    def run(self, session, call_id, cmd, input, timeout):
+        """在会话目录中运行命令（独立进程组），超时或被取消时结束整个进程组"""
+        session.ensure_venv()
+        cmd = session.command(cmd)
+        kwargs = {}
+        if os.name == 'nt':
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        with self._slots:
+            with self._lock:
+                if self._cancelled.pop(call_id, None) is not None:
+                    raise RuntimeError("调用已被取消")
+                self.running += 1
+            try:
+                with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+                    self.log(f"[{session.path.name}] 运行: {' '.join(cmd)}")
+                    started = time.monotonic()
+                    process = subprocess.Popen(cmd, cwd=str(session.path), stdout=stdout, stderr=stderr,
+                                               stdin=subprocess.DEVNULL if input is None else subprocess.PIPE,
+                                               text=True, **kwargs)
+                    with self._lock:
+                        self._processes[call_id] = process
+                        cancelled = self._cancelled.pop(call_id, None) is not None
+                    try:
+                        if cancelled:
+                            # 取消请求在进程启动期间到达
+                            kill_process_tree(process)
+                        process.communicate(input=input, timeout=timeout)
+                    except subprocess.TimeoutExpired:
+                        kill_process_tree(process)
+                        process.communicate()
+                        return {"timed_out": True, "elapsed": time.monotonic() - started}
+                    finally:
+                        with self._lock:
+                            self._processes.pop(call_id, None)
+                    elapsed = time.monotonic() - started
+                    out, out_truncated = self._read_output(stdout)
+                    err, err_truncated = self._read_output(stderr)
+                    return {"returncode": process.returncode, "stdout": out, "stderr": err, "elapsed": elapsed,
+                            "truncated": out_truncated or err_truncated}
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+    @staticmethod
+    def _read_output(file):
+        """读取输出文件的前MAX_STDOUT_BYTES字节，返回 (文本, 是否截断)"""
+        file.seek(0)
+        data = file.read(MAX_STDOUT_BYTES + 1)
+        return data[:MAX_STDOUT_BYTES].decode("utf-8", errors="replace"), len(data) > MAX_STDOUT_BYTES
+
+    def cancel(self, call_id):
+        """结束调用ID对应的进程；进程还没有启动时记下取消标记，运行请求开始运行前检查"""
+        with self._lock:
+            process = self._processes.get(call_id)
+            if process is None:
+                now = time.monotonic()
+                self._cancelled = {key: at for key, at in self._cancelled.items() if now - at < CANCEL_MARKER_TTL}
+                self._cancelled[call_id] = now
+                return False
+        kill_process_tree(process)
+        return True
+
+    def start_background(self):
+        """在后台线程中运行，返回线程对象"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="AutoCoder执行节点")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=WORKER_DEFAULT_PORT)
+    parser.add_argument("--root", default="worker_workspaces", help="会话工作目录的根目录")
+    parser.add_argument("--capacity", type=int, help="同时运行的进程数（默认CPU核数）")
+    parser.add_argument("--max-sessions", type=int, default=20, help="保留的会话目录数，超出时删除最久未使用的")
+    parser.add_argument("--token", default=os.environ.get("AUTOCODER_WORKER_TOKEN"), help="要求客户端提供的认证令牌")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = ExecutionWorker((args.host, args.port), root=args.root, capacity=args.capacity, token=args.token,
+                             max_sessions=args.max_sessions, verbose=args.verbose)
+    print(f"执行节点已启动: {args.host}:{args.port}，容量 {server.capacity}，工作目录 {server.root}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""AutoCoder本地任务服务：HTTP/JSON接口提交任务，sqlite持久化任务队列，后台调度器执行"""
+import argparse
+import inspect
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+from auto_coder import AutoCoder, CancellationToken
+
+# 允许通过接口传入的AutoCoder参数：回调、取消令牌和会话录制对象不能用JSON表示，resume只由服务内部设置
+JOB_PARAMS = [name for name in inspect.signature(AutoCoder.__init__).parameters
+              if name not in ("self", "ui_callback", "cancel_token", "session", "log_callback", "resume")]
+
+TERMINAL_STATES = ("succeeded", "failed", "cancelled")
+
+
+class JobStore:
+    """基于sqlite的任务队列与日志存储，进程重启后未完成的任务重新排队"""
+
+    def __init__(self, db_path="autocoder_jobs.db"):
+        self.db_path = str(db_path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    workspace TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    started REAL,
+                    finished REAL,
+                    success INTEGER,
+                    summary TEXT,
+                    error TEXT
+                )""")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS job_logs (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    message TEXT NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                )""")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created)")
+            # 上次退出时仍在运行的任务重新排队，保留开始时间以便领取时从检查点继续
+            self._conn.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running'")
+
+    def _row_to_job(self, row):
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        if job["success"] is not None:
+            job["success"] = bool(job["success"])
+        return job
+
+    def submit(self, params):
+        """提交任务，返回任务ID"""
+        job_id = uuid.uuid4().hex[:12]
+        workspace = str(Path(params.get("workspace", "safe_workspace")).absolute())
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, params, workspace, created) VALUES (?, 'queued', ?, ?, ?)",
+                (job_id, json.dumps(params, ensure_ascii=False), workspace, time.time())
+            )
+        return job_id
+
+    def get(self, job_id):
+        """获取任务信息，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list(self, status=None, limit=100):
+        """列出任务（不含摘要）"""
+        query = "SELECT id, status, workspace, created, started, finished, success FROM jobs"
+        args = []
+        if status:
+            query += " WHERE status = ?"
+            args.append(status)
+        query += " ORDER BY created DESC LIMIT ?"
+        args.append(limit)
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(query, args).fetchall()]
+
+    def claim_next(self, busy_workspaces):
+        """按提交顺序领取一个工作目录空闲的排队任务，没有时返回None
+
+        已经开始过的排队任务（服务重启时被中断后重新排队）标记为resumed
+        """
+        with self._lock, self._conn:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created"
+            ).fetchall()
+            for row in rows:
+                if row["workspace"] in busy_workspaces:
+                    continue
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', started = ? WHERE id = ?",
+                    (time.time(), row["id"])
+                )
+                job = self._row_to_job(row)
+                job["status"] = "running"
+                job["resumed"] = row["started"] is not None
+                return job
+        return None
+
+    def finish(self, job_id, status, success=None, summary=None, error=None):
+        """记录任务结束状态"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, finished = ?, success = ?, summary = ?, error = ? WHERE id = ?",
+                (status, time.time(), None if success is None else int(success), summary, error, job_id)
+            )
+
+    def cancel(self, job_id):
+        """取消排队中的任务，成功返回True"""
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            )
+            return cursor.rowcount > 0
+
+    def append_log(self, job_id, message):
+        """追加一条任务日志"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO job_logs (job_id, seq, message) "
+                "SELECT ?, COALESCE(MAX(seq), 0) + 1, ? FROM job_logs WHERE job_id = ?",
+                (job_id, message, job_id)
+            )
+
+    def read_logs(self, job_id, after=0, limit=1000):
+        """读取序号大于after的日志，返回 [(seq, message), ...]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, message FROM job_logs WHERE job_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+                (job_id, after, limit)
+            ).fetchall()
+        return [(row["seq"], row["message"]) for row in rows]
+
+    def clear_logs(self, job_id):
+        """清除任务日志（任务重新执行前调用）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM job_logs WHERE job_id = ?", (job_id,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobScheduler:
+    """任务调度器：限制全局并发数，同一工作目录同一时间只运行一个任务"""
+
+    def __init__(self, store, max_concurrency=2, poll_interval=0.5):
+        self.store = store
+        self.max_concurrency = max_concurrency
+        self.poll_interval = poll_interval
+        self._busy_workspaces = set()
+        self._running = {}
+        self._tokens = {}
+        self._cancel_requested = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动调度线程"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止调度（正在运行的任务会继续执行到结束）"""
+        self._stop_event.set()
+        self._wakeup.set()
+
+    def cancel(self, job_id):
+        """取消正在运行的任务，任务不在运行时返回False"""
+        with self._lock:
+            token = self._tokens.get(job_id)
+            if token is None:
+                return False
+            self._cancel_requested.add(job_id)
+        token.cancel("任务被取消")
+        return True
+
+    def notify(self):
+        """有新任务提交时唤醒调度线程"""
+        self._wakeup.set()
+
+    def running_jobs(self):
+        with self._lock:
+            return list(self._running)
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            self._dispatch()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def _dispatch(self):
+        with self._lock:
+            while len(self._running) < self.max_concurrency:
+                job = self.store.claim_next(self._busy_workspaces)
+                if job is None:
+                    break
+                self._busy_workspaces.add(job["workspace"])
+                thread = threading.Thread(target=self._run_job, args=(job,), daemon=True)
+                self._running[job["id"]] = thread
+                thread.start()
+
+    def _run_job(self, job):
+        job_id = job["id"]
+        self.store.clear_logs(job_id)
+        token = CancellationToken()
+        with self._lock:
+            self._tokens[job_id] = token
+        try:
+            # 服务重启后重新排队的任务从工作区中未完成的检查点继续，不重复已完成的LLM调用；
+            # 新提交的任务从头开始，不沿用同一工作区中旧任务留下的检查点
+            params = dict(job["params"])
+            if job["resumed"]:
+                params["resume"] = True
+            auto_coder = AutoCoder(
+                ui_callback=lambda message: self.store.append_log(job_id, message.rstrip("\n")),
+                cancel_token=token,
+                **params
+            )
+            success = auto_coder.development_cycle()
+            with self._lock:
+                cancelled = job_id in self._cancel_requested
+            if cancelled:
+                status = "cancelled"
+            else:
+                status = "succeeded" if success else "failed"
+            self.store.finish(job_id, status, success=success, summary=auto_coder.get_summary())
+        except Exception as e:
+            self.store.append_log(job_id, f"❌ 执行异常: {str(e)}")
+            self.store.finish(job_id, "failed", success=False, error=str(e))
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+                self._tokens.pop(job_id, None)
+                self._cancel_requested.discard(job_id)
+                self._busy_workspaces.discard(job["workspace"])
+            self._wakeup.set()
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """任务服务的HTTP接口
+
+    POST /jobs                   提交任务，请求体为AutoCoder参数
+    GET  /jobs                   列出任务，可用 ?status= 过滤
+    GET  /jobs/<id>              查询任务状态
+    GET  /jobs/<id>/logs         读取日志，?after=<seq> 增量读取，?follow=1 持续推送直到任务结束
+    GET  /jobs/<id>/summary      获取开发摘要
+    POST /jobs/<id>/cancel       取消排队中或正在运行的任务
+    """
+
+    server_version = "AutoCoderJobServer/1.0"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length))
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        return parts, query
+
+    def do_POST(self):
+        parts, _ = self._route()
+        store = self.server.store
+
+        if parts == ["jobs"]:
+            try:
+                params = self._read_json()
+            except json.JSONDecodeError:
+                self._send_json(400, {"error": "请求体不是合法的JSON"})
+                return
+            if not isinstance(params, dict) or not params.get("task"):
+                self._send_json(400, {"error": "缺少task参数"})
+                return
+            unknown = sorted(set(params) - set(JOB_PARAMS))
+            if unknown:
+                self._send_json(400, {"error": f"未知参数: {', '.join(unknown)}", "allowed": JOB_PARAMS})
+                return
+            job_id = store.submit(params)
+            self.server.scheduler.notify()
+            self._send_json(201, {"id": job_id, "status": "queued"})
+
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+            if store.get(parts[1]) is None:
+                self._send_json(404, {"error": "任务不存在"})
+            elif store.cancel(parts[1]):
+                self._send_json(200, {"id": parts[1], "status": "cancelled"})
+            elif self.server.scheduler.cancel(parts[1]):
+                self._send_json(202, {"id": parts[1], "status": "cancelling"})
+            else:
+                self._send_json(409, {"error": "任务已结束"})
+
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_GET(self):
+        parts, query = self._route()
+        store = self.server.store
+
+        if parts == ["jobs"]:
+            self._send_json(200, {"jobs": store.list(status=query.get("status"))})
+            return
+
+        if len(parts) < 2 or parts[0] != "jobs":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        job = store.get(parts[1])
+        if job is None:
+            self._send_json(404, {"error": "任务不存在"})
+            return
+
+        if len(parts) == 2:
+            job.pop("summary", None)
+            self._send_json(200, job)
+        elif parts[2] == "summary":
+            if job["status"] not in TERMINAL_STATES:
+                self._send_json(409, {"error": "任务尚未结束", "status": job["status"]})
+            else:
+                self._send_json(200, {"id": job["id"], "status": job["status"],
+                                      "success": job["success"], "summary": job["summary"]})
+        elif parts[2] == "logs":
+            after = int(query.get("after", 0))
+            if query.get("follow") in ("1", "true"):
+                self._stream_logs(job["id"], after)
+            else:
+                logs = store.read_logs(job["id"], after=after)
+                self._send_json(200, {
+                    "id": job["id"],
+                    "status": job["status"],
+                    "logs": [message for _, message in logs],
+                    "next": logs[-1][0] if logs else after
+                })
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def _stream_logs(self, job_id, after):
+        """以分块传输持续推送日志（每行一条JSON），任务结束后关闭"""
+        store = self.server.store
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            while True:
+                logs = store.read_logs(job_id, after=after)
+                for seq, message in logs:
+                    self._write_chunk(json.dumps({"seq": seq, "message": message}, ensure_ascii=False) + "\n")
+                    after = seq
+                if not logs:
+                    job = store.get(job_id)
+                    if job is None or job["status"] in TERMINAL_STATES:
+                        self._write_chunk(json.dumps({"status": job["status"] if job else None}) + "\n")
+                        break
+                    time.sleep(0.2)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class JobServer(ThreadingHTTPServer):
+    """任务服务：HTTP接口 + 任务存储 + 调度器"""
+
+    daemon_threads = True
+
+    def __init__(self, address, db_path="autocoder_jobs.db", max_concurrency=2, verbose=False):
+        super().__init__(address, JobRequestHandler)
+        self.verbose = verbose
+        self.store = JobStore(db_path)
+        self.scheduler = JobScheduler(self.store, max_concurrency=max_concurrency)
+
+    def serve_forever(self, poll_interval=0.5):
+        self.scheduler.start()
+        super().serve_forever(poll_interval)
+
+    def server_close(self):
+        self.scheduler.stop()
+        super().server_close()
+        self.store.close()
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="AutoCoder本地任务服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--db", default="autocoder_jobs.db", help="任务队列数据库文件")
+    parser.add_argument("--concurrency", type=int, default=2, help="同时运行的最大任务数")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    server = JobServer((args.host, args.port), db_path=args.db,
+                       max_concurrency=args.concurrency, verbose=args.verbose)
+    print(f"AutoCoder任务服务已启动: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
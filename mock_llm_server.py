@@ -0,0 +1,189 @@
+"""本地模拟LLM服务，兼容 /v1/chat/completions 与 /v1/models，用于在无模型的环境下联调AutoCoder"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+def build_reply(prompt):
+    """根据提示词构造一个能直接通过验证的响应：生成打印用户预期输出的程序"""
+    expected_match = re.search(r'\[用户指定的预期输出\]\s*(.*?)\s*\n\s*\n', prompt, re.DOTALL)
+    expected = expected_match.group(1).strip() if expected_match else "Hello, World!"
+    lines = [line.rstrip() for line in expected.splitlines()]
+    code = "\n".join(f"print({line!r})" for line in lines)
+    return (
+        "<think>模拟服务: 直接输出预期结果</think>\n"
+        "[ACTION]\nCODE\n\n"
+        "[CONTENT]\n# filename: main.py\n"
+        f"```python\n{code}\n```\n\n"
+        f"[EXPECTED OUTPUT]\n{expected}\n\n"
+        "[NEXT STEPS]\n- 无\n"
+    )
+
+
+def apply_limits(content, stop=None, max_tokens=None):
+    """按停止序列和max_tokens（按每4个字符1个token估算）截断内容，返回 (内容, 结束原因)"""
+    if isinstance(stop, str):
+        stop = [stop]
+    for sequence in stop or []:
+        position = content.find(sequence)
+        if position >= 0:
+            content = content[:position]
+    if max_tokens and len(content) > max_tokens * 4:
+        return content[:max_tokens * 4], "length"
+    return content, "stop"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    """模拟LLM服务的请求处理"""
+
+    server_version = "MockLLM/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/v1/models":
+            self._send_json(200, {"object": "list", "data": [{"id": "local-model", "object": "model"}]})
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid json"})
+            return
+
+        with self.server.lock:
+            self.server.request_count += 1
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if random.random() < self.server.fail_rate:
+            self._send_json(503, {"error": "simulated failure"})
+            return
+
+        prompt = "\n".join(str(message.get("content", "")) for message in payload.get("messages", []))
+        content = self.server.reply_for(prompt)
+        content, finish_reason = apply_limits(content, payload.get("stop"), payload.get("max_tokens"))
+        prompt_tokens = len(prompt) // 4
+        completion_tokens = len(content) // 4
+        if payload.get("stream"):
+            usage = None
+            if (payload.get("stream_options") or {}).get("include_usage"):
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                         "total_tokens": prompt_tokens + completion_tokens}
+            self._send_stream(content, usage=usage, finish_reason=finish_reason)
+            return
+        self._send_json(200, {
+            "id": f"mock-{self.server.request_count}",
+            "object": "chat.completion",
+            "model": payload.get("model", "local-model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        })
+
+
+    def _send_stream(self, content, chunk_size=16, usage=None, finish_reason="stop"):
+        """以SSE流式返回内容，usage不为空时在最后附加一个只含用量的分块"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        try:
+            for start in range(0, len(content), chunk_size):
+                chunk = {"choices": [{"index": 0, "delta": {"content": content[start:start + chunk_size]}}]}
+                self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                if self.server.chunk_delay:
+                    time.sleep(self.server.chunk_delay)
+            chunk = {"choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            if usage:
+                chunk = {"choices": [], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    """模拟LLM服务"""
+
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, fail_rate=0.0, fixed_reply=None, verbose=False, chunk_delay=0.0):
+        super().__init__(address, MockLLMHandler)
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.fail_rate = fail_rate
+        self.fixed_reply = fixed_reply
+        self.verbose = verbose
+        self.request_count = 0
+        self.lock = threading.Lock()
+
+    def reply_for(self, prompt):
+        """本次请求的模型响应，子类可以覆盖以按请求构造不同的响应"""
+        return self.fixed_reply if self.fixed_reply is not None else build_reply(prompt)
+
+    def start_background(self):
+        """在后台线程中运行，返回线程对象"""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+
+def main():
+    """命令行入口"""
+    parser = argparse.ArgumentParser(description="本地模拟LLM服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1234)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的模拟延迟（秒）")
+    parser.add_argument("--chunk-delay", type=float, default=0.0, help="流式响应每个分块之间的延迟（秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="返回503的概率")
+    parser.add_argument("--reply-file", help="固定返回该文件的内容作为模型响应")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    fixed_reply = None
+    if args.reply_file:
+        with open(args.reply_file, 'r', encoding='utf-8') as f:
+            fixed_reply = f.read()
+
+    server = MockLLMServer((args.host, args.port), latency=args.latency, fail_rate=args.fail_rate,
+                           fixed_reply=fixed_reply, verbose=args.verbose, chunk_delay=args.chunk_delay)
+    print(f"模拟LLM服务已启动: http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()